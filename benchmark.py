@@ -0,0 +1,686 @@
+#   -*- coding: utf-8 -*-
+"""Media Library Cleaner benchmarks."""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import contextlib
+import argparse as ap
+import multiprocessing
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import cleaner
+from cleaner import printNotificationNew, printNotificationInfo, bold
+from cleaner import printNotificationWarning
+
+# === pysrt is only the reference of the extract benchmark, so it is a
+#     dependency of benchmark.py and not of cleaner.py or requirements.txt
+cleaner.dependencies["pysrt"] = "pysrt"
+
+DIALOGUE_WORDS = {
+    "en": "the you and that what this have not know with was for just they "
+          "there here going about right think well come want would could "
+          "never something really people time because tell little where "
+          "nothing mother house tonight father money happened".split(),
+    "nl": "het een dat niet wat ik je van zijn maar hij voor met heb weet "
+          "hier daar gaan kunnen moet wil niets iets altijd nooit mensen "
+          "vader moeder huis geld vanavond gebeurd waarom omdat zeggen "
+          "alleen misschien".split(),
+    "fr": "le la les que pas vous est une pour qui dans avec mais tout "
+          "bien fait peut faire rien quoi sais veux jamais toujours "
+          "maintenant ici monde maison argent pourquoi parce ce soir mère "
+          "père quelque chose".split(),
+    "de": "der die das nicht ist ich du und sie wir was mit sich auf "
+          "haben aber wenn noch nur hier schon immer nichts etwas warum "
+          "weil heute Abend Mutter Vater Haus Geld passiert vielleicht "
+          "wirklich".split(),
+    "es": "que de no la el es y en lo un por qué me una te los se con "
+          "para mi está si bien pero yo eso las sí su tu aquí todo nada "
+          "algo nunca siempre casa dinero madre padre esta noche".split(),
+}
+TITLE_WORDS = ("Dark Night Last Summer Return Lost City Secret River Iron "
+               "Silent Storm Golden Empire Broken Wings Shadow Hunter Blue "
+               "Planet Winter Road Fire Kingdom Star Dream Ghost Island "
+               "Final Hour Red Moon Wild Heart").split()
+GARBAGE_NAMES = ["movie.nfo", "cover.jpg", "Thumbs.db", "readme.txt",
+                 "sample.url", ".DS_Store"]
+CHECKS = {
+    "foldernameexact": lambda: cleaner.FolderExactNameCheck(False),
+    "foldernamesoundex": lambda: cleaner.FolderSoundexCheck(False),
+    "foldernamefuzzy": lambda: cleaner.FolderFuzzyCheck(3, True),
+    "duplicatefiles": lambda: cleaner.DuplicateFilesCheck(),
+    "subtitlesiso639": lambda: cleaner.SubtitleIso639Check("1", True),
+    "subtitlenaming": lambda: cleaner.SubtitleMediaNamingCheck(),
+    "subtitleduplicates": lambda: cleaner.SubtitleDuplicatesCheck(),
+    "garbagecollector": lambda: cleaner.GarbageCheck(),
+    "subtitleslangcheck": lambda: cleaner.LanguageCheck(),
+}
+
+
+def createFolderTree(root, folders, filesPerFolder, foldersPerLevel=10):
+    """Create a tree of folders with empty files below root."""
+    paths = [root]
+    created = 0
+    while created < folders:
+        parent = paths[created // foldersPerLevel]
+        path = os.path.join(parent, "folder" + str(created))
+        os.mkdir(path)
+        for number in range(filesPerFolder):
+            open(os.path.join(path, "file" + str(number)), 'w').close()
+        paths.append(path)
+        created = created + 1
+    return paths
+
+
+@contextlib.contextmanager
+def simulateLatency(latency):
+    """Delay every os.scandir call, like a folder listing on a network."""
+    scandir = os.scandir
+
+    def slowScandir(*args, **kwargs):
+        time.sleep(latency)
+        return scandir(*args, **kwargs)
+
+    os.scandir = slowScandir
+    try:
+        yield
+    finally:
+        os.scandir = scandir
+
+
+def timeCall(function):
+    """Return the wall time of a call in seconds."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def benchmarkWalk(args):
+    """Compare os.walk with LibraryWalker on a tree with listing latency."""
+    printNotificationNew("Benchmarking folder traversal")
+    root = tempfile.mkdtemp(prefix="cleaner-benchmark-")
+    try:
+        createFolderTree(root, args.folders, args.files)
+        info = "Created " + bold(str(args.folders)) + " folders with "
+        info += bold(str(args.files)) + " files each, simulating "
+        info += bold(str(args.latency * 1000)) + " ms per listing"
+        printNotificationInfo(info)
+        with simulateLatency(args.latency):
+            baseline = timeCall(lambda: list(os.walk(root)))
+            printNotificationInfo("os.walk: %.3f s" % baseline)
+            for walkers in args.walkers:
+                for ordered in ((False, True) if walkers > 1 else (False,)):
+                    walker = cleaner.LibraryWalker(root, walkers=walkers,
+                                                   ordered=ordered)
+                    seconds = timeCall(walker.walk)
+                    info = "LibraryWalker walkers=%d ordered=%s: " % (
+                        walkers, ordered)
+                    info += "%.3f s (%.1fx)" % (seconds, baseline / seconds)
+                    printNotificationInfo(info)
+    finally:
+        shutil.rmtree(root)
+
+
+class LibraryGenerator(object):
+    """
+    Generate a reproducible synthetic media library from a seed.
+
+    Movies go into year folders or directly below the root, TV shows get
+    season folders with episodes. Media files are sparse stubs with a random
+    header, subtitles are SRT files with dialogue in several languages of
+    which some are labelled with the wrong language code. Near-duplicate
+    folder names, garbage files and empty folders are mixed in.
+    """
+
+    def __init__(self, root, seed, files, stubSize=1024 * 1024,
+                 cues=200):
+        """Initialize LibraryGenerator class."""
+        self.root = root
+        self.random = random.Random(seed)
+        self.targetFiles = files
+        self.stubSize = stubSize
+        self.cues = cues
+        self.files = 0
+        self.folders = 0
+        self.titles = set()
+
+    def makeFolder(self, *parts):
+        """Create a folder below the root and return its path."""
+        path = self.root
+        for part in parts:
+            path = os.path.join(path, part)
+            if not os.path.isdir(path):
+                os.mkdir(path)
+                self.folders = self.folders + 1
+        return path
+
+    def writeFile(self, path, data=b""):
+        """Create a file with data."""
+        if not os.path.exists(path):
+            self.files = self.files + 1
+        with open(path, 'wb') as handle:
+            handle.write(data)
+
+    def writeMediaStub(self, path):
+        """Create a sparse media file with a random header."""
+        self.writeFile(path, bytes(self.random.getrandbits(8)
+                                   for _ in range(512)))
+        os.truncate(path, self.stubSize)
+
+    def dialogue(self, language):
+        """Return a line of dialogue in a language."""
+        words = self.random.sample(DIALOGUE_WORDS[language],
+                                   self.random.randint(4, 10))
+        return " ".join(words).capitalize() + self.random.choice(".?!")
+
+    def writeSubtitle(self, path, language):
+        """Create an SRT file with an ad cue followed by dialogue."""
+        cues = ["1\n00:00:01,000 --> 00:00:04,000\n"
+                "<font color=\"#ffff00\">Subtitles by www.example.org</font>"
+                "\n"]
+        for number in range(2, self.cues + 2):
+            start = number * 4
+            cues.append("%d\n%02d:%02d:%02d,000 --> %02d:%02d:%02d,500\n"
+                        "<i>%s</i>\n" % (
+                            number, start // 3600, start // 60 % 60,
+                            start % 60, start // 3600, start // 60 % 60,
+                            start % 60 + 2 if start % 60 < 57 else 59,
+                            self.dialogue(language)))
+        self.writeFile(path, "\n".join(cues).encode('iso-8859-1'))
+
+    def writeAssSubtitle(self, path, language):
+        """Create an ASS file with styled Dialogue events."""
+        lines = ["[Script Info]", "ScriptType: v4.00+", "",
+                 "[Events]", "Format: Layer, Start, End, Style, Name, "
+                 "MarginL, MarginR, MarginV, Effect, Text"]
+        for number in range(self.cues):
+            start = number * 4
+            lines.append("Dialogue: 0,%d:%02d:%02d.00,%d:%02d:%02d.50,"
+                         "Default,,0,0,0,,{\\i1}%s{\\i0}\\N%s" % (
+                             start // 3600, start // 60 % 60, start % 60,
+                             start // 3600, start // 60 % 60, start % 60,
+                             self.dialogue(language),
+                             self.dialogue(language)))
+        self.writeFile(path, "\n".join(lines).encode('iso-8859-1'))
+
+    def writeMicroDvdSubtitle(self, path, language):
+        """Create a MicroDVD SUB file with two lines per cue."""
+        lines = []
+        for number in range(self.cues):
+            lines.append("{%d}{%d}{y:i}%s|%s" % (
+                number * 100, number * 100 + 60, self.dialogue(language),
+                self.dialogue(language)))
+        self.writeFile(path, "\n".join(lines).encode('iso-8859-1'))
+
+    def title(self):
+        """Return a new title, sometimes a near-duplicate of an older one."""
+        if self.titles and self.random.random() < 0.05:
+            title = list(self.random.choice(sorted(self.titles)))
+            position = self.random.randrange(len(title))
+            title[position] = self.random.choice("aeiouxyz")
+            title = "".join(title)
+        else:
+            title = " ".join(self.random.sample(TITLE_WORDS,
+                                                self.random.randint(1, 4)))
+        self.titles.add(title)
+        return title
+
+    def writeMediaWithSubtitles(self, folder, name):
+        """Create a media stub with subtitles and maybe garbage."""
+        extension = self.random.choice([".mkv", ".mp4", ".avi", ".m4v"])
+        self.writeMediaStub(os.path.join(folder, name + extension))
+        languages = sorted(DIALOGUE_WORDS)
+        for language in self.random.sample(languages,
+                                           self.random.randint(1, 3)):
+            label = language
+            if self.random.random() < 0.05:
+                label = self.random.choice(languages)
+            if self.random.random() < 0.1:
+                iso639 = cleaner.importDependency("iso639")
+                label = iso639.to_iso639_2(label)
+            path = os.path.join(folder, name + "." + label + ".srt")
+            self.writeSubtitle(path, language)
+        if self.random.random() < 0.2:
+            garbage = self.random.choice(GARBAGE_NAMES)
+            self.writeFile(os.path.join(folder, garbage), b"garbage")
+
+    def generate(self):
+        """Create folders and files until the target number is reached."""
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        while self.files < self.targetFiles:
+            roll = self.random.random()
+            title = self.title()
+            year = str(self.random.randint(1950, 2024))
+            if roll < 0.6:
+                folder = self.makeFolder(year, title + " (" + year + ")")
+                self.writeMediaWithSubtitles(folder, title)
+            elif roll < 0.8:
+                folder = self.makeFolder(title)
+                self.writeMediaWithSubtitles(folder, title)
+            elif roll < 0.97:
+                for season in range(1, self.random.randint(2, 4)):
+                    folder = self.makeFolder("TV", title,
+                                             "Season %d" % season)
+                    for episode in range(1, self.random.randint(4, 12)):
+                        name = "%s S%02dE%02d" % (title, season, episode)
+                        self.writeMediaWithSubtitles(folder, name)
+            else:
+                self.makeFolder(title, "extras")
+        return self
+
+
+def readSyscallCounters():
+    """Return the read and write syscall counters of this process."""
+    try:
+        with open("/proc/self/io") as handle:
+            counters = dict(line.split(": ") for line in handle)
+        return {"read": int(counters["syscr"]),
+                "write": int(counters["syscw"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+@contextlib.contextmanager
+def countCalls(counts):
+    """Count the os level calls made from Python code."""
+    patched = {}
+
+    def counting(name, function):
+        def counted(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return function(*args, **kwargs)
+        return counted
+
+    for name in ("scandir", "stat", "lstat", "open", "pread", "read"):
+        patched[name] = getattr(os, name)
+        setattr(os, name, counting(name, patched[name]))
+    try:
+        yield
+    finally:
+        for (name, function) in patched.items():
+            setattr(os, name, function)
+
+
+def peakRss():
+    """Return the peak resident set size of this process in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measureChecks(root, names, sampling):
+    """Run checks in one traversal of root and return the measurements."""
+    devnull = open(os.devnull, 'w')
+    walker = cleaner.LibraryWalker(root, sampling=sampling,
+                                   reporter=cleaner.MachineReporter(devnull))
+    for name in names:
+        walker.addCheck(CHECKS[name]())
+    counts = {}
+    rssBefore = peakRss()
+    syscallsBefore = readSyscallCounters()
+    start = time.perf_counter()
+    with countCalls(counts):
+        walker.walk()
+        walker.report()
+    seconds = time.perf_counter() - start
+    syscallsAfter = readSyscallCounters()
+    for (name, value) in syscallsAfter.items():
+        counts[name + "Syscalls"] = value - syscallsBefore[name]
+    devnull.close()
+    return {"seconds": seconds,
+            "files": walker.countFiles,
+            "folders": walker.countFolders,
+            "filesPerSecond": walker.countFiles / seconds if seconds else None,
+            "peakRss": peakRss(),
+            "rssBefore": rssBefore,
+            "calls": counts}
+
+
+def measureInProcess(root, names, sampling):
+    """Measure checks in a fresh process so peak RSS is not shared."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(measureChecks, (root, names, sampling))
+
+
+def generateLibrary(args):
+    """Generate a synthetic library in a folder."""
+    printNotificationNew("Generating synthetic library")
+    generator = LibraryGenerator(args.output, args.seed, args.files,
+                                 args.stubsize, args.cues).generate()
+    info = "Created " + bold("{:,}".format(generator.files)) + " files in "
+    info += bold("{:,}".format(generator.folders)) + " folders below "
+    info += bold(args.output)
+    printNotificationInfo(info)
+
+
+def benchmarkSuite(args):
+    """Time every check on synthetic libraries of several sizes."""
+    printNotificationNew("Benchmarking checks")
+    sampling = None
+    if args.samplebytes is not None:
+        sampling = cleaner.SubtitleSampling(args.samplebytes, 4, 0.95)
+    names = args.checks or sorted(CHECKS)
+    report = {"version": cleaner.APP_VERSION,
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "seed": args.seed,
+              "results": []}
+    for size in args.sizes:
+        root = tempfile.mkdtemp(prefix="cleaner-library-")
+        try:
+            generator = LibraryGenerator(root, args.seed, size,
+                                         args.stubsize, args.cues)
+            generator.generate()
+            info = "Generated " + bold("{:,}".format(generator.files))
+            info += " files in " + bold("{:,}".format(generator.folders))
+            info += " folders"
+            printNotificationInfo(info)
+            runs = [[name] for name in names] + [names]
+            for run in runs:
+                label = run[0] if len(run) == 1 else "all"
+                result = measureInProcess(root, run, sampling)
+                result.update({"size": size, "check": label})
+                report["results"].append(result)
+                info = "%-20s %9d files %9.3f s %12.0f files/s %8.1f MiB" % (
+                    label, result["files"], result["seconds"],
+                    result["filesPerSecond"] or 0,
+                    (result["peakRss"] or 0) / 1048576.0)
+                printNotificationInfo(info)
+        finally:
+            shutil.rmtree(root)
+    with open(args.report, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    printNotificationInfo("Wrote report to " + bold(args.report))
+
+
+def compareReports(args):
+    """Compare two suite reports and flag slower checks."""
+    printNotificationNew("Comparing benchmark reports")
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    known = dict(((result["size"], result["check"]), result)
+                 for result in baseline["results"])
+    regressions = 0
+    for result in current["results"]:
+        old = known.get((result["size"], result["check"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        info = "%-20s size %9d: %.3f s -> %.3f s (%.2fx)" % (
+            result["check"], result["size"], old["seconds"],
+            result["seconds"], ratio)
+        if ratio > 1 + args.tolerance:
+            regressions = regressions + 1
+            printNotificationWarning(info)
+        else:
+            printNotificationInfo(info)
+    printNotificationInfo("Found " + bold(str(regressions)) + " regressions")
+    if regressions:
+        exit(1)
+
+
+def benchmarkDetection(args):
+    """Compare the language detection backends on the subtitles of a folder."""
+    printNotificationNew("Benchmarking language detection backends")
+    root = args.folder
+    temporary = None
+    if root is None:
+        root = temporary = tempfile.mkdtemp(prefix="cleaner-library-")
+        LibraryGenerator(root, args.seed, args.files, 0, args.cues).generate()
+    try:
+        filepaths = []
+        for (subdir, dirs, files) in os.walk(root):
+            filepaths.extend(os.path.join(subdir, name)
+                             for name in sorted(files)
+                             if name.lower().endswith(".srt"))
+        sampling = None
+        if args.samplebytes is not None:
+            sampling = cleaner.SubtitleSampling(args.samplebytes, 4, 0.95)
+        claimed = [cleaner.getDetectableLanguage(
+            os.path.splitext(os.path.splitext(path)[0])[1][1:])
+            for path in filepaths]
+        reference = None
+        for backend in args.backends:
+            # Loading the profiles is not part of the throughput
+            cleaner.getLanguageProfiles()
+            if backend == "numpy":
+                cleaner.getNgramScorer()
+            start = time.perf_counter()
+            results = cleaner.detectSubtitleLanguages(
+                filepaths, chunksize=args.chunksize, sampling=sampling,
+                backend=backend)
+            seconds = time.perf_counter() - start
+            languages = [result[0] if result else None for result in results]
+            if reference is None:
+                reference = languages
+            agree = sum(1 for (language, other) in zip(languages, reference)
+                        if language == other)
+            named = sum(1 for (language, other) in zip(languages, claimed)
+                        if other and language == other)
+            info = "%-12s %6d files %8.3f s %9.1f files/s " % (
+                backend, len(filepaths), seconds,
+                len(filepaths) / seconds if seconds else 0)
+            info += "%5.1f%% agree with %s, %5.1f%% with filenames" % (
+                100.0 * agree / max(1, len(filepaths)), args.backends[0],
+                100.0 * named / max(1, sum(1 for other in claimed if other)))
+            printNotificationInfo(info)
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary)
+
+
+def extractWithPysrt(filepath):
+    """Return the dialogue of an SRT file the way cleaner used to."""
+    pysrt = cleaner.importDependency("pysrt")
+    with open(filepath, 'rb') as handle:
+        subs = pysrt.from_string(handle.read().decode('iso-8859-1'))
+    return "\n".join(cleaner.strip_tags(sub.text) for sub in subs[1:])
+
+
+def benchmarkExtraction(args):
+    """Compare the subtitle text extractor with pysrt on large files."""
+    printNotificationNew("Benchmarking subtitle text extraction")
+    root = tempfile.mkdtemp(prefix="cleaner-subtitles-")
+    try:
+        generator = LibraryGenerator(root, args.seed, 0, cues=args.cues)
+        subtitles = []
+        for (extension, write) in ((".srt", generator.writeSubtitle),
+                                   (".ass", generator.writeAssSubtitle),
+                                   (".sub", generator.writeMicroDvdSubtitle)):
+            path = os.path.join(root, "large.en" + extension)
+            write(path, "en")
+            subtitles.append(path)
+        available = {"cleaner": cleaner.readSubtitleText,
+                     "pysrt": extractWithPysrt}
+        extractors = [(name, available[name]) for name in args.extractors]
+        for path in subtitles:
+            size = os.path.getsize(path)
+            reference = None
+            for (name, extract) in extractors:
+                if name == "pysrt" and not path.endswith(".srt"):
+                    continue
+                seconds = min(timeCall(lambda: extract(path))
+                              for _ in range(args.repeat))
+                words = extract(path).split()
+                if reference is None:
+                    reference = words
+                info = "%-4s %-8s %7.1f MB %8.3f s %8.1f MB/s " % (
+                    os.path.splitext(path)[1], name, size / 1e6, seconds,
+                    size / 1e6 / seconds if seconds else 0)
+                info += "%7d words" % len(words)
+                if words != reference:
+                    info += ", differs from " + extractors[0][0]
+                printNotificationInfo(info)
+    finally:
+        shutil.rmtree(root)
+
+
+def parseList(function):
+    """Return an argparse type for comma separated values."""
+    return lambda value: [function(v) for v in value.split(",")]
+
+
+def initArguments():
+    """Initialize benchmark arguments."""
+    parser = ap.ArgumentParser(description=cleaner.APP_TITLE + " benchmarks")
+    commands = parser.add_subparsers(dest="command")
+    walk = commands.add_parser("walk",
+                               help='compare folder traversal with os.walk')
+    walk.add_argument("--folders",
+                      type=int,
+                      default=500,
+                      help='number of folders to create (default: 500)')
+    walk.add_argument("--files",
+                      type=int,
+                      default=5,
+                      help='number of files per folder (default: 5)')
+    walk.add_argument("--latency",
+                      type=float,
+                      default=0.002,
+                      help='seconds added to every listing (default: 0.002)')
+    walk.add_argument("--walkers",
+                      type=parseList(int),
+                      default=[1, 4, 16],
+                      help='comma separated walker counts (default: 1,4,16)')
+    walk.set_defaults(function=benchmarkWalk)
+    generate = commands.add_parser("generate",
+                                   help='generate a synthetic library')
+    generate.add_argument("output",
+                          help='folder to create the library in')
+    suite = commands.add_parser("suite",
+                                help='time every check on synthetic '
+                                     'libraries of several sizes')
+    suite.add_argument("--sizes",
+                       type=parseList(int),
+                       default=[1000, 10000],
+                       help='comma separated numbers of files '
+                            '(default: 1000,10000)')
+    suite.add_argument("--checks",
+                       type=parseList(str),
+                       help='comma separated checks to time '
+                            '(default: all of ' + ",".join(sorted(CHECKS)) +
+                            ')')
+    suite.add_argument("--samplebytes",
+                       type=int,
+                       help='detect subtitle languages on samples')
+    suite.add_argument("--report",
+                       default="benchmark.json",
+                       help='file to write the JSON report to '
+                            '(default: benchmark.json)')
+    for command in (generate, suite):
+        command.add_argument("--seed",
+                             type=int,
+                             default=1,
+                             help='random seed (default: 1)')
+        command.add_argument("--stubsize",
+                             type=int,
+                             default=1024 * 1024,
+                             help='apparent size of the sparse media stubs '
+                                  '(default: 1048576)')
+        command.add_argument("--cues",
+                             type=int,
+                             default=200,
+                             help='dialogue cues per subtitle (default: 200)')
+    generate.add_argument("--files",
+                          type=int,
+                          default=1000,
+                          help='number of files (default: 1000)')
+    generate.set_defaults(function=generateLibrary)
+    suite.set_defaults(function=benchmarkSuite)
+    compare = commands.add_parser("compare",
+                                  help='compare two suite reports')
+    compare.add_argument("baseline", help='report of the previous version')
+    compare.add_argument("current", help='report of the current version')
+    compare.add_argument("--tolerance",
+                         type=float,
+                         default=0.2,
+                         help='allowed slowdown before a check is flagged '
+                              '(default: 0.2)')
+    compare.set_defaults(function=compareReports)
+    detect = commands.add_parser("detect",
+                                 help='compare the language detection '
+                                      'backends for accuracy and throughput')
+    detect.add_argument("folder",
+                        nargs='?',
+                        help='folder with subtitles (default: a generated '
+                             'library)')
+    detect.add_argument("--backends",
+                        type=parseList(str),
+                        default=["langdetect", "numpy"],
+                        help='comma separated backends, the first is the '
+                             'reference (default: langdetect,numpy)')
+    detect.add_argument("--chunksize",
+                        type=int,
+                        default=64,
+                        help='files scored per batch (default: 64)')
+    detect.add_argument("--samplebytes",
+                        type=int,
+                        help='detect subtitle languages on samples')
+    detect.add_argument("--files",
+                        type=int,
+                        default=1000,
+                        help='number of files of the generated library '
+                             '(default: 1000)')
+    detect.add_argument("--seed",
+                        type=int,
+                        default=1,
+                        help='random seed (default: 1)')
+    detect.add_argument("--cues",
+                        type=int,
+                        default=200,
+                        help='dialogue cues per subtitle (default: 200)')
+    detect.set_defaults(function=benchmarkDetection)
+    extract = commands.add_parser("extract",
+                                  help='compare subtitle text extraction '
+                                       'with pysrt on large files')
+    extract.add_argument("--extractors",
+                         type=parseList(str),
+                         default=["cleaner", "pysrt"],
+                         help='comma separated extractors, the first is the '
+                              'reference (default: cleaner,pysrt)')
+    extract.add_argument("--cues",
+                         type=int,
+                         default=100000,
+                         help='cues per subtitle (default: 100000)')
+    extract.add_argument("--repeat",
+                         type=int,
+                         default=3,
+                         help='runs per extractor, the fastest counts '
+                              '(default: 3)')
+    extract.add_argument("--seed",
+                         type=int,
+                         default=1,
+                         help='random seed (default: 1)')
+    extract.set_defaults(function=benchmarkExtraction)
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        exit()
+    return args
+
+
+def main():
+    """Run the selected benchmark."""
+    args = initArguments()
+    args.function(args)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except cleaner.MissingDependency as error:
+        sys.exit(str(error))
@@ -1,26 +1,32 @@
 #   -*- coding: utf-8 -*-
 """Media Library Cleaner."""
 
-# import sys
+import sys
+import atexit
 import os
-import soundex
 import re
-# import progress
-# import terminaltables
-import io
-import pysrt
+import stat
+import json
+import importlib
+import collections
+import threading
+import time
+import array
+import bisect
+import heapq
+import itertools
+import random
+import tempfile
+import fnmatch
+import contextlib
+import html
+import pickle
 import argparse as ap
-# import ConfigParser
-from terminaltables import AsciiTable
-from progress.bar import Bar
-from langdetect import detect, detect_langs
-# from HTMLParser import HTMLParser
-from html.parser import HTMLParser # for python 3
-
-# from colorama import init, Fore, Back, Style
-from colorama import init, Fore, Style
-from iso639 import is_valid639_1, is_valid639_2, to_iso639_1, to_iso639_2
-from iso639 import to_name as iso639_to_name
+import configparser
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # TODO: Implement thesubdb.com and/or opensubtitles.org
 # TODO: Research possibilities of auto converting sub/idx/sup/ass to srt
@@ -30,46 +36,1215 @@ from iso639 import to_name as iso639_to_name
 APP_TITLE = "Media Library Cleaner"
 APP_VERSION = "0.9 beta"
 APP_STR_PADDING = 100
-dependencies = ["terminaltables", "progress", "colorama", "soundex",
-                "langdetect", "pysrt", "htmlparser", "iso639", "configparser"]
+APP_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "cleaner.ini")
+# === Optional dependencies by module, with the package that provides them.
+#     They are imported by importDependency() once a check needs them, so
+#     cheap checks do not pay for langdetect, iso639 and the like.
+dependencies = {"terminaltables": "terminaltables",
+                "colorama": "colorama", "soundex": "soundex",
+                "langdetect": "langdetect", "iso639": "iso639",
+                "numpy": "numpy"}
 # TODO: Add --checkalldependencies to check all possible needed dependencies
-# TODO: Disable "terminaltables" dependency when --notables is used
-# TODO: Disable "progress" dependency when --noprogress is used
-# TODO: Disable "colorama" dependency when --nocolours is used
-# TODO: Disable "soundex" dependency when --nosoundex is NOT used
-# TODO: Disable "langdetect" dependency when --nolangdetect is used
 
-# === Enable colored output on Windows and other platforms
-if os.name == 'nt':
-    init(convert=True)
-else:
-    init(convert=False)
 
+class MissingDependency(ImportError):
+    """An optional dependency needed by a check is not installed."""
 
-class MLStripper(HTMLParser):
-    """Class for stripping HTML."""
 
-    def __init__(self):
-        """Initialize MLStripper class."""
-        self.reset()
-        self.fed = []
+def importDependency(name):
+    """Import an optional dependency, or raise MissingDependency."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        danger = "Missing dependency \"" + bold(name) + "\", install it with "
+        danger += "\"pip install " + dependencies.get(name, name) + "\""
+        raise MissingDependency(danger)
+
+
+class NoColours(object):
+    """Stand-in for the colorama Fore and Style objects, without colours."""
+
+    def __getattr__(self, name):
+        """Return an empty string for every colour and style."""
+        return ""
+
+
+def readConfiguration(path=APP_CONFIG):
+    """Return the settings of cleaner.ini, empty when it can't be read."""
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+
+def getConfigurationList(config, section, option):
+    """Return a comma separated setting as a list without empty items."""
+    value = config.get(section, option, fallback="")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# === Replaced by the colorama objects in initColours()
+Fore = NoColours()
+Style = NoColours()
+
+
+def initColours():
+    """Enable colored output on Windows and other platforms."""
+    global Fore, Style
+    colorama = importDependency("colorama")
+    colorama.init(convert=(os.name == 'nt'))
+    Fore = colorama.Fore
+    Style = colorama.Style
+    global notificationPrefixes
+    notificationPrefixes = None
+
+
+# === Set by createMLStripper(), html.parser is only needed for subtitles
+MLStripper = None
+
+
+def createMLStripper():
+    """Return a new MLStripper, the class is defined on first use."""
+    global MLStripper
+    if MLStripper is None:
+        from html.parser import HTMLParser
 
-    def handle_data(self, d):
-        """Handle HTML data."""
-        self.fed.append(d)
+        class MLStripper(HTMLParser):
+            """Class for stripping HTML."""
 
-    def get_data(self):
-        """Get HTML data."""
-        return ''.join(self.fed)
+            def __init__(self):
+                """Initialize MLStripper class."""
+                HTMLParser.__init__(self)
+                self.reset()
+                self.fed = []
+
+            def handle_data(self, d):
+                """Handle HTML data."""
+                self.fed.append(d)
+
+            def get_data(self):
+                """Get HTML data."""
+                return ''.join(self.fed)
+    return MLStripper()
 
 
 def strip_tags(html):
     """Strip HTML tags."""
-    s = MLStripper()
+    s = createMLStripper()
     s.feed(html)
     return s.get_data()
 
 
+class Profiler(object):
+    """
+    Collect the timings and counters printed by --profile.
+
+    Timings are kept per stage as [seconds, calls]. Stages timed in walker
+    threads or detection processes are summed, so they can add up to more
+    than the wall time.
+    """
+
+    def __init__(self):
+        """Initialize Profiler class."""
+        self.lock = threading.Lock()
+        self.timings = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def add(self, name, seconds, calls=1):
+        """Add the seconds spent in a stage."""
+        with self.lock:
+            timing = self.timings.setdefault(name, [0.0, 0])
+            timing[0] = timing[0] + seconds
+            timing[1] = timing[1] + calls
+
+    def count(self, name, amount=1):
+        """Add to a counter."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the body of a with statement as a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, function):
+        """Return function wrapped to be timed as a stage."""
+        def timedFunction(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timedFunction
+
+    def take(self):
+        """Return and reset the timings and counters, see merge()."""
+        with self.lock:
+            data = {"timings": dict(self.timings),
+                    "counters": dict(self.counters)}
+            self.timings = collections.OrderedDict()
+            self.counters = collections.OrderedDict()
+        return data
+
+    def merge(self, data):
+        """Add the timings and counters taken from a worker process."""
+        if data is None:
+            return
+        for (name, (seconds, calls)) in data["timings"].items():
+            self.add(name, seconds, calls)
+        for (name, amount) in data["counters"].items():
+            self.count(name, amount)
+
+    def summary(self):
+        """Return the timings, counters and peak memory as a dict."""
+        summary = {"timings": collections.OrderedDict(
+                       (name, {"seconds": round(seconds, 6), "calls": calls})
+                       for (name, (seconds, calls)) in self.timings.items()),
+                   "counters": dict(self.counters)}
+        if resource is not None:
+            # Kilobytes on Linux, the same unit as ps and top
+            summary["peakrss"] = {
+                "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "children":
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+        return summary
+
+
+class NullProfiler(object):
+    """Profiler used without --profile, every method does nothing."""
+
+    nullStage = contextlib.nullcontext()
+
+    def add(self, name, seconds, calls=1):
+        """Ignore the seconds spent in a stage."""
+
+    def count(self, name, amount=1):
+        """Ignore a counter."""
+
+    def stage(self, name):
+        """Return a context manager that does nothing."""
+        return self.nullStage
+
+    def timed(self, name, function):
+        """Return function unchanged."""
+        return function
+
+    def take(self):
+        """Return None, there is nothing to merge."""
+        return None
+
+    def merge(self, data):
+        """Ignore the data of a worker process."""
+
+
+# === Replaced by main() for --profile and by detection workers
+profiler = NullProfiler()
+
+
+class TokenBucket(object):
+    """
+    Allow rate units per second on average, in bursts of up to one second.
+
+    Taking more than is left runs the bucket into debt, which the caller
+    waits out. A large read passes at once and delays the operations after
+    it instead.
+    """
+
+    def __init__(self, rate):
+        """Initialize TokenBucket class."""
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+
+    def take(self, amount, now):
+        """Take amount from the bucket and return the seconds to wait."""
+        self.tokens = min(self.rate,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens = self.tokens - amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class IOScheduler(object):
+    """
+    Throttle file system operations and bytes read to caps per second.
+
+    Folder listings, stat calls, opens and reads call throttle(), which
+    sleeps until the token buckets allow them. After runtime seconds,
+    expired() tells the walker and the checks to stop, so a later run picks
+    up from the scan cache. Walker threads share the scheduler, worker
+    processes get one of their own with a share of the caps, see share().
+    Throttled seconds of threads and processes are summed.
+    """
+
+    def __init__(self, operations=None, bytesPerSecond=None, runtime=None):
+        """Initialize IOScheduler class."""
+        self.lock = threading.Lock()
+        self.operations = operations
+        self.bytesPerSecond = bytesPerSecond
+        self.operationBucket = None
+        if operations:
+            self.operationBucket = TokenBucket(operations)
+        self.byteBucket = None
+        if bytesPerSecond:
+            self.byteBucket = TokenBucket(bytesPerSecond)
+        self.deadline = None
+        if runtime is not None:
+            self.deadline = time.monotonic() + runtime
+        self.stopped = False
+        self.throttled = 0.0
+        self.operationCount = 0
+        self.byteCount = 0
+
+    def throttle(self, operations=1, nbytes=0):
+        """Count an operation and wait until the caps allow it."""
+        with self.lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.operationBucket is not None:
+                wait = self.operationBucket.take(operations, now)
+            if self.byteBucket is not None and nbytes:
+                wait = max(wait, self.byteBucket.take(nbytes, now))
+            self.operationCount = self.operationCount + operations
+            self.byteCount = self.byteCount + nbytes
+            self.throttled = self.throttled + wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def expired(self):
+        """Return True once the runtime is spent."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    def remaining(self):
+        """Return the seconds left of the runtime, or None without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def share(self, count):
+        """
+        Return the arguments of the scheduler of one of count workers.
+
+        Workers get a share of the caps and the runtime that is left, so
+        they stop by the same deadline.
+        """
+        return (self.operations and self.operations / count,
+                self.bytesPerSecond and self.bytesPerSecond / count,
+                self.remaining())
+
+    def take(self):
+        """Return and reset the throttled seconds and counts, see merge()."""
+        with self.lock:
+            data = (self.throttled, self.operationCount, self.byteCount)
+            self.throttled = 0.0
+            self.operationCount = 0
+            self.byteCount = 0
+        return data
+
+    def merge(self, data):
+        """Add the throttled seconds and counts taken from a worker."""
+        if data is None:
+            return
+        with self.lock:
+            self.throttled = self.throttled + data[0]
+            self.operationCount = self.operationCount + data[1]
+            self.byteCount = self.byteCount + data[2]
+
+    def summary(self):
+        """Return the throttled seconds and counts as a dict."""
+        return {"throttled": round(self.throttled, 3),
+                "operations": self.operationCount, "bytes": self.byteCount,
+                "complete": not self.stopped}
+
+
+class NullScheduler(object):
+    """Scheduler used without caps or runtime, nothing is throttled."""
+
+    stopped = False
+
+    def throttle(self, operations=1, nbytes=0):
+        """Allow an operation at once."""
+
+    def expired(self):
+        """Return False, there is no runtime to spend."""
+        return False
+
+    def remaining(self):
+        """Return None, there is no runtime to spend."""
+        return None
+
+    def share(self, count):
+        """Return None, workers do not throttle either."""
+        return None
+
+    def take(self):
+        """Return None, there is nothing to merge."""
+        return None
+
+    def merge(self, data):
+        """Ignore the data of a worker process."""
+
+
+# === Replaced by main() for --maxops, --maxbytes and --maxruntime, and by
+#     worker processes
+ioScheduler = NullScheduler()
+
+
+class Skipped(object):
+    """Type of SKIPPED, unpickled as SKIPPED again from worker results."""
+
+    def __reduce__(self):
+        """Pickle as a reference to SKIPPED."""
+        return "SKIPPED"
+
+
+# === Result of the files left for a later run once --maxruntime is spent
+SKIPPED = Skipped()
+
+
+def initScheduler(scheduling=None):
+    """Set up the scheduler of a worker process, see IOScheduler.share()."""
+    global ioScheduler
+    ioScheduler = NullScheduler()
+    if scheduling is not None:
+        ioScheduler = IOScheduler(*scheduling)
+
+
+def iterCompleted(futures):
+    """
+    Yield futures as they complete, like as_completed().
+
+    Waiting wakes up at the deadline of --maxruntime, so the futures not yet
+    started are cancelled then instead of after the next one completes.
+    Cancelled futures are not yielded.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    pending = set(futures)
+    while pending:
+        timeout = None if ioScheduler.stopped else ioScheduler.remaining()
+        (done, pending) = wait(pending, timeout=timeout,
+                               return_when=FIRST_COMPLETED)
+        if ioScheduler.expired():
+            for future in pending:
+                future.cancel()
+        for future in done:
+            if not future.cancelled():
+                yield future
+
+
+def statEntry(entry):
+    """Return the stat data of a directory entry, counted by --profile."""
+    profiler.count("stat calls")
+    ioScheduler.throttle()
+    return entry.stat()
+
+
+# === Dialogue extraction on raw subtitle bytes, block by block. A block
+#     always ends with a complete line.
+SUBTITLE_BLOCK_SIZE = 256 * 1024
+SRT_NON_DIALOGUE = re.compile(
+    rb'\n[ \t\d]*(?:[:,.][\d:,. \t]*-->[^\r\n]*)?(?=\r?\n)')
+SRT_TIMING = re.compile(rb'^[^\r\n]*-->', re.M)
+SRT_TAG = re.compile(rb'<[^>\r\n]*>')
+SRT_OVERRIDE = re.compile(rb'\{\\[^}\r\n]*\}')
+ASS_DIALOGUE = re.compile(rb'^Dialogue:(?:[^,\r\n]*,){9}([^\r\n]*)', re.M)
+ASS_OVERRIDE = re.compile(rb'\{[^}\r\n]*\}')
+ASS_LINE_BREAK = re.compile(rb'\\[Nn]')
+MICRODVD_LINE = re.compile(rb'^\{\d+\}\{\d*\}([^\r\n]*)', re.M)
+MICRODVD_CODE = re.compile(rb'\{[^}\r\n]*\}')
+
+
+def parseSrtDialogue(block):
+    """Return the dialogue lines of SRT cues, without numbers and timing."""
+    # Every line to drop is matched with the newline in front of it
+    return SRT_NON_DIALOGUE.sub(b'', b'\n' + block)
+
+
+def stripSrtTags(dialogue):
+    """Remove HTML tags and override codes from SRT dialogue."""
+    dialogue = SRT_TAG.sub(b'', dialogue)
+    if b'{\\' in dialogue:
+        dialogue = SRT_OVERRIDE.sub(b'', dialogue)
+    return dialogue
+
+
+def parseAssDialogue(block):
+    """Return the text field of the Dialogue lines of ASS/SSA events."""
+    return b'\n'.join(ASS_DIALOGUE.findall(block))
+
+
+def stripAssOverrides(dialogue):
+    """Remove override tags from ASS/SSA dialogue and apply line breaks."""
+    dialogue = ASS_OVERRIDE.sub(b'', dialogue)
+    return ASS_LINE_BREAK.sub(b'\n', dialogue).replace(b'\\h', b' ')
+
+
+def parseMicroDvdDialogue(block):
+    """Return the text of MicroDVD {start}{end} lines."""
+    return b'\n'.join(MICRODVD_LINE.findall(block))
+
+
+def stripMicroDvdCodes(dialogue):
+    """Remove MicroDVD control codes and split lines on pipes."""
+    return MICRODVD_CODE.sub(b'', dialogue).replace(b'|', b'\n')
+
+
+SUBTITLE_FORMATS = {
+    '.srt': (parseSrtDialogue, stripSrtTags),
+    '.ass': (parseAssDialogue, stripAssOverrides),
+    '.ssa': (parseAssDialogue, stripAssOverrides),
+    '.sub': (parseMicroDvdDialogue, stripMicroDvdCodes),
+}
+
+
+def extractSubtitleDialogue(block, extension, timingsToSkip=0):
+    """
+    Return the dialogue of a block of complete subtitle lines.
+
+    For SRT, everything up to the timing line numbered timingsToSkip is
+    dropped, to skip the first cue as it's usually ads (in English). Returns
+    the dialogue and the number of timing lines still to skip.
+    """
+    (parse, strip) = SUBTITLE_FORMATS.get(extension,
+                                          SUBTITLE_FORMATS['.srt'])
+    if timingsToSkip and parse is parseSrtDialogue:
+        for timing in SRT_TIMING.finditer(block):
+            timingsToSkip = timingsToSkip - 1
+            if not timingsToSkip:
+                block = block[timing.start():]
+                break
+        else:
+            return (b'', timingsToSkip)
+    with profiler.stage("subtitle: parse"):
+        dialogue = parse(block)
+    with profiler.stage("subtitle: strip"):
+        dialogue = strip(dialogue)
+    return (dialogue, 0)
+
+
+def decodeSubtitleDialogue(dialogue):
+    """Return subtitle dialogue bytes as text."""
+    text = dialogue.decode('iso-8859-1').replace('\r', '')
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+
+def iterSubtitleDialogue(handle, extension, skipAds=True,
+                         blockSize=SUBTITLE_BLOCK_SIZE):
+    """Yield the dialogue of a binary subtitle file object block by block."""
+    timingsToSkip = 2 if skipAds else 0
+    rest = b''
+    while True:
+        with profiler.stage("subtitle: read"):
+            data = handle.read(blockSize)
+        profiler.count("bytes read", len(data))
+        ioScheduler.throttle(1, len(data))
+        if data:
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            (block, rest) = (data[:end], data[end:])
+            if not block:
+                continue
+        elif rest:
+            (block, rest) = (rest + b'\n', b'')
+        else:
+            return
+        (dialogue, timingsToSkip) = extractSubtitleDialogue(
+            block, extension, timingsToSkip)
+        if dialogue:
+            yield dialogue
+
+
+def readSubtitleText(filepath):
+    """Return the dialogue of a subtitle file without tags."""
+    extension = os.path.splitext(filepath)[1].lower()
+    ioScheduler.throttle()
+    with profiler.stage("subtitle: open"):
+        handle = open(filepath, 'rb')
+    with handle:
+        dialogue = b'\n'.join(iterSubtitleDialogue(handle, extension))
+    return decodeSubtitleDialogue(dialogue)
+
+
+SubtitleSampling = collections.namedtuple(
+    'SubtitleSampling', ['sampleBytes', 'windows', 'threshold'])
+
+
+def readSubtitleSample(filepath, sampleBytes, windows):
+    """
+    Return dialogue read from windows spread over a subtitle file.
+
+    The windows together hold about sampleBytes bytes. Partial lines at the
+    window edges are dropped, as is the first cue of the file because it's
+    usually ads (in English). Returns the text and whether the whole file
+    was read.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    ioScheduler.throttle()
+    with profiler.stage("subtitle: open"):
+        handle = open(filepath, 'rb')
+    with handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size <= sampleBytes:
+            dialogue = b'\n'.join(iterSubtitleDialogue(handle, extension))
+            return (decodeSubtitleDialogue(dialogue), True)
+        windows = max(1, windows)
+        windowBytes = sampleBytes // windows
+        dialogues = []
+        for window in range(windows):
+            offset = 0
+            if windows > 1:
+                offset = (size - windowBytes) * window // (windows - 1)
+            with profiler.stage("subtitle: read"):
+                handle.seek(offset)
+                data = handle.read(windowBytes)
+            profiler.count("bytes read", len(data))
+            ioScheduler.throttle(1, len(data))
+            start = 0
+            if offset > 0:
+                start = data.find(b'\n') + 1
+            block = data[start:data.rfind(b'\n') + 1]
+            (dialogue, timingsToSkip) = extractSubtitleDialogue(
+                block, extension, 2 if offset == 0 else 0)
+            dialogues.append(dialogue)
+    return (decodeSubtitleDialogue(b'\n'.join(dialogues)), False)
+
+
+# === Text cleaning of langdetect 1.0.7, see LanguageProfiles.extractWords()
+URL_PATTERN = re.compile(r'https?://[-_.?&~;+=/#0-9A-Za-z]{1,2076}')
+MAIL_PATTERN = re.compile(r'[-_.0-9A-Za-z]{1,64}@[-_0-9A-Za-z]{1,255}'
+                          r'[-_.0-9A-Za-z]{1,255}')
+MULTIPLE_SPACES = re.compile(r' {2,}')
+NGRAM_LATIN = re.compile(r'[A-z]')
+# Characters from U+0300 except the Latin Extended Additional block
+NGRAM_NON_LATIN = re.compile('[\u0300-\u1dff\u1f00-\U0010ffff]')
+
+
+class ProfileFactory(object):
+    """Word probabilities of some languages, laid out like langdetect's."""
+
+    seed = None
+
+    def __init__(self, langlist, wordLangProbMap):
+        """Initialize ProfileFactory class."""
+        self.langlist = langlist
+        self.word_lang_prob_map = wordLangProbMap
+
+
+class NgramNormalizer(dict):
+    """Translation table applying langdetect's character normalization."""
+
+    def __init__(self, normalize):
+        """Initialize NgramNormalizer class."""
+        dict.__init__(self)
+        self.normalize = normalize
+
+    def __missing__(self, code):
+        """Normalize a character the first time it is seen."""
+        character = self.normalize(chr(code))
+        self[code] = character
+        return character
+
+
+class ProfileUnpickler(pickle.Unpickler):
+    """Unpickler of plain data that refuses to load classes and functions."""
+
+    def find_class(self, module, name):
+        """Refuse every global, plain data does not need one."""
+        raise pickle.UnpicklingError("global " + module + "." + name +
+                                     " is not allowed")
+
+
+def getLanguageProfilesPath():
+    """Return the path of the language profile cache in the user cache."""
+    cacheHome = os.environ.get("XDG_CACHE_HOME",
+                               os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cacheHome, "media-library-cleaner",
+                        "langprofiles.pickle")
+
+
+class LanguageProfiles(object):
+    """
+    The langdetect language profiles, with detection against candidates.
+
+    Loading the JSON profiles of langdetect takes about half a second per
+    process, so the word probabilities are kept per language in a pickled
+    cache that is rebuilt when the langdetect profiles change. The cache
+    holds plain data only and is read with ProfileUnpickler, its fingerprint
+    before the profiles. The n-grams of a text are extracted once, with
+    memoized character normalization and per word, and scored like
+    langdetect's Detector scores them, see score().
+
+    With candidates, the n-grams are scored against the candidate languages
+    and their closest neighbours first. The neighbours catch texts in similar
+    languages, such as Spanish named as French. All languages are scored
+    when a neighbour wins, the winner is below the threshold, or too few
+    n-grams are known to the candidates.
+    """
+
+    threshold = 0.9
+    coverage = 0.9
+    neighbourCount = 3
+    wordCacheSize = 100000
+    cacheVersion = 2
+    # Parameters of langdetect 1.0.7's Detector
+    maxTextLength = 10000
+    trials = 7
+    alpha = 0.5
+    alphaWidth = 0.05
+    baseFrequency = 10000
+    iterationLimit = 1000
+    convergence = 0.99999
+    probabilityThreshold = 0.1
+
+    def __init__(self, path=None):
+        """Initialize LanguageProfiles class."""
+        importDependency("langdetect")
+        from langdetect import detector_factory
+        from langdetect.language import Language
+        from langdetect.lang_detect_exception import ErrorCode, \
+            LangDetectException
+        from langdetect.utils.ngram import NGram
+        self.Language = Language
+        self.ErrorCode = ErrorCode
+        self.LangDetectException = LangDetectException
+        self.NGram = NGram
+        self.path = path or getLanguageProfilesPath()
+        self.normalizer = NgramNormalizer(NGram.normalize)
+        self.factories = {}
+        self.wordNgrams = {}
+        (self.languages, self.neighbours, self.profiles) = self.load(
+            detector_factory)
+        self.words = set()
+        for profile in self.profiles.values():
+            self.words.update(profile)
+
+    def load(self, detector_factory):
+        """Return the cached profiles, rebuilding a missing or stale cache."""
+        directory = detector_factory.PROFILES_DIRECTORY
+        fingerprint = [self.cacheVersion]
+        for name in sorted(os.listdir(directory)):
+            st = os.stat(os.path.join(directory, name))
+            fingerprint.append((name, st.st_size, st.st_mtime_ns))
+        try:
+            with open(self.path, 'rb') as handle:
+                if ProfileUnpickler(handle).load() == fingerprint:
+                    cached = ProfileUnpickler(handle).load()
+                    return (cached["languages"], cached["neighbours"],
+                            cached["profiles"])
+        except (OSError, EOFError, KeyError, TypeError, ValueError,
+                pickle.UnpicklingError):
+            pass
+        factory = detector_factory.DetectorFactory()
+        factory.load_profile(directory)
+        languages = list(factory.langlist)
+        profiles = dict((language, {}) for language in languages)
+        for (word, probabilities) in factory.word_lang_prob_map.items():
+            for (language, prob) in zip(languages, probabilities):
+                if prob:
+                    profiles[language][word] = prob
+        neighbours = self.findNeighbours(profiles)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = self.path + "." + str(os.getpid())
+            with open(temporary, 'wb') as handle:
+                pickle.dump(fingerprint, handle, pickle.HIGHEST_PROTOCOL)
+                pickle.dump({"languages": languages,
+                             "neighbours": neighbours,
+                             "profiles": profiles}, handle,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path)
+        except OSError:
+            pass
+        return (languages, neighbours, profiles)
+
+    def findNeighbours(self, profiles):
+        """Return the most similar languages per language, by cosine."""
+        norms = dict((language, sum(prob * prob
+                                    for prob in profile.values()) ** 0.5)
+                     for (language, profile) in profiles.items())
+        similarities = dict((language, []) for language in profiles)
+        languages = sorted(profiles)
+        for (index, language1) in enumerate(languages):
+            for language2 in languages[index + 1:]:
+                profile1 = profiles[language1]
+                profile2 = profiles[language2]
+                if len(profile1) > len(profile2):
+                    (profile1, profile2) = (profile2, profile1)
+                product = sum(prob * profile2.get(word, 0.0)
+                              for (word, prob) in profile1.items())
+                similarity = product / (norms[language1] * norms[language2])
+                similarities[language1].append((similarity, language2))
+                similarities[language2].append((similarity, language1))
+        return dict((language, [other for (similarity, other) in
+                                sorted(similar, reverse=True)
+                                [:self.neighbourCount]])
+                    for (language, similar) in similarities.items())
+
+    def factory(self, languages=None):
+        """Return a factory for some languages, or for all of them."""
+        key = None if languages is None else tuple(sorted(languages))
+        factory = self.factories.get(key)
+        if factory is None:
+            langlist = [language for language in self.languages
+                        if languages is None or language in languages]
+            wordLangProbMap = {}
+            for (index, language) in enumerate(langlist):
+                for (word, prob) in self.profiles[language].items():
+                    if word not in wordLangProbMap:
+                        wordLangProbMap[word] = [0.0] * len(langlist)
+                    wordLangProbMap[word][index] = prob
+            factory = ProfileFactory(langlist, wordLangProbMap)
+            self.factories[key] = factory
+        return factory
+
+    def getWordNgrams(self, word, trailingSpace):
+        """Return the n-grams of a normalized word, like langdetect's NGram."""
+        ngrams = []
+        grams = ' '
+        capitalword = False
+        for character in (word + ' ') if trailingSpace else word:
+            last = grams[-1]
+            if last == ' ':
+                grams = ' '
+                capitalword = False
+            elif len(grams) >= self.NGram.N_GRAM:
+                grams = grams[1:]
+            grams = grams + character
+            if character.isupper():
+                if last.isupper():
+                    capitalword = True
+            else:
+                capitalword = False
+            if capitalword:
+                continue
+            for n in range(1, min(len(grams), self.NGram.N_GRAM) + 1):
+                ngram = grams[-n:]
+                if ngram != ' ' and ngram in self.words:
+                    ngrams.append(ngram)
+        return ngrams
+
+    def extractWords(self, text):
+        """
+        Return the words of a text as keys of their n-grams, and the n-grams.
+
+        Joined in order, the n-grams of the words are the n-grams langdetect's
+        Detector extracts from the text. The n-grams of words are memoized
+        across texts.
+        """
+        text = URL_PATTERN.sub(' ', text)
+        text = MAIL_PATTERN.sub(' ', text)
+        text = self.NGram.normalize_vi(text)
+        text = MULTIPLE_SPACES.sub(' ', text[:self.maxTextLength])
+        # Like Detector.cleaning_text(), drop Latin from non Latin texts
+        latinCount = len(NGRAM_LATIN.findall(text))
+        if latinCount * 2 < len(NGRAM_NON_LATIN.findall(text)):
+            text = NGRAM_LATIN.sub('', text)
+        words = text.translate(self.normalizer).split(' ')
+        keys = []
+        wordNgrams = self.wordNgrams
+        if len(wordNgrams) > self.wordCacheSize:
+            wordNgrams.clear()
+        last = len(words) - 1
+        for (index, word) in enumerate(words):
+            if not word:
+                continue
+            key = (word, index < last)
+            if key not in wordNgrams:
+                wordNgrams[key] = self.getWordNgrams(*key)
+            keys.append(key)
+        return (keys, wordNgrams)
+
+    def score(self, ngrams, factory):
+        """
+        Return the languages of the n-grams like detect_langs does.
+
+        This is the scoring of langdetect's Detector on the word
+        probabilities of a factory: every trial updates the probabilities
+        with random n-grams, with jittered smoothing, until one language
+        converges, and the trials are averaged.
+        """
+        if not ngrams:
+            raise self.LangDetectException(self.ErrorCode.CantDetectError,
+                                           "No features in text.")
+        wordLangProbMap = factory.word_lang_prob_map
+        count = len(factory.langlist)
+        totals = [0.0] * count
+        generator = random.Random()
+        generator.seed(factory.seed)
+        for trial in range(self.trials):
+            probabilities = [1.0 / count] * count
+            alpha = self.alpha + generator.gauss(0.0, 1.0) * self.alphaWidth
+            weight = alpha / self.baseFrequency
+            iteration = 0
+            while True:
+                wordProbabilities = wordLangProbMap.get(
+                    generator.choice(ngrams))
+                if wordProbabilities is not None:
+                    probabilities = [prob * (weight + wordProb)
+                                     for (prob, wordProb)
+                                     in zip(probabilities, wordProbabilities)]
+                if iteration % 5 == 0:
+                    total = sum(probabilities)
+                    probabilities = [prob / total for prob in probabilities]
+                    if max(probabilities) > self.convergence or \
+                            iteration >= self.iterationLimit:
+                        break
+                iteration = iteration + 1
+            for index in range(count):
+                totals[index] += probabilities[index] / self.trials
+        languages = [self.Language(language, prob) for (language, prob)
+                     in zip(factory.langlist, totals)
+                     if prob > self.probabilityThreshold]
+        languages.sort(reverse=True)
+        return languages
+
+    def detect(self, text, candidates=None):
+        """Return the languages of a text, trying the candidates first."""
+        (keys, wordNgrams) = self.extractWords(text)
+        ngrams = []
+        for key in keys:
+            ngrams.extend(wordNgrams[key])
+        candidates = [language for language in candidates or ()
+                      if language in self.profiles]
+        if candidates:
+            languages = set(candidates)
+            for language in candidates:
+                languages.update(self.neighbours[language])
+            factory = self.factory(languages)
+            wordLangProbMap = factory.word_lang_prob_map
+            knownNgrams = {}
+            known = []
+            for key in keys:
+                if key not in knownNgrams:
+                    knownNgrams[key] = [ngram for ngram in wordNgrams[key]
+                                        if ngram in wordLangProbMap]
+                known.extend(knownNgrams[key])
+            if known and len(known) >= self.coverage * len(ngrams):
+                languages = self.score(known, factory)
+                if (languages and languages[0].lang in candidates
+                        and languages[0].prob >= self.threshold):
+                    profiler.count("candidate detections")
+                    return languages
+            profiler.count("candidate fallbacks")
+        return self.score(ngrams, self.factory())
+
+
+# === Set by getLanguageProfiles() in every process that detects languages
+languageProfiles = None
+
+
+def getLanguageProfiles():
+    """Return the language profiles, loaded on first use."""
+    global languageProfiles
+    if languageProfiles is None:
+        languageProfiles = LanguageProfiles()
+    return languageProfiles
+
+
+class NgramScorer(object):
+    """
+    Score batches of texts against a NumPy log probability matrix.
+
+    Texts become n-gram count vectors, extracted like langdetect does, and a
+    whole batch is scored against all language profiles in one matrix
+    multiply. Instead of langdetect's random restarts every n-gram counts
+    once, with the same smoothing langdetect applies per update. Languages
+    are returned like detect_langs returns them; the probabilities are
+    sharper, a softmax over the log likelihoods of the whole text.
+    """
+
+    def __init__(self, profiles):
+        """Initialize NgramScorer class."""
+        self.numpy = importDependency("numpy")
+        self.Language = profiles.Language
+        self.profiles = profiles
+        self.languages = list(profiles.languages)
+        self.rows = dict((word, row) for (row, word)
+                         in enumerate(sorted(profiles.words)))
+        smoothing = profiles.alpha / profiles.baseFrequency
+        probabilities = self.numpy.zeros(
+            (len(self.rows), len(self.languages)), dtype=self.numpy.float32)
+        for (column, language) in enumerate(self.languages):
+            for (word, prob) in profiles.profiles[language].items():
+                probabilities[self.rows[word], column] = prob
+        self.logProbabilities = self.numpy.log(probabilities + smoothing)
+        self.wordRows = {}
+
+    def countNgrams(self, text):
+        """Return the rows and counts of the n-grams of a text."""
+        (keys, wordNgrams) = self.profiles.extractWords(text)
+        counts = {}
+        for (key, count) in collections.Counter(keys).items():
+            rows = self.wordRows.get(key)
+            if rows is None:
+                rows = [self.rows[ngram] for ngram in wordNgrams[key]]
+                self.wordRows[key] = rows
+            for row in rows:
+                counts[row] = counts.get(row, 0) + count
+        return counts
+
+    def detect(self, texts):
+        """Return the languages per text, None for texts without n-grams."""
+        numpy = self.numpy
+        if len(self.wordRows) > self.profiles.wordCacheSize:
+            self.wordRows.clear()
+        counted = [self.countNgrams(text) for text in texts]
+        used = sorted(set(row for counts in counted for row in counts))
+        columns = dict((row, column) for (column, row) in enumerate(used))
+        matrix = numpy.zeros((len(texts), len(used)), dtype=numpy.float32)
+        for (index, counts) in enumerate(counted):
+            for (row, count) in counts.items():
+                matrix[index, columns[row]] = count
+        scores = matrix.dot(self.logProbabilities[used]).astype(numpy.float64)
+        scores = scores - scores.max(axis=1, keepdims=True)
+        probabilities = numpy.exp(scores)
+        probabilities = probabilities / probabilities.sum(axis=1,
+                                                          keepdims=True)
+        results = []
+        threshold = self.profiles.probabilityThreshold
+        for (index, counts) in enumerate(counted):
+            if not counts:
+                results.append(None)
+                continue
+            languages = [self.Language(language, float(prob))
+                         for (language, prob)
+                         in zip(self.languages, probabilities[index])
+                         if prob > threshold]
+            languages.sort(reverse=True)
+            results.append(languages)
+        return results
+
+
+# === Set by getNgramScorer() in every process that uses the NumPy backend
+ngramScorer = None
+
+
+def getNgramScorer():
+    """Return the NumPy scorer, built on first use."""
+    global ngramScorer
+    if ngramScorer is None:
+        ngramScorer = NgramScorer(getLanguageProfiles())
+    return ngramScorer
+
+
+def getDetectableLanguage(langcode):
+    """Return the ISO 639-1 code of a language code for detection or None."""
+    iso639 = importDependency("iso639")
+    langcode = langcode.lower()
+    try:
+        if iso639.is_valid639_2(langcode):
+            return iso639.to_iso639_1(langcode)
+    except Exception:
+        return None
+    if iso639.is_valid639_1(langcode):
+        return langcode
+    return None
+
+
+def detectSubtitleLanguage(filepath, sampling=None, candidates=None):
+    """
+    Return the detected language and probabilities of a subtitle file.
+
+    With sampling, only a sample of the file is read. The sample is doubled
+    while the top probability stays below the threshold, until the whole file
+    has been read. With candidates, these languages are tried first, see
+    LanguageProfiles.
+    """
+    detect = getLanguageProfiles().detect
+    profiler.count("subtitle files")
+    if sampling is None:
+        text = readSubtitleText(filepath)
+        with profiler.stage("subtitle: detect"):
+            languages = detect(text, candidates)
+    else:
+        sampleBytes = sampling.sampleBytes
+        while True:
+            (text, complete) = readSubtitleSample(filepath, sampleBytes,
+                                                  sampling.windows)
+            languages = None
+            if text.strip():
+                with profiler.stage("subtitle: detect"):
+                    languages = detect(text, candidates)
+                if languages[0].prob >= sampling.threshold:
+                    break
+            if complete:
+                break
+            sampleBytes = sampleBytes * 2
+        if languages is None:
+            with profiler.stage("subtitle: detect"):
+                languages = detect(text, candidates)
+    probabilities = [[language.lang, language.prob] for language in languages]
+    return (languages[0].lang, probabilities)
+
+
+def initDetectionWorker(profiling=False, backend="langdetect",
+                        scheduling=None):
+    """Load the language profiles once per worker process."""
+    global profiler
+    profiler = Profiler() if profiling else NullProfiler()
+    initScheduler(scheduling)
+    getLanguageProfiles()
+    if backend == "numpy":
+        getNgramScorer()
+
+
+def scoreSubtitleLanguageBatch(filepaths, sampling=None):
+    """
+    Detect the language of a chunk of subtitle files with the NumPy scorer.
+
+    The chunk is scored in one batch. With sampling, the files that stay
+    below the threshold are scored again on doubled samples. Files not read
+    once --maxruntime is spent are SKIPPED.
+    """
+    scorer = getNgramScorer()
+    profiler.count("subtitle files", len(filepaths))
+    results = [SKIPPED] * len(filepaths)
+    pending = list(range(len(filepaths)))
+    sampleBytes = sampling.sampleBytes if sampling is not None else None
+    while pending:
+        read = []
+        for index in pending:
+            if ioScheduler.expired():
+                break
+            if results[index] is SKIPPED:
+                results[index] = None
+            try:
+                if sampling is None:
+                    text = readSubtitleText(filepaths[index])
+                    complete = True
+                else:
+                    (text, complete) = readSubtitleSample(
+                        filepaths[index], sampleBytes, sampling.windows)
+            except Exception:
+                continue
+            read.append((index, text, complete))
+        with profiler.stage("subtitle: detect"):
+            scored = scorer.detect([text for (index, text, complete)
+                                    in read])
+        pending = []
+        for ((index, text, complete), languages) in zip(read, scored):
+            if languages is not None:
+                results[index] = (languages[0].lang,
+                                  [[language.lang, language.prob]
+                                   for language in languages])
+            if not complete and (languages is None or
+                                 languages[0].prob < sampling.threshold):
+                pending.append(index)
+        if sampleBytes is not None:
+            sampleBytes = sampleBytes * 2
+        if ioScheduler.stopped:
+            break
+    return results
+
+
+def detectSubtitleLanguageBatch(filepaths, sampling=None, candidates=None,
+                                backend="langdetect"):
+    """
+    Detect the language of a chunk of subtitle files in a worker.
+
+    Files left once --maxruntime is spent are SKIPPED.
+    """
+    if backend == "numpy":
+        return scoreSubtitleLanguageBatch(filepaths, sampling)
+    results = []
+    for (index, filepath) in enumerate(filepaths):
+        if ioScheduler.expired():
+            results.append(SKIPPED)
+            continue
+        try:
+            results.append(detectSubtitleLanguage(
+                filepath, sampling,
+                candidates[index] if candidates is not None else None))
+        except Exception:
+            results.append(None)
+    return results
+
+
+def detectSubtitleLanguageWorkerBatch(filepaths, sampling=None,
+                                      candidates=None, backend="langdetect"):
+    """Return the detected chunk and what the worker profiled meanwhile."""
+    results = detectSubtitleLanguageBatch(filepaths, sampling, candidates,
+                                          backend)
+    return (results, profiler.take(), ioScheduler.take())
+
+
+def detectSubtitleLanguages(filepaths, jobs=1, progress=None, chunksize=16,
+                            sampling=None, candidates=None,
+                            backend="langdetect"):
+    """
+    Detect the language of subtitle files, in parallel when jobs > 1.
+
+    Chunks of files are handed to a process pool. Results are returned in the
+    order of filepaths, failed detections are None. The progress callable is
+    called once per completed file. Candidates holds the candidate languages
+    per file, or is None to detect against all languages. The numpy backend
+    scores whole chunks at once, see NgramScorer; it ignores candidates.
+    Files left once --maxruntime is spent are SKIPPED.
+    """
+    if jobs <= 1 or len(filepaths) <= chunksize:
+        results = []
+        step = chunksize if backend == "numpy" else 1
+        for start in range(0, len(filepaths), step):
+            if ioScheduler.expired():
+                break
+            chunkCandidates = None
+            if candidates is not None:
+                chunkCandidates = candidates[start:start + step]
+            chunkResults = detectSubtitleLanguageBatch(
+                filepaths[start:start + step], sampling, chunkCandidates,
+                backend)
+            results.extend(chunkResults)
+            if progress is not None:
+                for result in chunkResults:
+                    if result is not SKIPPED:
+                        progress()
+        return results + [SKIPPED] * (len(filepaths) - len(results))
+    # Writes a missing profile cache before the workers read it
+    getLanguageProfiles()
+    from concurrent.futures import ProcessPoolExecutor
+    results = [SKIPPED] * len(filepaths)
+    profiling = isinstance(profiler, Profiler)
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=initDetectionWorker,
+                             initargs=(profiling, backend,
+                                       ioScheduler.share(jobs))) as executor:
+        futures = {}
+        for start in range(0, len(filepaths), chunksize):
+            chunk = filepaths[start:start + chunksize]
+            chunkCandidates = None
+            if candidates is not None:
+                chunkCandidates = candidates[start:start + chunksize]
+            future = executor.submit(detectSubtitleLanguageWorkerBatch, chunk,
+                                     sampling, chunkCandidates, backend)
+            futures[future] = start
+        for future in iterCompleted(futures):
+            start = futures[future]
+            (chunkResults, profiled, throttled) = future.result()
+            profiler.merge(profiled)
+            ioScheduler.merge(throttled)
+            for (offset, result) in enumerate(chunkResults):
+                results[start + offset] = result
+                if progress is not None and result is not SKIPPED:
+                    progress()
+    return results
+
+
+def formatProbabilities(probabilities):
+    """Format language probabilities like langdetect does."""
+    return "[" + ", ".join(lang + ":" + str(prob)
+                           for (lang, prob) in probabilities) + "]"
+
+
 def bold(string):
     """To print text bold."""
     return (Style.BRIGHT + str(string) + Style.NORMAL)
@@ -80,384 +1255,3719 @@ def green(string):
     return (Fore.GREEN + string + Fore.WHITE)
 
 
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class MachineReporter(object):
+    """
+    Stream newline-delimited JSON records to a file object.
+
+    Every finding is written as one "finding" record as soon as it is found,
+    followed by one "summary" record per check. Nothing is kept in memory.
+    """
+
+    def __init__(self, stream):
+        """Initialize MachineReporter class."""
+        self.stream = stream
+
+    def write(self, record):
+        """Write one record as a line of JSON."""
+        self.stream.write(json.dumps(record) + "\n")
+
+    def finding(self, check, severity, message, paths, details):
+        """Write a finding of a check."""
+        self.write({"type": "finding", "check": check, "severity": severity,
+                    "message": ANSI_ESCAPE.sub("", message).strip(),
+                    "paths": list(paths), "details": details or {}})
+
+    def summary(self, check, details):
+        """Write the summary of a check."""
+        self.write({"type": "summary", "check": check, "details": details})
+        self.stream.flush()
+
+    def resolved(self, check, severity, message, paths, details):
+        """Write a finding of --watch that no longer holds."""
+        self.write({"type": "resolved", "check": check,
+                    "severity": severity,
+                    "message": ANSI_ESCAPE.sub("", message).strip(),
+                    "paths": list(paths), "details": details or {}})
+
+    def error(self, message):
+        """Write an error that stops the scan."""
+        self.write({"type": "error",
+                    "message": ANSI_ESCAPE.sub("", message).strip()})
+        self.stream.flush()
+
+
+class TerminalOutput(object):
+    """
+    Buffer lines for stdout and write them in batches.
+
+    The buffer is written once it holds bufferSize characters or when
+    flushInterval seconds passed since the last write, so thousands of
+    findings cost a few large writes instead of one per line.
+    """
+
+    def __init__(self, bufferSize=64 * 1024, flushInterval=0.25):
+        """Initialize TerminalOutput class."""
+        self.bufferSize = bufferSize
+        self.flushInterval = flushInterval
+        self.lines = []
+        self.size = 0
+        self.flushed = time.monotonic()
+
+    def write(self, line):
+        """Buffer a line, writing the buffer when it is full or old."""
+        self.lines.append(line)
+        self.size = self.size + len(line) + 1
+        if (
+                self.size >= self.bufferSize
+                or time.monotonic() - self.flushed >= self.flushInterval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered lines."""
+        if self.lines:
+            sys.stdout.write("\n".join(self.lines) + "\n")
+            self.lines = []
+            self.size = 0
+        sys.stdout.flush()
+        self.flushed = time.monotonic()
+
+
+output = TerminalOutput()
+atexit.register(output.flush)
+
+
+def printLine(line=""):
+    """Print a line through the output buffer."""
+    output.write(line)
+
+
+class ProgressIndicator(object):
+    """
+    Progress on one terminal line, redrawn at most every interval seconds.
+
+    The total is optional, so nothing has to be counted up front. It is
+    written to stderr after the buffered output, and only as often as it
+    changes visibly.
+    """
+
+    def __init__(self, label, unit, total=None, interval=0.2):
+        """Initialize ProgressIndicator class."""
+        self.label = label
+        self.unit = unit
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.started = time.monotonic()
+        self.drawn = 0.0
+
+    def __call__(self, step=1):
+        """Count finished work and redraw when the interval passed."""
+        self.count = self.count + step
+        now = time.monotonic()
+        if now - self.drawn >= self.interval:
+            self.draw(now)
+
+    def draw(self, now):
+        """Write the progress line."""
+        if not self.drawn:
+            output.flush()
+        self.drawn = now
+        line = self.label + ": " + "{:,}".format(self.count)
+        details = []
+        if self.total:
+            line += "/" + "{:,}".format(self.total)
+            details.append("{:.0%}".format(self.count / self.total))
+        line += " " + self.unit
+        elapsed = now - self.started
+        if elapsed > 0:
+            details.append("{:,.0f}/s".format(self.count / elapsed))
+        if details:
+            line += " (" + ", ".join(details) + ")"
+        sys.stderr.write("\r" + line + "\x1b[K")
+        sys.stderr.flush()
+
+    def finish(self):
+        """Draw the final count and end the progress line."""
+        self.draw(time.monotonic())
+        sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+# === Set by initArguments() for --machine, silences the notifications below
+machineReporter = None
+# === Set by initArguments() for --notables and --noprogress, and when
+#     stdout is not a terminal. Library users get no progress bars.
+useTables = True
+useProgress = False
+# === Built on first use and again by initColours()
+notificationPrefixes = None
+
+
+def getNotificationPrefix(kind):
+    """Return the styled prefix of a kind of notification."""
+    global notificationPrefixes
+    if notificationPrefixes is None:
+        notificationPrefixes = {
+            "new": "\n" + green(bold("[ new     ] ")),
+            "info": Fore.CYAN + bold("[ info    ] ") + Fore.WHITE,
+            "warning": Fore.YELLOW + bold("[ warning ] ") + Fore.WHITE,
+            "danger": Fore.RED + bold("[ danger  ] ") + Fore.WHITE,
+        }
+    return notificationPrefixes[kind]
+
+
 def printNotificationTitle(str):
     """To print text with the title styling."""
+    if machineReporter is not None:
+        return
     printString = "+ " + str + " "
     printString = printString . ljust(APP_STR_PADDING, '+')
-    print(green(printString))
+    printLine(green(printString))
+
+
+def printNotificationNew(str):
+    """To print text with the new notification styling."""
+    if machineReporter is not None:
+        return
+    printLine(getNotificationPrefix("new") + str)
+
+
+def printNotificationInfo(str):
+    """To print text with the info notification styling."""
+    if machineReporter is not None:
+        return
+    printLine(getNotificationPrefix("info") + str)
+
+
+def printNotificationWarning(str):
+    """To print text with warning notification styling."""
+    if machineReporter is not None:
+        return
+    printLine(getNotificationPrefix("warning") + str)
+
+
+def printNotificationDanger(str):
+    """To print text with danger notification styling."""
+    if machineReporter is not None:
+        machineReporter.error(str)
+        return
+    printLine(getNotificationPrefix("danger") + str)
+
+
+def printTable(data, title, rightColumns=(), headingRow=True):
+    """Print rows as a table, or as tab separated lines with --notables."""
+    if not useTables:
+        printNotificationInfo(title.strip())
+        for row in data:
+            printLine("\t".join(str(cell).strip() for cell in row))
+        return
+    table = importDependency("terminaltables").AsciiTable(data)
+    table.title = Fore.CYAN + '[info] ' + Fore.WHITE + title
+    table.inner_heading_row_border = headingRow
+    for column in rightColumns:
+        table.justify_columns[column] = 'right'
+    printLine(table.table)
+
+
+SEVERITY_PRINTERS = {
+    "info": printNotificationInfo,
+    "warning": printNotificationWarning,
+    "danger": printNotificationDanger,
+}
+
+# Printers a shard may name in its notifications, see Check.merge()
+NOTIFICATION_PRINTERS = dict((printer.__name__, printer) for printer in (
+    printNotificationTitle, printNotificationNew, printNotificationInfo,
+    printNotificationWarning, printNotificationDanger))
+
+
+def levenshteinWithin(s1, s2, maxDistance):
+    """
+    Calculate levenshtein distance, bounded by maxDistance.
+
+    Only the band of cells within maxDistance of the diagonal is computed and
+    the computation stops as soon as a whole row exceeds maxDistance. Returns
+    maxDistance + 1 for strings that are further apart.
+    """
+    if len(s1) < len(s2):
+        (s1, s2) = (s2, s1)
+    tooFar = maxDistance + 1
+    if len(s1) - len(s2) > maxDistance:
+        return tooFar
+    if len(s2) == 0:
+        return len(s1)
+    previous_row = [j if j <= maxDistance else tooFar
+                    for j in range(len(s2) + 1)]
+    for i in range(1, len(s1) + 1):
+        c1 = s1[i - 1]
+        current_row = [tooFar] * (len(s2) + 1)
+        current_row[0] = i if i <= maxDistance else tooFar
+        rowMinimum = current_row[0]
+        for j in range(max(1, i - maxDistance),
+                       min(len(s2), i + maxDistance) + 1):
+            distance = min(previous_row[j] + 1,
+                           current_row[j - 1] + 1,
+                           previous_row[j - 1] + (c1 != s2[j - 1]))
+            if distance > tooFar:
+                distance = tooFar
+            current_row[j] = distance
+            if distance < rowMinimum:
+                rowMinimum = distance
+        if rowMinimum > maxDistance:
+            return tooFar
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class UnionFind(object):
+    """Disjoint sets with path compression and union by size."""
+
+    def __init__(self):
+        """Initialize UnionFind class."""
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        """Return the representative of the set holding item."""
+        parent = self.parent.setdefault(item, item)
+        if parent == item:
+            self.size.setdefault(item, 1)
+            return item
+        root = self.find(parent)
+        self.parent[item] = root
+        return root
+
+    def union(self, item1, item2):
+        """Merge the sets holding item1 and item2."""
+        root1 = self.find(item1)
+        root2 = self.find(item2)
+        if root1 == root2:
+            return
+        if self.size[root1] < self.size[root2]:
+            (root1, root2) = (root2, root1)
+        self.parent[root2] = root1
+        self.size[root1] += self.size.pop(root2)
+
+    def groups(self):
+        """Return the sets with more than one item as lists."""
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [group for group in groups.values() if len(group) > 1]
+
+
+class ExternalSorter(object):
+    """
+    Sort (key, path) records within a memory budget, in runs on disk.
+
+    Records are buffered with their directory prefix interned, so the
+    folders of one parent share one string. A full buffer is sorted and
+    written to a temporary run file in pickled chunks, which store every
+    prefix once per chunk. items() merges the runs with heapq.merge, so only
+    a chunk per run is in memory, and yields (key, path) in key order with
+    the records of a key in the order they were added.
+    """
+
+    # Bytes of a buffered record besides its strings: the tuple, the
+    # sequence number and the list slot
+    recordBytes = 112
+    chunkRecords = 256
+    maxRuns = 64
+
+    def __init__(self, budget):
+        """Initialize ExternalSorter class."""
+        self.budget = budget
+        self.buffer = []
+        self.prefixes = {}
+        self.bufferBytes = 0
+        self.runs = []
+        self.count = 0
+
+    def add(self, key, path):
+        """Add a record, writing a run when the buffer is full."""
+        (parent, name) = os.path.split(path)
+        prefix = self.prefixes.get(parent)
+        if prefix is None:
+            prefix = self.prefixes[parent] = parent
+            self.bufferBytes += self.recordBytes + sys.getsizeof(parent)
+        self.bufferBytes += (self.recordBytes + sys.getsizeof(key)
+                             + sys.getsizeof(name))
+        self.buffer.append((key, self.count, prefix, name))
+        self.count = self.count + 1
+        if self.bufferBytes >= self.budget:
+            self.spill()
+
+    def spill(self):
+        """Write the buffered records to a sorted run."""
+        # The sequence numbers are unique, so paths are never compared
+        self.buffer.sort()
+        self.runs.append(self.writeRun(self.buffer))
+        self.buffer = []
+        self.prefixes = {}
+        self.bufferBytes = 0
+        if len(self.runs) >= self.maxRuns:
+            # Merged into one run to bound the open files and chunks
+            runs = self.runs
+            self.runs = [self.writeRun(
+                heapq.merge(*[self.readRun(run) for run in runs]))]
+            for run in runs:
+                run.close()
+
+    def writeRun(self, records):
+        """Return a temporary file with the sorted records in chunks."""
+        profiler.count("sorted runs written")
+        run = tempfile.TemporaryFile(prefix="cleaner-")
+        chunk = []
+        prefixes = {}
+        for (key, sequence, prefix, name) in records:
+            chunk.append((key, sequence, prefixes.setdefault(prefix, prefix),
+                          name))
+            if len(chunk) == self.chunkRecords:
+                pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+                prefixes = {}
+        if chunk:
+            pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+        profiler.count("sorted run bytes", run.tell())
+        return run
+
+    def readRun(self, run):
+        """Yield the records of a run."""
+        run.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(run)
+            except EOFError:
+                return
+            for record in chunk:
+                yield record
+
+    def items(self):
+        """Yield (key, path) for all records, sorted by key."""
+        self.buffer.sort()
+        runs = [self.readRun(run) for run in self.runs]
+        for (key, sequence, prefix, name) in heapq.merge(iter(self.buffer),
+                                                         *runs):
+            yield (key, os.path.join(prefix, name))
+
+    def groups(self):
+        """Yield (key, paths) per key, the paths as an iterator."""
+        for (key, records) in itertools.groupby(self.items(),
+                                                key=lambda item: item[0]):
+            yield (key, (path for (key, path) in records))
+
+    def close(self):
+        """Delete the runs and the buffer."""
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+        self.prefixes = {}
+
+
+YEAR_FOLDER = r'[0-9]{4}'
+SEASON_FOLDER = (r'(?:season|series|seizoen|saison|staffel|temporada)'
+                 r'[ ._-]*[0-9]+|s[0-9]{1,2}|specials')
+
+
+class FolderRules(object):
+    """
+    Folder name rules compiled into a single regular expression.
+
+    Rules are globs or regular expressions that have to match the whole
+    folder name, case-insensitively.
+    """
+
+    def __init__(self, globs=(), patterns=()):
+        """Initialize FolderRules class."""
+        self.rules = list(globs) + list(patterns)
+        parts = [fnmatch.translate(glob) for glob in globs]
+        parts.extend("(?:" + pattern + r")\Z" for pattern in patterns)
+        self.regex = None
+        if parts:
+            self.regex = re.compile("|".join(parts), re.IGNORECASE)
+
+    def __bool__(self):
+        """Return whether there are any rules."""
+        return self.regex is not None
+
+    def matches(self, name):
+        """Return whether a folder name matches one of the rules."""
+        return self.regex is not None and self.regex.match(name) is not None
+
+
+def getIgnoreRules(ignoreyearfolders, ignoreseasonfolders=False):
+    """Return the rules for folders the folder name checks ignore."""
+    patterns = []
+    if ignoreyearfolders:
+        patterns.append(YEAR_FOLDER)
+    if ignoreseasonfolders:
+        patterns.append(SEASON_FOLDER)
+    return FolderRules(patterns=patterns)
+
+
+def getPruneRules(config):
+    """Return the rules for folders that are not traversed, from settings."""
+    return FolderRules(getConfigurationList(config, "Prune", "folders"),
+                       getConfigurationList(config, "Prune", "patterns"))
+
+
+def getConfiguredExtensions(config, section, default):
+    """Return the whitelisted extensions of a section minus the blacklist."""
+    whitelist = getConfigurationList(config, section, "whitelist")
+    blacklist = getConfigurationList(config, section, "blacklist")
+    extensions = ["." + ext.lower().lstrip(".") for ext in whitelist]
+    ignored = set("." + ext.lower().lstrip(".") for ext in blacklist)
+    return [ext for ext in (extensions or default) if ext not in ignored]
+
+
+class MediaIndex(object):
+    """
+    Media filenames of one folder by name without extension.
+
+    Subtitles are matched with one or two dictionary lookups, the sorted
+    names find the closest media file for a subtitle that does not match.
+    """
+
+    subtitleFlags = frozenset(["forced", "sdh", "hi", "cc"])
+
+    def __init__(self, names, mediaExts, exclusions=()):
+        """Initialize MediaIndex class."""
+        self.stems = {}
+        for name in names:
+            (stem, extension) = os.path.splitext(name)
+            extension = extension.lower()
+            if extension not in mediaExts:
+                continue
+            lowerName = name.lower()
+            if any(exclusion in lowerName for exclusion in exclusions):
+                continue
+            self.stems.setdefault(stem, []).append(name)
+        self.sortedStems = None
+
+    def __len__(self):
+        """Return the number of media names."""
+        return len(self.stems)
+
+    def match(self, subtitleName):
+        """Return the media name of a subtitle filename, or None."""
+        stem = os.path.splitext(subtitleName)[0]
+        (base, flag) = os.path.splitext(stem)
+        while flag and flag[1:].lower() in self.subtitleFlags:
+            stem = base
+            (base, flag) = os.path.splitext(stem)
+        if stem in self.stems:
+            return stem
+        # Without the language code
+        if base in self.stems:
+            return base
+        return None
+
+    def closest(self, subtitleName):
+        """Return the media filenames sharing the longest prefix."""
+        if self.sortedStems is None:
+            self.sortedStems = sorted(self.stems)
+        stems = self.sortedStems
+        position = bisect.bisect_left(stems, subtitleName)
+        neighbours = stems[max(0, position - 1):position + 1]
+        stem = max(neighbours,
+                   key=lambda name: len(os.path.commonprefix(
+                       [name, subtitleName])))
+        return sorted(self.stems[stem])
+
+
+def getIsoLanguageCodeFromFilename(filename):
+    """
+    Return the iso language from filenames ending with a language code.
+
+    Currently a tricky way of getting the part before the extension is used
+    Assuming that only a dot is used before and after the language code
+    TODO: Improve language code extraction using regex
+    """
+    (fileName, fileExt) = os.path.splitext(filename)
+    (filenameWithoutLang, langCode) = os.path.splitext(fileName)
+    return langCode[1:]
+
+
+class Check(object):
+    """
+    Base class for checks that run inside the shared traversal.
+
+    Checks only override the visitors they need, the walker skips the others.
+    Notifications are queued and printed per check once the traversal ends,
+    so the output of checks sharing one pass does not interleave. With a
+    MachineReporter, findings are streamed as they are found instead and
+    nothing is queued. With maxFindings, only that many findings per check
+    are printed and the others are counted per severity.
+
+    For sharded scans, partial() returns the state a check built from its
+    shard and merge() adds the partial state of another shard to it. Checks
+    with externalSort keep their records on disk within memoryBudget bytes
+    when the walker sets one.
+    """
+
+    name = None
+    cache = None
+    jobs = 1
+    sampling = None
+    preferredLanguages = None
+    detectBackend = "langdetect"
+    mediaExts = ['.mp4', '.mkv', '.avi', '.m4v']
+    subtitleExts = ['.srt', '.sub', '.ass']
+    needsStat = False
+    reporter = None
+    maxFindings = None
+    externalSort = False
+    memoryBudget = None
+
+    def __init__(self):
+        """Initialize Check class."""
+        self.notifications = []
+        self.severities = {}
+        self.shownFindings = 0
+        self.hiddenFindings = {}
+
+    def notify(self, printer, message):
+        """Queue a notification to print when the check reports."""
+        if self.reporter is None:
+            self.notifications.append((printer, message))
+
+    def emit(self, severity, message, paths=(), details=None):
+        """Report a finding, streamed to the reporter or queued for print."""
+        if self.reporter is not None:
+            self.reporter.finding(self.name, severity, message, paths,
+                                  details)
+        elif self.shown(severity):
+            # Remembered so merge() knows which notifications are findings
+            self.severities[len(self.notifications)] = severity
+            self.notify(SEVERITY_PRINTERS[severity], message)
+
+    def shown(self, severity):
+        """Return whether a finding is printed, counting those that aren't."""
+        if self.maxFindings is None or self.shownFindings < self.maxFindings:
+            self.shownFindings = self.shownFindings + 1
+            return True
+        self.hiddenFindings[severity] = (
+            self.hiddenFindings.get(severity, 0) + 1)
+        return False
+
+    def flushNotifications(self):
+        """Print the queued notifications."""
+        for printer, message in self.notifications:
+            printer(message)
+        self.notifications = []
+        self.severities = {}
+
+    def summary(self):
+        """Return the results of the check as a JSON serializable dict."""
+        return {}
+
+    def start(self):
+        """Prepare for the traversal, once the walker set the attributes."""
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Visit a directory with its sub directory and file entries."""
+
+    def visitFile(self, subdir, entry):
+        """Visit a file entry of a directory."""
+
+    def finish(self):
+        """Print the results after the traversal."""
+
+    def partial(self):
+        """Return the state built from a shard as plain data."""
+        findings = []
+        if isinstance(self.reporter, ShardReporter):
+            findings = self.reporter.findings.get(self.name, [])
+        return {"notifications": [(printer.__name__, message)
+                                  for (printer, message)
+                                  in self.notifications],
+                "severities": self.severities, "findings": findings}
+
+    def merge(self, partial):
+        """
+        Add the state of a shard and replay the findings it queued.
+
+        Returns the index in self.notifications of every notification of the
+        shard, so checks can refer to them after merging.
+        """
+        for finding in partial["findings"]:
+            self.reporter.finding(self.name, *finding)
+        severities = partial["severities"]
+        positions = []
+        for (index, (printer, message)) in enumerate(
+                partial["notifications"]):
+            positions.append(len(self.notifications))
+            if index in severities:
+                self.emit(severities[index], message)
+            else:
+                self.notify(NOTIFICATION_PRINTERS[printer], message)
+        return positions
+
+    def detectLanguages(self, subtitles, progress=None):
+        """
+        Return (language, probabilities) per (filepath, st, langcode).
+
+        Cached results are reused, the others are detected with self.jobs
+        processes. With preferredLanguages, the claimed language and the
+        preferred languages are tried first. Failed detections are None,
+        files left once --maxruntime is spent are SKIPPED.
+        """
+        results = [None] * len(subtitles)
+        missing = []
+        for (index, (filepath, st, langcode)) in enumerate(subtitles):
+            if self.cache is not None and st is not None:
+                result = self.cache.getFileResult(filepath, st)
+                if result is not None and result['language'] is not None:
+                    results[index] = (result['language'],
+                                      result['probabilities'])
+                    if progress is not None:
+                        progress()
+                    continue
+            missing.append(index)
+        filepaths = [subtitles[index][0] for index in missing]
+        candidates = None
+        if self.preferredLanguages is not None:
+            candidates = []
+            claimedLanguages = {}
+            for index in missing:
+                langcode = subtitles[index][2]
+                if langcode not in claimedLanguages:
+                    claimedLanguages[langcode] = getDetectableLanguage(
+                        langcode)
+                claimed = claimedLanguages[langcode]
+                candidates.append(([claimed] if claimed else [])
+                                  + self.preferredLanguages)
+        detected = detectSubtitleLanguages(filepaths, self.jobs, progress,
+                                           sampling=self.sampling,
+                                           candidates=candidates,
+                                           backend=self.detectBackend)
+        for (index, result) in zip(missing, detected):
+            results[index] = result
+            (filepath, st, langcode) = subtitles[index]
+            if result is not None and result is not SKIPPED \
+                    and self.cache is not None and st:
+                self.cache.setFileResult(filepath, st, langcode, result[0],
+                                         result[1])
+        return results
+
+    def analyze(self):
+        """Run work deferred until after the traversal."""
+
+    def report(self):
+        """Print the queued notifications followed by the results."""
+        with profiler.stage(self.name + ": analyze"):
+            self.analyze()
+        with profiler.stage(self.name + ": output"):
+            if self.reporter is not None:
+                self.reporter.summary(self.name, self.summary())
+                return
+            self.flushNotifications()
+            self.finish()
+            for (severity, count) in sorted(self.hiddenFindings.items()):
+                info = "Not showing " + bold("{:,}".format(count)) + " more "
+                info += severity + " findings of --" + self.name
+                info += ", see --maxfindings"
+                printNotificationInfo(info)
+
+
+CachedStat = collections.namedtuple(
+    'CachedStat',
+    ['st_mode', 'st_ino', 'st_dev', 'st_nlink', 'st_size', 'st_mtime_ns'])
+
+
+class CachedEntry(object):
+    """Stand-in for os.DirEntry restored from the scan cache."""
+
+    __slots__ = ('name', 'path', 'isDir', 'isSymlink', 'statResult')
+
+    def __init__(self, subdir, name, isDir, isSymlink, statResult):
+        """Initialize CachedEntry class."""
+        self.name = name
+        self.path = os.path.join(subdir, name)
+        self.isDir = isDir
+        self.isSymlink = isSymlink
+        self.statResult = statResult
+
+    def is_dir(self, follow_symlinks=True):
+        """Return True if the entry is a directory."""
+        return self.isDir
+
+    def is_file(self, follow_symlinks=True):
+        """Return True if the entry is a regular file."""
+        return (self.statResult is not None
+                and stat.S_ISREG(self.statResult.st_mode))
+
+    def is_symlink(self):
+        """Return True if the entry is a symbolic link."""
+        return self.isSymlink
+
+    def stat(self, follow_symlinks=True):
+        """Return the cached stat data of the entry."""
+        if self.statResult is None:
+            raise OSError("No stat data cached for " + self.path)
+        return self.statResult
+
+
+def getSizeClass(size):
+    """Return the size class of a file as used by the garbage collector."""
+    if size == 0:
+        return "empty"
+    if size < (1024 * 4):
+        return "small"
+    return "normal"
+
+
+class ScanCache(object):
+    """
+    Persistent SQLite cache of per-directory and per-file scan results.
+
+    Directory listings are keyed by path and st_mtime_ns, so directories that
+    did not change are served from the cache without listing or stat calls
+    for their entries. File results, subtitle signatures, content hashes and
+    embedded tracks are keyed by path, st_size and st_mtime_ns. Files
+    rewritten in place do not touch the directory mtime, their stat data is
+    refreshed once their directory changes.
+    """
+
+    # Listings are checked against the folder mtime, see WatchCache
+    trustsListings = False
+
+    def __init__(self, path):
+        """Initialize ScanCache class."""
+        self.path = path
+        # Folders may be listed from walker threads, see LibraryWalker
+        self.lock = threading.RLock()
+        import sqlite3
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                listing TEXT,
+                listinghash TEXT,
+                soundex TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                langcode TEXT,
+                sizeclass TEXT,
+                language TEXT,
+                probabilities TEXT
+            );
+            CREATE TABLE IF NOT EXISTS signatures (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                scheme TEXT,
+                signature BLOB
+            );
+            CREATE TABLE IF NOT EXISTS tracks (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                scheme TEXT,
+                tracks TEXT
+            );
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                scheme TEXT,
+                hash BLOB,
+                PRIMARY KEY (path, scheme)
+            );
+        """)
+        self.hits = 0
+        self.misses = 0
+
+    def query(self, sql, parameters):
+        """Execute a statement and return its first row."""
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()
+
+    def getListing(self, subdir, mtime):
+        """Return the cached (dirs, files) entries of an unchanged folder."""
+        row = self.query(
+            "SELECT listing FROM directories WHERE path = ? AND mtime_ns = ?",
+            (subdir, mtime))
+        with self.lock:
+            if row is None or row[0] is None:
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+        dirs = []
+        files = []
+        for (name, isDir, isSymlink, statFields) in json.loads(row[0]):
+            statResult = None
+            if statFields is not None:
+                statResult = CachedStat(*statFields)
+            entry = CachedEntry(subdir, name, isDir, isSymlink, statResult)
+            if isDir:
+                dirs.append(entry)
+            else:
+                files.append(entry)
+        return (dirs, files)
+
+    def setListing(self, subdir, mtime, dirs, files):
+        """Store the entries of a folder with the mtime they were read at."""
+        listing = []
+        for (isDir, entries) in ((True, dirs), (False, files)):
+            for entry in entries:
+                try:
+                    st = statEntry(entry)
+                    statFields = [st.st_mode, st.st_ino, st.st_dev,
+                                  st.st_nlink, st.st_size, st.st_mtime_ns]
+                except OSError:
+                    statFields = None
+                listing.append([entry.name, isDir, entry.is_symlink(),
+                                statFields])
+        listing = json.dumps(listing)
+        import hashlib
+        listinghash = hashlib.sha1(listing.encode('utf-8')).hexdigest()
+        self.query(
+            "INSERT INTO directories (path, mtime_ns, listing, listinghash) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "mtime_ns = excluded.mtime_ns, listing = excluded.listing, "
+            "listinghash = excluded.listinghash",
+            (subdir, mtime, listing, listinghash))
+
+    def getSoundex(self, subdir):
+        """Return the cached soundex of a folder name or None."""
+        row = self.query(
+            "SELECT soundex FROM directories WHERE path = ?",
+            (subdir,))
+        if row is None:
+            return None
+        return row[0]
+
+    def setSoundex(self, subdir, soundexOfName):
+        """Store the soundex of a folder name."""
+        self.query(
+            "INSERT INTO directories (path, soundex) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET soundex = excluded.soundex",
+            (subdir, soundexOfName))
+
+    def getFileResult(self, filepath, st):
+        """Return the cached results of an unchanged file as a dict or None."""
+        row = self.query(
+            "SELECT langcode, sizeclass, language, probabilities FROM files "
+            "WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (filepath, st.st_size, st.st_mtime_ns))
+        if row is None:
+            return None
+        probabilities = None
+        if row[3] is not None:
+            probabilities = json.loads(row[3])
+        return {'langcode': row[0], 'sizeclass': row[1],
+                'language': row[2], 'probabilities': probabilities}
+
+    def setFileResult(self, filepath, st, langcode, language, probabilities):
+        """Store the detected language of a file with its size and mtime."""
+        if probabilities is not None:
+            probabilities = json.dumps(probabilities)
+        self.query(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, langcode, "
+            "sizeclass, language, probabilities) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (filepath, st.st_size, st.st_mtime_ns, langcode,
+             getSizeClass(st.st_size), language, probabilities))
+
+    def getSignature(self, filepath, st, scheme):
+        """Return the cached signature of an unchanged file or None."""
+        row = self.query(
+            "SELECT signature FROM signatures WHERE path = ? AND size = ? "
+            "AND mtime_ns = ? AND scheme = ?",
+            (filepath, st.st_size, st.st_mtime_ns, scheme))
+        if row is None:
+            return None
+        return array.array('Q', row[0]).tolist()
+
+    def setSignature(self, filepath, st, scheme, signature):
+        """Store the signature of a file with its size and mtime."""
+        self.query(
+            "INSERT OR REPLACE INTO signatures (path, size, mtime_ns, "
+            "scheme, signature) VALUES (?, ?, ?, ?, ?)",
+            (filepath, st.st_size, st.st_mtime_ns, scheme,
+             array.array('Q', signature).tobytes()))
+
+    def getTracks(self, filepath, st, scheme):
+        """Return the cached embedded tracks of an unchanged file or None."""
+        row = self.query(
+            "SELECT tracks FROM tracks WHERE path = ? AND size = ? "
+            "AND mtime_ns = ? AND scheme = ?",
+            (filepath, st.st_size, st.st_mtime_ns, scheme))
+        if row is None:
+            return None
+        return [EmbeddedTrack(*track) for track in json.loads(row[0])]
+
+    def setTracks(self, filepath, st, scheme, tracks):
+        """Store the embedded tracks of a file with its size and mtime."""
+        self.query(
+            "INSERT OR REPLACE INTO tracks (path, size, mtime_ns, scheme, "
+            "tracks) VALUES (?, ?, ?, ?, ?)",
+            (filepath, st.st_size, st.st_mtime_ns, scheme,
+             json.dumps(tracks)))
+
+    def getHash(self, filepath, st, scheme):
+        """Return the cached content hash of an unchanged file or None."""
+        row = self.query(
+            "SELECT hash FROM hashes WHERE path = ? AND size = ? "
+            "AND mtime_ns = ? AND scheme = ?",
+            (filepath, st.st_size, st.st_mtime_ns, scheme))
+        if row is None:
+            return None
+        return bytes(row[0])
+
+    def setHash(self, filepath, st, scheme, digest):
+        """Store the content hash of a file with its size and mtime."""
+        self.query(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, scheme, "
+            "hash) VALUES (?, ?, ?, ?, ?)",
+            (filepath, st.st_size, st.st_mtime_ns, scheme, digest))
+
+    def commit(self):
+        """Write pending results to disk."""
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        """Commit and close the cache."""
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+# === Format of the partial results of LibraryWalker.partial(), written by
+#     --shard and read by --mergeshards
+SHARD_VERSION = 3
+
+
+def encodeShard(value):
+    """
+    Return plain data as JSON values that decodeShardObject() restores.
+
+    Every dict becomes {"d": [[key, value], ...]} and every tuple {"t": [...]},
+    so dicts keep keys that are not strings and tuples stay tuples.
+    """
+    if isinstance(value, dict):
+        return {"d": [[encodeShard(key), encodeShard(item)]
+                      for (key, item) in value.items()]}
+    if isinstance(value, tuple):
+        return {"t": [encodeShard(item) for item in value]}
+    if isinstance(value, list):
+        return [encodeShard(item) for item in value]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError("can not write " + type(value).__name__ + " to a shard")
+
+
+def decodeShardObject(data):
+    """Restore a dict or tuple encoded by encodeShard(), see json.load()."""
+    if list(data) == ["d"]:
+        return dict((key, item) for (key, item) in data["d"])
+    if list(data) == ["t"]:
+        return tuple(data["t"])
+    raise ValueError("unexpected object in shard")
+
+
+class ShardReporter(object):
+    """Collect the findings of a shard per check, until they are merged."""
+
+    def __init__(self):
+        """Initialize ShardReporter class."""
+        self.findings = {}
+
+    def finding(self, check, severity, message, paths, details):
+        """Keep a finding of a check."""
+        self.findings.setdefault(check, []).append(
+            (severity, message, list(paths), details))
+
+    def summary(self, check, details):
+        """Ignore the summaries, they are reported after merging."""
+
+
+class LibraryWalker(object):
+    """
+    Traverse a scan folder once with os.scandir for all registered checks.
+
+    Directories are visited top-down in the same order as os.walk. The
+    os.DirEntry objects are handed to the checks so type and stat data is
+    fetched at most once per entry. With a ScanCache, unchanged folders are
+    restored from the cache instead of being listed.
+
+    With more than one walker, folders are listed by a thread pool and the
+    checks visit them in the main thread as the listings arrive. In ordered
+    mode the listings are prefetched but visited in the serial order, so
+    reports stay diffable.
+
+    A memoryBudget in bytes is shared by the checks with externalSort.
+
+    With a shard of (index, count), only every count-th top-level folder,
+    sorted by name, is traversed starting at index, and only the first shard
+    visits the scan folder itself. partial() and merge() carry the counts
+    and the state of the checks from one walker to another.
+    """
+
+    def __init__(self, scanfolder, cache=None, jobs=1, sampling=None,
+                 walkers=1, ordered=False, reporter=None,
+                 preferredLanguages=None, detectBackend="langdetect",
+                 prune=None, mediaExts=None, subtitleExts=None,
+                 maxFindings=None, shard=None, memoryBudget=None):
+        """Initialize LibraryWalker class."""
+        self.scanfolder = scanfolder
+        self.shard = shard
+        self.memoryBudget = memoryBudget
+        self.prune = prune if prune is not None else FolderRules()
+        self.mediaExts = mediaExts
+        self.subtitleExts = subtitleExts
+        self.maxFindings = maxFindings
+        self.progress = None
+        self.reporter = reporter
+        self.preferredLanguages = preferredLanguages
+        self.detectBackend = detectBackend
+        self.cache = cache
+        self.jobs = jobs
+        self.sampling = sampling
+        self.walkers = walkers
+        self.ordered = ordered
+        self.checks = []
+        self.countFiles = 0
+        self.countFolders = 0
+        self.countPruned = 0
+        self.prefetchStat = False
+
+    def addCheck(self, check):
+        """Register a check for the traversal."""
+        check.cache = self.cache
+        check.jobs = self.jobs
+        check.sampling = self.sampling
+        check.reporter = self.reporter
+        check.preferredLanguages = self.preferredLanguages
+        check.detectBackend = self.detectBackend
+        check.maxFindings = self.maxFindings
+        if self.mediaExts is not None:
+            check.mediaExts = self.mediaExts
+        if self.subtitleExts is not None:
+            check.subtitleExts = self.subtitleExts
+        self.checks.append(check)
+        return check
+
+    def visitors(self, name):
+        """Return the bound visitors of the checks overriding a method."""
+        base = getattr(Check, name)
+        return [profiler.timed(check.name + ": visit", getattr(check, name))
+                for check in self.checks
+                if getattr(type(check), name) is not base]
+
+    def listDirectory(self, subdir):
+        """Return the sub directory and file entries, or None on errors."""
+        mtime = None
+        if self.cache is not None and self.cache.trustsListings:
+            listing = self.cache.getListing(subdir, mtime)
+            if listing is not None:
+                return listing
+        elif self.cache is not None:
+            try:
+                profiler.count("stat calls")
+                ioScheduler.throttle()
+                mtime = os.stat(subdir).st_mtime_ns
+            except OSError:
+                return None
+            listing = self.cache.getListing(subdir, mtime)
+            if listing is not None:
+                return listing
+        dirs = []
+        files = []
+        ioScheduler.throttle()
+        try:
+            with os.scandir(subdir) as iterator:
+                for entry in iterator:
+                    try:
+                        isDir = entry.is_dir()
+                    except OSError:
+                        isDir = False
+                    if isDir:
+                        dirs.append(entry)
+                    else:
+                        files.append(entry)
+                        if self.prefetchStat:
+                            # DirEntry keeps the result for the checks
+                            try:
+                                statEntry(entry)
+                            except OSError:
+                                pass
+        except OSError:
+            return None
+        if self.cache is not None:
+            self.cache.setListing(subdir, mtime, dirs, files)
+        return (dirs, files)
+
+    def subdirectories(self, subdir, dirs):
+        """Return the paths to descend into, in traversal order."""
+        # Like os.walk, symlinked folders are listed but not followed
+        paths = [entry.path for entry in dirs if not entry.is_symlink()]
+        if self.shard is not None and subdir == self.scanfolder:
+            (index, count) = self.shard
+            # Every host lists the same names, so shards do not overlap
+            selected = set(sorted(paths)[index::count])
+            paths = [path for path in paths if path in selected]
+        if self.prune:
+            pruned = len(paths)
+            paths = [path for path in paths
+                     if not self.prune.matches(os.path.basename(path))]
+            self.countPruned += pruned - len(paths)
+        return paths
+
+    def listings(self):
+        """Yield (subdir, dirs, files) for every readable folder."""
+        listDirectory = profiler.timed("walker: list", self.listDirectory)
+        if self.walkers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            from concurrent.futures import FIRST_COMPLETED, wait
+        if self.walkers <= 1:
+            stack = [self.scanfolder]
+            while stack:
+                subdir = stack.pop()
+                listing = listDirectory(subdir)
+                if listing is None:
+                    continue
+                yield (subdir,) + listing
+                stack.extend(reversed(self.subdirectories(subdir,
+                                                          listing[0])))
+        elif self.ordered:
+            with ThreadPoolExecutor(max_workers=self.walkers) as executor:
+                stack = [(self.scanfolder,
+                          executor.submit(listDirectory,
+                                          self.scanfolder))]
+                while stack:
+                    (subdir, future) = stack.pop()
+                    listing = future.result()
+                    if listing is None:
+                        continue
+                    yield (subdir,) + listing
+                    for path in reversed(self.subdirectories(subdir,
+                                                             listing[0])):
+                        stack.append(
+                            (path, executor.submit(listDirectory, path)))
+        else:
+            with ThreadPoolExecutor(max_workers=self.walkers) as executor:
+                pending = {executor.submit(listDirectory,
+                                           self.scanfolder): self.scanfolder}
+                while pending:
+                    (done, notDone) = wait(pending,
+                                           return_when=FIRST_COMPLETED)
+                    for future in done:
+                        subdir = pending.pop(future)
+                        listing = future.result()
+                        if listing is None:
+                            continue
+                        yield (subdir,) + listing
+                        for path in self.subdirectories(subdir,
+                                                        listing[0]):
+                            future = executor.submit(listDirectory, path)
+                            pending[future] = path
+
+    def walk(self):
+        """Visit every directory and file once."""
+        for subdir in self.iterWalk():
+            pass
+
+    def iterWalk(self):
+        """Visit every directory and file once, yielding each folder."""
+        directoryVisitors = self.visitors('visitDirectory')
+        fileVisitors = self.visitors('visitFile')
+        self.prefetchStat = self.walkers > 1 and any(
+            check.needsStat for check in self.checks)
+        sorting = [check for check in self.checks if check.externalSort]
+        if self.memoryBudget is not None and sorting:
+            for check in sorting:
+                check.memoryBudget = self.memoryBudget // len(sorting)
+        for check in self.checks:
+            check.start()
+        for (subdir, dirs, files) in self.listings():
+            if ioScheduler.expired():
+                break
+            if self.shard is not None and self.shard[0] > 0 \
+                    and subdir == self.scanfolder:
+                continue
+            self.countFolders += 1
+            self.countFiles += len(files)
+            if self.progress is not None:
+                self.progress()
+            for visitor in directoryVisitors:
+                visitor(subdir, dirs, files)
+            if fileVisitors:
+                for entry in files:
+                    for visitor in fileVisitors:
+                        visitor(subdir, entry)
+            yield subdir
+        if self.cache is not None:
+            self.cache.commit()
+
+    def partial(self):
+        """Return the counts and check states of a sharded walk."""
+        return {"version": SHARD_VERSION, "scanfolder": self.scanfolder,
+                "shard": self.shard,
+                "machine": isinstance(self.reporter, ShardReporter),
+                "files": self.countFiles,
+                "folders": self.countFolders, "pruned": self.countPruned,
+                "checks": [(check.name, check.partial())
+                           for check in self.checks]}
+
+    def merge(self, partial):
+        """Add the results of a sharded walk to the checks of this walker."""
+        if partial["scanfolder"] != self.scanfolder:
+            raise ValueError("shard scanned " + partial["scanfolder"])
+        if partial["machine"] != (self.reporter is not None):
+            raise ValueError("shard was scanned with"
+                             + ("" if partial["machine"] else "out")
+                             + " --machine")
+        names = [name for (name, state) in partial["checks"]]
+        if names != [check.name for check in self.checks]:
+            raise ValueError("shard ran the checks " + ",".join(names))
+        self.countFiles += partial["files"]
+        self.countFolders += partial["folders"]
+        self.countPruned += partial["pruned"]
+        for (check, (name, state)) in zip(self.checks, partial["checks"]):
+            check.merge(state)
+
+    def report(self):
+        """Let every registered check print its results."""
+        for check in self.checks:
+            check.report()
+
+
+def runChecks(scanfolder, checks, cache=None):
+    """Run checks in a single traversal of the scan folder."""
+    walker = LibraryWalker(scanfolder, cache)
+    for check in checks:
+        walker.addCheck(check)
+    walker.walk()
+    walker.report()
+    return walker
+
+
+Finding = collections.namedtuple(
+    'Finding', ['check', 'severity', 'message', 'paths', 'details'])
+
+
+class FindingQueue(object):
+    """Reporter queueing Finding tuples until Library.findings yields them."""
+
+    def __init__(self):
+        """Initialize FindingQueue class."""
+        self.findings = collections.deque()
+        self.summaries = collections.OrderedDict()
+
+    def finding(self, check, severity, message, paths, details):
+        """Queue a finding of a check."""
+        self.findings.append(Finding(check, severity, message, list(paths),
+                                     details))
+
+    def summary(self, check, details):
+        """Keep the summary of a check."""
+        self.summaries[check] = details
+
+
+class Library(object):
+    """
+    A media library to run checks on from Python, without printing.
+
+    By default the folder listings are kept in memory like for --watch, so
+    the library is listed once and later queries reuse the listings until
+    refresh() is told which folders changed. Every query runs its checks in
+    one traversal and yields Finding tuples as soon as they are found, the
+    findings that need the whole library once the traversal is done. The
+    summaries of the last finished query are kept in summaries.
+
+        library = Library("/mnt/media")
+        for finding in library.matchFoldersOnExactName():
+            print(finding.paths)
+
+    Missing optional dependencies raise MissingDependency.
+    """
+
+    def __init__(self, scanfolder, cache=None, keepListings=True, jobs=1,
+                 sampling=None, walkers=1, ordered=False,
+                 preferredLanguages=None, detectBackend="langdetect",
+                 prune=None, mediaExts=None, subtitleExts=None,
+                 maxFindings=None, memoryBudget=None):
+        """Initialize Library class."""
+        self.scanfolder = os.path.abspath(os.path.normpath(str(scanfolder)))
+        if cache is None and keepListings:
+            cache = WatchCache()
+        self.cache = cache
+        self.jobs = jobs
+        self.sampling = sampling
+        self.walkers = walkers
+        self.ordered = ordered
+        self.preferredLanguages = preferredLanguages
+        self.detectBackend = detectBackend
+        self.prune = prune
+        self.mediaExts = mediaExts
+        self.subtitleExts = subtitleExts
+        self.maxFindings = maxFindings
+        self.memoryBudget = memoryBudget
+        self.summaries = collections.OrderedDict()
+
+    def refresh(self, subdirs=None):
+        """Forget the listings of changed folders, or of every folder."""
+        if not isinstance(self.cache, WatchCache):
+            return
+        if subdirs is None:
+            self.cache.listings.clear()
+        else:
+            self.cache.invalidate(subdirs)
+
+    def walker(self, checks=(), reporter=None, shard=None):
+        """Return a walker over the library with checks registered."""
+        # The walker merging the shards caps the findings
+        maxFindings = self.maxFindings if shard is None else None
+        walker = LibraryWalker(self.scanfolder, self.cache, self.jobs,
+                               self.sampling, self.walkers, self.ordered,
+                               reporter, self.preferredLanguages,
+                               self.detectBackend, self.prune,
+                               self.mediaExts, self.subtitleExts,
+                               maxFindings, shard, self.memoryBudget)
+        for check in checks:
+            walker.addCheck(check)
+        return walker
+
+    def findings(self, checks):
+        """Yield the findings of new check objects, run in one traversal."""
+        queue = FindingQueue()
+        walker = self.walker(checks, queue)
+        for subdir in walker.iterWalk():
+            while queue.findings:
+                yield queue.findings.popleft()
+        for check in walker.checks:
+            check.report()
+            while queue.findings:
+                yield queue.findings.popleft()
+        self.summaries = queue.summaries
+
+    def matchFoldersOnExactName(self, ignoreyearfolders=False,
+                                ignoreseasonfolders=False):
+        """Yield the folders with the exact same name."""
+        return self.findings([FolderExactNameCheck(ignoreyearfolders,
+                                                   ignoreseasonfolders)])
+
+    def matchFoldersOnSoundex(self, ignoreyearfolders=False,
+                              ignoreseasonfolders=False):
+        """Yield the folders with similar names based on soundex."""
+        return self.findings([FolderSoundexCheck(ignoreyearfolders,
+                                                 ignoreseasonfolders)])
+
+    def matchFoldersOnFuzzyName(self, maxDistance, ignoreyearfolders=False,
+                                soundexblocking=False,
+                                ignoreseasonfolders=False):
+        """Yield the clusters of folder names within a levenshtein distance."""
+        return self.findings([FolderFuzzyCheck(maxDistance, ignoreyearfolders,
+                                               soundexblocking,
+                                               ignoreseasonfolders)])
+
+    def findDuplicateFiles(self):
+        """Yield the groups of files with the same content."""
+        return self.findings([DuplicateFilesCheck()])
+
+    def findSubtitlesNoneIso639(self, isoMode="1", disablelangdetect=False):
+        """Yield the subtitles that do not comply with ISO-639."""
+        return self.findings([SubtitleIso639Check(isoMode,
+                                                  disablelangdetect)])
+
+    def findSubtitlesMediaNaming(self, exclusions=("-trailer",),
+                                 embedded=False, languages=()):
+        """Yield the subtitles that do not use the media name."""
+        return self.findings([SubtitleMediaNamingCheck(exclusions, embedded,
+                                                       languages)])
+
+    def findSubtitleDuplicates(self, minSimilarity=0.5):
+        """Yield the groups of subtitles with nearly the same dialogue."""
+        return self.findings([SubtitleDuplicatesCheck(minSimilarity)])
+
+    def garbagecollector(self):
+        """Yield the garbage files and folders."""
+        return self.findings([GarbageCheck()])
+
+    def languagechecker(self):
+        """Yield the subtitles in another language than their name claims."""
+        return self.findings([LanguageCheck()])
+
+
+def folderMtime(subdir):
+    """Return the st_mtime_ns of a folder, or None when it is gone."""
+    try:
+        profiler.count("stat calls")
+        ioScheduler.throttle()
+        return os.stat(subdir).st_mtime_ns
+    except OSError:
+        return None
+
+
+class WatchCache(object):
+    """
+    In-memory scan cache for --watch that trusts its folder listings.
+
+    A listing is reused until the watcher reports its folder as changed, so
+    running the checks again lists and stats only the changed folders.
+    Language results, signatures, content hashes and embedded tracks are
+    kept per file like in ScanCache. Listings of folders that were not
+    visited in the last run are dropped.
+    """
+
+    trustsListings = True
+
+    def __init__(self):
+        """Initialize WatchCache class."""
+        self.listings = {}
+        self.mtimes = {}
+        self.soundexes = {}
+        self.fileResults = {}
+        self.signatures = {}
+        self.tracks = {}
+        self.hashes = {}
+        self.visited = set()
+        self.lastVisited = set()
+        self.hits = 0
+        self.misses = 0
+
+    def getListing(self, subdir, mtime):
+        """Return the entries of a folder that did not change, or None."""
+        self.visited.add(subdir)
+        listing = self.listings.get(subdir)
+        if listing is None:
+            self.misses = self.misses + 1
+        else:
+            self.hits = self.hits + 1
+        return listing
+
+    def setListing(self, subdir, mtime, dirs, files):
+        """Keep the entries of a folder."""
+        # The DirEntry objects keep their stat data for the next runs
+        self.listings[subdir] = (dirs, files)
+        self.mtimes[subdir] = folderMtime(subdir)
+
+    def invalidate(self, subdirs):
+        """Forget the listings of changed folders."""
+        for subdir in subdirs:
+            self.listings.pop(subdir, None)
+
+    def folders(self):
+        """Return the folders visited in the last run."""
+        return list(self.lastVisited)
+
+    def commit(self):
+        """Drop the listings of folders that are gone or were pruned."""
+        for subdir in set(self.listings) - self.visited:
+            del self.listings[subdir]
+            self.mtimes.pop(subdir, None)
+            self.soundexes.pop(subdir, None)
+        self.lastVisited = self.visited
+        self.visited = set()
+
+    def getSoundex(self, subdir):
+        """Return the soundex of a folder name or None."""
+        return self.soundexes.get(subdir)
+
+    def setSoundex(self, subdir, soundexOfName):
+        """Keep the soundex of a folder name."""
+        self.soundexes[subdir] = soundexOfName
+
+    def getFileResult(self, filepath, st):
+        """Return the results of an unchanged file as a dict or None."""
+        return self.fileResults.get((filepath, st.st_size, st.st_mtime_ns))
+
+    def setFileResult(self, filepath, st, langcode, language, probabilities):
+        """Keep the detected language of a file with its size and mtime."""
+        self.fileResults[(filepath, st.st_size, st.st_mtime_ns)] = {
+            'langcode': langcode, 'sizeclass': getSizeClass(st.st_size),
+            'language': language, 'probabilities': probabilities}
+
+    def getSignature(self, filepath, st, scheme):
+        """Return the signature of an unchanged file or None."""
+        return self.signatures.get((filepath, st.st_size, st.st_mtime_ns,
+                                    scheme))
+
+    def setSignature(self, filepath, st, scheme, signature):
+        """Keep the signature of a file with its size and mtime."""
+        self.signatures[(filepath, st.st_size, st.st_mtime_ns,
+                         scheme)] = signature
+
+    def getTracks(self, filepath, st, scheme):
+        """Return the embedded tracks of an unchanged file or None."""
+        return self.tracks.get((filepath, st.st_size, st.st_mtime_ns,
+                                scheme))
+
+    def setTracks(self, filepath, st, scheme, tracks):
+        """Keep the embedded tracks of a file with its size and mtime."""
+        self.tracks[(filepath, st.st_size, st.st_mtime_ns, scheme)] = tracks
+
+    def getHash(self, filepath, st, scheme):
+        """Return the content hash of an unchanged file or None."""
+        return self.hashes.get((filepath, st.st_size, st.st_mtime_ns,
+                                scheme))
+
+    def setHash(self, filepath, st, scheme, digest):
+        """Keep the content hash of a file with its size and mtime."""
+        self.hashes[(filepath, st.st_size, st.st_mtime_ns, scheme)] = digest
+
+
+class WatchReporter(object):
+    """
+    Collect the findings of one run of the checks for --watch.
+
+    Findings are keyed by check, paths and message, so the findings of two
+    runs can be compared.
+    """
+
+    def __init__(self):
+        """Initialize WatchReporter class."""
+        self.findings = collections.OrderedDict()
+
+    def finding(self, check, severity, message, paths, details):
+        """Keep a finding of a check."""
+        message = ANSI_ESCAPE.sub("", message).strip()
+        self.findings[(check, tuple(paths), message)] = (severity, details)
+
+    def summary(self, check, details):
+        """Ignore the summaries, --watch only reports changed findings."""
+
+
+class InotifyWatcher(object):
+    """
+    Folder change events from the Linux inotify API, through ctypes.
+
+    Every folder gets a watch for entries that are created, deleted, moved
+    or written. Events are collected until none arrived for settle seconds,
+    so a batch of downloads is checked once.
+    """
+
+    name = "inotify"
+    IN_CLOSE_WRITE = 0x8
+    IN_ATTRIB = 0x4
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    EVENT = "iIII"
+
+    def __init__(self, settle=0.1):
+        """Initialize InotifyWatcher class."""
+        import ctypes
+        import ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"),
+                                use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int,
+                                                ctypes.c_char_p,
+                                                ctypes.c_uint32]
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.settle = settle
+        self.mask = (self.IN_CLOSE_WRITE | self.IN_ATTRIB
+                     | self.IN_MOVED_FROM | self.IN_MOVED_TO
+                     | self.IN_CREATE | self.IN_DELETE | self.IN_DELETE_SELF
+                     | self.IN_MOVE_SELF | self.IN_ONLYDIR)
+        self.paths = {}
+        self.descriptors = {}
+
+    def watch(self, folders):
+        """Add watches for new folders and return those folders."""
+        added = []
+        for subdir in folders:
+            if subdir in self.descriptors:
+                continue
+            descriptor = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(subdir), self.mask)
+            if descriptor < 0:
+                errno = self.ctypes.get_errno()
+                # Out of watches, see fs.inotify.max_user_watches
+                if errno == 28:
+                    raise OSError(errno, os.strerror(errno))
+                continue
+            self.paths[descriptor] = subdir
+            self.descriptors[subdir] = descriptor
+            added.append(subdir)
+        return added
+
+    def read(self, changed):
+        """Add the folders of the pending events to changed."""
+        import struct
+        size = struct.calcsize(self.EVENT)
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return True
+            offset = 0
+            while offset < len(data):
+                (descriptor, mask, cookie, length) = struct.unpack_from(
+                    self.EVENT, data, offset)
+                offset = offset + size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    return False
+                subdir = self.paths.get(descriptor)
+                if subdir is None:
+                    continue
+                changed.add(subdir)
+                if mask & self.IN_IGNORED:
+                    del self.paths[descriptor]
+                    self.descriptors.pop(subdir, None)
+
+    def wait(self):
+        """Return the changed folders, or None when events were lost."""
+        import select
+        changed = set()
+        complete = True
+        select.select([self.fd], [], [])
+        while True:
+            complete = self.read(changed) and complete
+            if not select.select([self.fd], [], [], self.settle)[0]:
+                break
+        if not complete:
+            return None
+        return changed
+
+    def close(self):
+        """Stop watching."""
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    """
+    Folder changes found by comparing folder mtimes every interval seconds.
+
+    Used where inotify is not available. Files that are rewritten in place
+    do not change the mtime of their folder and are not noticed.
+    """
+
+    name = "polling"
+
+    def __init__(self, cache, interval=2.0):
+        """Initialize PollingWatcher class."""
+        self.cache = cache
+        self.interval = interval
+        self.folders = set()
+
+    def watch(self, folders):
+        """Poll the folders and return the ones that are new."""
+        added = set(folders) - self.folders
+        self.folders = set(folders)
+        return list(added)
+
+    def wait(self):
+        """Return the folders whose mtime changed."""
+        while True:
+            time.sleep(self.interval)
+            changed = set()
+            for subdir in self.folders:
+                if folderMtime(subdir) != self.cache.mtimes.get(subdir):
+                    changed.add(subdir)
+            if changed:
+                return changed
+
+    def close(self):
+        """Stop watching."""
+
+
+def createWatcher(cache, interval):
+    """Return an inotify watcher on Linux, otherwise a polling watcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(cache, interval)
+
+
+def formatWatchFinding(check, paths, message):
+    """Return a finding of --watch as a line with its paths."""
+    line = "--" + check + "! " + message
+    if paths and paths[0] not in message:
+        line += ": " + ", ".join(paths)
+    return line
+
+
+def reportWatchChanges(previous, current):
+    """Print the findings that are new or resolved since the last run."""
+    for (key, (severity, details)) in current.items():
+        if key in previous:
+            continue
+        (check, paths, message) = key
+        if machineReporter is not None:
+            machineReporter.finding(check, severity, message, paths, details)
+        else:
+            SEVERITY_PRINTERS[severity](formatWatchFinding(check, paths,
+                                                           message))
+    for (key, (severity, details)) in previous.items():
+        if key in current:
+            continue
+        (check, paths, message) = key
+        if machineReporter is not None:
+            machineReporter.resolved(check, severity, message, paths,
+                                     details)
+        else:
+            printNotificationInfo("Resolved " + formatWatchFinding(
+                check, paths, message))
+
+
+def watchLibrary(scanfolder, createWalker, interval=2.0):
+    """
+    Run the checks and again for every change until interrupted.
+
+    createWalker(cache, reporter) returns a walker with the checks. The
+    first run reports all findings, later runs only list the changed
+    folders and report the findings that are new or resolved.
+    """
+    cache = WatchCache()
+    watcher = None
+    previous = {}
+    changed = None
+    try:
+        while True:
+            start = time.perf_counter()
+            reporter = WatchReporter()
+            walker = createWalker(cache, reporter)
+            walker.walk()
+            walker.report()
+            reportWatchChanges(previous, reporter.findings)
+            previous = reporter.findings
+            folders = cache.folders()
+            if watcher is None:
+                watcher = createWatcher(cache, interval)
+                info = "Watching " + bold("{:,}".format(len(folders)))
+                info += " folders for changes (" + watcher.name + "), "
+                info += "stop with Ctrl+C"
+                printNotificationNew(info)
+            elif machineReporter is not None:
+                machineReporter.write({
+                    "type": "watch", "changed": len(changed),
+                    "seconds": round(time.perf_counter() - start, 3)})
+            try:
+                added = watcher.watch(folders)
+            except OSError:
+                watcher.close()
+                watcher = PollingWatcher(cache, interval)
+                added = watcher.watch(folders)
+                warning = "Out of inotify watches, polling every "
+                warning += str(interval) + " seconds instead"
+                printNotificationWarning(warning)
+            # Catch changes between listing a new folder and watching it
+            racing = [subdir for subdir in added
+                      if subdir in cache.mtimes
+                      and folderMtime(subdir) != cache.mtimes[subdir]]
+            output.flush()
+            if machineReporter is not None:
+                machineReporter.stream.flush()
+            changed = racing or watcher.wait()
+            if changed is None:
+                # Events were lost, list everything again
+                changed = folders
+            cache.invalidate(changed)
+    except KeyboardInterrupt:
+        printNotificationInfo("Stopped watching")
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+
+class FolderExactNameCheck(Check):
+    """Find folders with the exact same name."""
+
+    name = "foldernameexact"
+    externalSort = True
+
+    def __init__(self, ignoreyearfolders, ignoreseasonfolders=False):
+        """Initialize FolderExactNameCheck class."""
+        Check.__init__(self)
+        self.ignoreRules = getIgnoreRules(ignoreyearfolders,
+                                          ignoreseasonfolders)
+        self.knownListFolderNames = {}
+        self.total = 0
+        self.duplicate = 0
+        self.ignored = 0
+        self.sorter = None
+        self.sortedUnique = 0
+
+    def start(self):
+        """Keep the folder names on disk when there is a memory budget."""
+        if self.memoryBudget is not None:
+            self.sorter = ExternalSorter(self.memoryBudget)
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Compare the folder name with the names seen before."""
+        self.total = self.total + 1
+        subdirName = os.path.basename(os.path.normpath(subdir))
+        if subdirName not in self.knownListFolderNames:
+            if self.ignoreRules.matches(subdirName):
+                self.ignored = self.ignored + 1
+            elif self.sorter is not None:
+                # Compared once sorted, see analyze()
+                self.sorter.add(subdirName, subdir)
+            else:
+                self.knownListFolderNames[subdirName] = subdir
+        else:
+            self.duplicateFound(subdirName, subdir)
+
+    def duplicateFound(self, subdirName, subdir):
+        """Report a folder named like a folder seen before."""
+        self.duplicate = self.duplicate + 1
+        knownSubdir = self.knownListFolderNames[subdirName]
+        warning = "Found duplicate foldername \"" + bold(subdirName) + "\""
+        warning += "\n\t1: " + knownSubdir
+        warning += "\n\t2: " + subdir
+        self.emit("warning", warning, [knownSubdir, subdir],
+                  {"name": subdirName})
+
+    def partial(self):
+        """Return the folder names and counts of a shard."""
+        return dict(Check.partial(self), total=self.total,
+                    duplicate=self.duplicate, ignored=self.ignored,
+                    known=self.knownListFolderNames)
+
+    def merge(self, partial):
+        """Add the folders of a shard, reporting names seen in both."""
+        Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.duplicate = self.duplicate + partial["duplicate"]
+        self.ignored = self.ignored + partial["ignored"]
+        for (subdirName, subdir) in partial["known"].items():
+            if subdirName in self.knownListFolderNames:
+                self.duplicateFound(subdirName, subdir)
+            else:
+                self.knownListFolderNames[subdirName] = subdir
+
+    def analyze(self):
+        """Report the duplicate folder names kept on disk."""
+        if self.sorter is None:
+            return
+        for (subdirName, paths) in self.sorter.groups():
+            self.sortedUnique = self.sortedUnique + 1
+            self.knownListFolderNames = {subdirName: next(paths)}
+            for subdir in paths:
+                self.duplicateFound(subdirName, subdir)
+        self.knownListFolderNames = {}
+        self.sorter.close()
+
+    def summary(self):
+        """Return the folder counts."""
+        return {"unique": len(self.knownListFolderNames) + self.sortedUnique,
+                "duplicate": self.duplicate, "ignored": self.ignored,
+                "total": self.total}
+
+    def finish(self):
+        """Print the statistics table."""
+        unique = len(self.knownListFolderNames) + self.sortedUnique
+        dataStatsTable = [
+            ['Unique', str(unique)],
+            ['Duplicate', str(self.duplicate)]
+        ]
+        if self.ignoreRules:
+            dataStatsTable.append(['Ignored', str(self.ignored)])
+        total = str(self.total)
+        heading = 'Total'.ljust((APP_STR_PADDING-(4+(3*1))-len(total)), ' ')
+        dataStatsTable.append([heading, total])
+        printTable(dataStatsTable, 'Results', [1], False)
+
+
+def matchFoldersOnExactName(scanfolder, ignoreyearfolders,
+                            ignoreseasonfolders=False):
+    """Find folders with the exact same name, recursively."""
+    runChecks(scanfolder, [FolderExactNameCheck(ignoreyearfolders,
+                                                ignoreseasonfolders)])
+
+
+def getFolderSoundex(sss, cache, subdir, subdirName):
+    """Return the soundex of a folder name, from the cache when possible."""
+    soundexOfName = None
+    if cache is not None:
+        soundexOfName = cache.getSoundex(subdir)
+    if soundexOfName is None:
+        soundexOfName = sss.soundex(str(subdirName), 8)
+        if cache is not None:
+            cache.setSoundex(subdir, soundexOfName)
+    return soundexOfName
+
+
+class FolderSoundexCheck(Check):
+    """Find similar folder names based on soundex."""
+
+    name = "foldernamesoundex"
+    externalSort = True
+    ignoreSoundex = ["10000000", "20000000"]
+
+    def __init__(self, ignoreyearfolders, ignoreseasonfolders=False):
+        """Initialize FolderSoundexCheck class."""
+        Check.__init__(self)
+        self.ignoreRules = getIgnoreRules(ignoreyearfolders,
+                                          ignoreseasonfolders)
+        self.knownListFolderNames = {}
+        self.total = 0
+        self.duplicate = 0
+        self.ignored = 0
+        self.dataStatsTable = []
+        self.sorter = None
+        self.sortedUnique = 0
+        self.sss = importDependency("soundex").Soundex()
+
+    def start(self):
+        """Keep the soundexes on disk when there is a memory budget."""
+        if self.memoryBudget is not None:
+            self.sorter = ExternalSorter(self.memoryBudget)
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Compare the soundex of the folder name with earlier folders."""
+        self.total = self.total + 1
+        subdirName = os.path.basename(os.path.normpath(subdir))
+        known = self.knownListFolderNames
+        try:
+            soundexOfName = getFolderSoundex(self.sss, self.cache, subdir,
+                                             subdirName)
+            if soundexOfName not in known:
+                if self.ignoreRules and (
+                        soundexOfName in self.ignoreSoundex
+                        or self.ignoreRules.matches(subdirName)
+                ):
+                    self.ignored = self.ignored + 1
+                elif self.sorter is not None:
+                    # Compared once sorted, see analyze()
+                    self.sorter.add(soundexOfName, subdir)
+                else:
+                    known[soundexOfName] = subdir
+            else:
+                self.duplicateFound(soundexOfName, subdir)
+        except Exception:
+            self.ignored = self.ignored + 1
+            warning = "Could not calculate the soundex of foldername \""
+            warning += bold(subdirName) + "\""
+            self.emit("warning", warning, [subdir])
+
+    def duplicateFound(self, soundexOfName, subdir):
+        """Report a folder with the soundex of a folder seen before."""
+        self.duplicate = self.duplicate + 1
+        subdirName = os.path.basename(os.path.normpath(subdir))
+        oldSubdir = self.knownListFolderNames[soundexOfName]
+        oldSubdirName = os.path.basename(os.path.normpath(oldSubdir))
+        if self.reporter is not None:
+            warning = "Found similar foldernames \"" + oldSubdirName
+            warning += "\" and \"" + subdirName + "\""
+            self.emit("warning", warning, [oldSubdir, subdir],
+                      {"soundex": soundexOfName})
+        elif self.shown("warning"):
+            self.dataStatsTable.append([soundexOfName, oldSubdirName])
+            self.dataStatsTable.append([soundexOfName, subdirName])
+
+    def partial(self):
+        """Return the soundex buckets, table rows and counts of a shard."""
+        return dict(Check.partial(self), total=self.total,
+                    duplicate=self.duplicate, ignored=self.ignored,
+                    known=self.knownListFolderNames,
+                    rows=self.dataStatsTable)
+
+    def merge(self, partial):
+        """Add the folders of a shard, reporting soundexes seen in both."""
+        Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.duplicate = self.duplicate + partial["duplicate"]
+        self.ignored = self.ignored + partial["ignored"]
+        rows = partial["rows"]
+        for start in range(0, len(rows), 2):
+            if self.shown("warning"):
+                self.dataStatsTable.extend(rows[start:start + 2])
+        for (soundexOfName, subdir) in partial["known"].items():
+            if soundexOfName in self.knownListFolderNames:
+                self.duplicateFound(soundexOfName, subdir)
+            else:
+                self.knownListFolderNames[soundexOfName] = subdir
+
+    def analyze(self):
+        """Report the similar folder names kept on disk."""
+        if self.sorter is None:
+            return
+        for (soundexOfName, paths) in self.sorter.groups():
+            self.sortedUnique = self.sortedUnique + 1
+            self.knownListFolderNames = {soundexOfName: next(paths)}
+            for subdir in paths:
+                self.duplicateFound(soundexOfName, subdir)
+        self.knownListFolderNames = {}
+        self.sorter.close()
+
+    def summary(self):
+        """Return the folder counts."""
+        return {"unique": len(self.knownListFolderNames) + self.sortedUnique,
+                "duplicate": self.duplicate, "ignored": self.ignored,
+                "total": self.total}
+
+    def finish(self):
+        """Print the table of similar folder names."""
+        dataStatsTable = sorted(self.dataStatsTable, key=lambda x: x[0])
+        dataStatsTable.insert(0, ["Soundex", "Folder name"])
+        printTable(dataStatsTable, 'Results ')
+
+
+def matchFoldersOnSoundex(scanfolder, ignoreyearfolders,
+                          ignoreseasonfolders=False):
+    """Find similar foldernames based on soundex, recursively."""
+    runChecks(scanfolder, [FolderSoundexCheck(ignoreyearfolders,
+                                              ignoreseasonfolders)])
+
+
+class FolderFuzzyCheck(Check):
+    """
+    Find folder names within a levenshtein distance of each other.
+
+    Names are kept as they are and compared lowercased, so names that only
+    differ in case are found at distance 0. Candidate pairs come from an
+    inverted index of character q-grams: names within the distance share at
+    least max(grams) - distance * q distinct q-grams and differ at most
+    distance in length. Candidates are verified with levenshteinWithin() and
+    matches are grouped into clusters with UnionFind. Optionally only names
+    with the same soundex are compared.
+    """
+
+    name = "foldernamefuzzy"
+    q = 2
+
+    def __init__(self, maxDistance, ignoreyearfolders, soundexblocking=False,
+                 ignoreseasonfolders=False):
+        """Initialize FolderFuzzyCheck class."""
+        Check.__init__(self)
+        self.maxDistance = maxDistance
+        self.ignoreRules = getIgnoreRules(ignoreyearfolders,
+                                          ignoreseasonfolders)
+        self.soundexblocking = soundexblocking
+        self.folders = {}
+        self.blocks = {}
+        self.total = 0
+        self.ignored = 0
+        self.verified = 0
+        self.clusters = []
+        self.sss = None
+        if soundexblocking:
+            self.sss = importDependency("soundex").Soundex()
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Collect the folder name with its path."""
+        self.total = self.total + 1
+        subdirName = os.path.basename(os.path.normpath(subdir))
+        if self.ignoreRules.matches(subdirName):
+            self.ignored = self.ignored + 1
+            return
+        name = subdirName
+        if name not in self.folders:
+            self.folders[name] = []
+            block = ""
+            if self.soundexblocking:
+                try:
+                    block = getFolderSoundex(self.sss, self.cache, subdir,
+                                             subdirName)
+                except Exception:
+                    pass
+            self.blocks[name] = block
+        self.folders[name].append(subdir)
+
+    def partial(self):
+        """Return the folder names of a shard with their paths."""
+        return dict(Check.partial(self), total=self.total,
+                    ignored=self.ignored, folders=self.folders,
+                    blocks=self.blocks)
+
+    def merge(self, partial):
+        """Add the folder names of a shard, they are clustered later."""
+        Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.ignored = self.ignored + partial["ignored"]
+        for (name, paths) in partial["folders"].items():
+            if name not in self.folders:
+                self.folders[name] = []
+                self.blocks[name] = partial["blocks"][name]
+            self.folders[name].extend(paths)
+
+    def grams(self, name):
+        """Return the distinct q-grams of a name."""
+        padded = "^" + name + "$"
+        return set(padded[i:i + self.q]
+                   for i in range(len(padded) - self.q + 1))
+
+    def analyze(self):
+        """Cluster the folder names that are within the distance."""
+        maxDistance = self.maxDistance
+        shortLimit = maxDistance * self.q
+        index = {}
+        shortNames = {}
+        clusters = UnionFind()
+        for name in self.folders:
+            block = self.blocks[name]
+            lowerName = name.lower()
+            grams = self.grams(lowerName)
+            shared = {}
+            for gram in grams:
+                for other in index.get((block, gram), ()):
+                    shared[other] = shared.get(other, 0) + 1
+            candidates = [other for (other, count) in shared.items()
+                          if count >= max(len(grams), other[2]) - shortLimit]
+            if len(grams) <= shortLimit:
+                # Short names may be close without sharing any q-gram
+                candidates.extend(other
+                                  for other in shortNames.get(block, ())
+                                  if other not in shared)
+            for (other, lowerOther, otherGrams) in candidates:
+                if abs(len(lowerOther) - len(lowerName)) > maxDistance:
+                    continue
+                self.verified = self.verified + 1
+                if levenshteinWithin(lowerName, lowerOther,
+                                     maxDistance) <= maxDistance:
+                    clusters.union(name, other)
+            key = (name, lowerName, len(grams))
+            for gram in grams:
+                index.setdefault((block, gram), []).append(key)
+            if len(grams) <= shortLimit:
+                shortNames.setdefault(block, []).append(key)
+        self.clusters = sorted(sorted(group) for group in clusters.groups())
+        for group in self.clusters:
+            warning = "Found similar foldernames (levenshtein distance <= "
+            warning += str(maxDistance) + ")"
+            paths = [subdir for name in group for subdir in self.folders[name]]
+            for (number, subdir) in enumerate(paths):
+                warning += "\n\t" + str(number + 1) + ": " + subdir
+            self.emit("warning", warning, paths,
+                      {"names": group, "distance": maxDistance})
+
+    def summary(self):
+        """Return the cluster and folder counts."""
+        return {"clusters": len(self.clusters), "total": self.total,
+                "ignored": self.ignored, "verified": self.verified}
+
+    def finish(self):
+        """Print the number of clusters of similar folder names."""
+        info = "Found " + bold(str(len(self.clusters))) + " clusters of "
+        info += "similar foldernames in " + bold(str(self.total))
+        info += " folders (" + str(self.verified) + " pairs verified"
+        if self.ignoreRules:
+            info += ", " + str(self.ignored) + " ignored"
+        info += ")"
+        printNotificationInfo(info)
+
+
+def matchFoldersOnFuzzyName(scanfolder, maxDistance, ignoreyearfolders,
+                            soundexblocking=False, ignoreseasonfolders=False):
+    """Find folder names within a levenshtein distance, recursively."""
+    check = FolderFuzzyCheck(maxDistance, ignoreyearfolders, soundexblocking,
+                             ignoreseasonfolders)
+    runChecks(scanfolder, [check])
+
+
+def readAt(fd, length, offset):
+    """Read length bytes at offset without moving a shared file position."""
+    if hasattr(os, 'pread'):
+        data = os.pread(fd, length, offset)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = os.read(fd, length)
+    ioScheduler.throttle(1, len(data))
+    return data
+
+
+# === Versions of the content hashes in the scan cache, see DuplicateFilesCheck
+SAMPLE_HASH_SCHEME = "blake2b-samples-64k"
+FULL_HASH_SCHEME = "blake2b"
+
+
+class DuplicateFilesCheck(Check):
+    """
+    Find files with the same content, whatever their names.
+
+    Files are grouped by size first. Only sizes shared by several files get a
+    partial hash of a head, middle and tail sample, and only files that still
+    collide get a full hash. Hardlinks are recognised by (st_dev, st_ino) and
+    read once. With a cache, the hashes of unchanged files are reused, so
+    --watch and later --cache runs do not read them again.
+    """
+
+    name = "duplicatefiles"
+    sampleSize = 64 * 1024
+    chunkSize = 1024 * 1024
+    needsStat = True
+
+    def __init__(self):
+        """Initialize DuplicateFilesCheck class."""
+        Check.__init__(self)
+        self.inodes = {}
+        self.sizes = {}
+        self.stats = {}
+        self.total = 0
+        self.totalBytes = 0
+        self.hardlinks = 0
+        self.bytesRead = 0
+        self.cached = 0
+        self.groups = 0
+        self.wasted = 0
+        self.skipped = 0
+
+    def visitFile(self, subdir, entry):
+        """Group regular, non-empty files by size and inode."""
+        try:
+            if not entry.is_file():
+                return
+            st = statEntry(entry)
+        except OSError:
+            return
+        if st.st_size == 0:
+            return
+        self.total = self.total + 1
+        inode = (st.st_dev, st.st_ino)
+        if inode in self.inodes:
+            self.hardlinks = self.hardlinks + 1
+            self.inodes[inode].append(entry.path)
+            return
+        self.totalBytes = self.totalBytes + st.st_size
+        self.inodes[inode] = [entry.path]
+        self.sizes.setdefault(st.st_size, []).append(inode)
+        if self.cache is not None:
+            self.stats[inode] = st
+
+    def partial(self):
+        """Return the files of a shard grouped by size and inode."""
+        return dict(Check.partial(self), total=self.total,
+                    hardlinks=self.hardlinks, inodes=self.inodes,
+                    sizes=self.sizes)
+
+    def merge(self, partial):
+        """Add the size buckets of a shard, they are hashed later."""
+        Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.hardlinks = self.hardlinks + partial["hardlinks"]
+        for (size, inodes) in partial["sizes"].items():
+            for inode in inodes:
+                paths = partial["inodes"][inode]
+                if inode in self.inodes:
+                    # Hardlinked from a folder of another shard
+                    self.hardlinks = self.hardlinks + len(paths)
+                    self.inodes[inode].extend(paths)
+                    continue
+                self.totalBytes = self.totalBytes + size
+                self.inodes[inode] = paths
+                self.sizes.setdefault(size, []).append(inode)
+
+    def hashFile(self, path, size, partial):
+        """
+        Return a hash of the samples or of the whole content of a file.
+
+        None is returned when --maxruntime is spent while reading the file.
+        """
+        import hashlib
+        digest = hashlib.blake2b()
+        ioScheduler.throttle()
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            if partial:
+                sample = self.sampleSize
+                for offset in sorted(set([0, max(0, size // 2 - sample // 2),
+                                          max(0, size - sample)])):
+                    data = readAt(fd, sample, offset)
+                    profiler.count("bytes read", len(data))
+                    self.bytesRead = self.bytesRead + len(data)
+                    digest.update(data)
+            else:
+                offset = 0
+                while offset < size:
+                    if ioScheduler.expired():
+                        return None
+                    data = readAt(fd, self.chunkSize, offset)
+                    if not data:
+                        break
+                    profiler.count("bytes read", len(data))
+                    self.bytesRead = self.bytesRead + len(data)
+                    digest.update(data)
+                    offset = offset + len(data)
+        finally:
+            os.close(fd)
+        return digest.digest()
+
+    def cachedHash(self, inode, size, partial):
+        """Return the hash of an inode, from the cache when unchanged."""
+        path = self.inodes[inode][0]
+        st = self.stats.get(inode)
+        scheme = SAMPLE_HASH_SCHEME if partial else FULL_HASH_SCHEME
+        if st is not None:
+            digest = self.cache.getHash(path, st, scheme)
+            if digest is not None:
+                self.cached = self.cached + 1
+                return digest
+        digest = self.hashFile(path, size, partial)
+        if digest is not None and st is not None:
+            self.cache.setHash(path, st, scheme, digest)
+        return digest
+
+    def splitByHash(self, inodes, size, partial):
+        """Return the groups of inodes that share a hash."""
+        hashes = {}
+        for inode in inodes:
+            try:
+                key = self.cachedHash(inode, size, partial)
+            except OSError:
+                continue
+            if key is None:
+                self.skipped = self.skipped + 1
+                continue
+            hashes.setdefault(key, []).append(inode)
+        return [group for group in hashes.values() if len(group) > 1]
+
+    def analyze(self):
+        """Hash the files sharing a size and report identical content."""
+        for size in sorted(self.sizes):
+            inodes = self.sizes[size]
+            if len(inodes) < 2:
+                continue
+            if ioScheduler.expired():
+                self.skipped = self.skipped + len(inodes)
+                continue
+            # Small files are covered by their samples, hash them fully
+            partial = size > 3 * self.sampleSize
+            groups = self.splitByHash(inodes, size, partial)
+            if partial:
+                groups = [final for group in groups
+                          for final in self.splitByHash(group, size, False)]
+            for group in groups:
+                self.groups = self.groups + 1
+                self.wasted = self.wasted + size * (len(group) - 1)
+                warning = "Found files with the same content ("
+                warning += "{:,}".format(size) + " bytes)"
+                paths = [path for inode in group
+                         for path in self.inodes[inode]]
+                for (number, path) in enumerate(paths):
+                    warning += "\n\t" + str(number + 1) + ": " + path
+                self.emit("warning", warning, paths, {"size": size})
+        self.sizes = {}
+        self.stats = {}
+
+    def summary(self):
+        """Return the duplicate counts and how many bytes were read."""
+        return {"groups": self.groups, "wasted": self.wasted,
+                "total": self.total, "totalBytes": self.totalBytes,
+                "bytesRead": self.bytesRead, "hardlinks": self.hardlinks,
+                "cached": self.cached, "skipped": self.skipped}
+
+    def finish(self):
+        """Print the duplicate groups and how many bytes were read."""
+        info = "Found " + bold(str(self.groups)) + " groups of duplicate "
+        info += "files in " + bold("{:,}".format(self.total)) + " files, "
+        info += "wasting " + bold("{:,}".format(self.wasted)) + " bytes"
+        printNotificationInfo(info)
+        info = "Read " + "{:,}".format(self.bytesRead) + " of "
+        info += "{:,}".format(self.totalBytes) + " bytes, skipped "
+        info += str(self.hardlinks) + " hardlinks"
+        if self.cached:
+            info += ", reused " + "{:,}".format(self.cached) + " cached hashes"
+        printNotificationInfo(info)
+        if self.skipped:
+            info = "Did not compare " + "{:,}".format(self.skipped)
+            info += " files once --maxruntime was spent"
+            printNotificationInfo(info)
+
+
+def findDuplicateFiles(scanfolder):
+    """Find files with the same content, recursively."""
+    runChecks(scanfolder, [DuplicateFilesCheck()])
+
+
+class SubtitleIso639Check(Check):
+    """
+    Detect subtitles that do not comply with ISO-639.
+
+    TODO: Add more subtitle extensions (and read/parse them correctly for
+          language detection)
+    TODO: Seperate language detection better in different functions
+    TODO: Add percentage of certainty and possible other languages when
+          low certainty
+    TODO: Handle unicode better to detect languages like German and Dutch
+          better
+    TODO: Use table
+    """
+
+    name = "subtitlesiso639"
+
+    def __init__(self, isoMode, disablelangdetect):
+        """Initialize SubtitleIso639Check class."""
+        Check.__init__(self)
+        self.isoMode = isoMode
+        self.disablelangdetect = disablelangdetect
+        self.iso639 = importDependency("iso639")
+        self.total = 0
+        self.incorrect = 0
+        self.detectedlang = 0
+        self.skipped = 0
+        self.pending = []
+
+    def visitFile(self, subdir, entry):
+        """Validate the language code in the name of a subtitle file."""
+        filename = entry.name
+        isoMode = self.isoMode
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in self.subtitleExts:
+            return
+        self.total = self.total + 1
+        langcodeFromFilename = getIsoLanguageCodeFromFilename(filename)
+        detectedLanguage = ""
+        detectedIsoMode = False
+        if self.iso639.is_valid639_1(langcodeFromFilename):
+            detectedIsoMode = "1"
+            detectedLanguage = self.iso639.to_name(langcodeFromFilename)
+        if self.iso639.is_valid639_2(langcodeFromFilename):
+            detectedIsoMode = "2"
+            detectedLanguage = self.iso639.to_name(langcodeFromFilename)
+        if detectedIsoMode == isoMode:
+            return
+        isoShouldBe = ""
+        if isoMode == "1" and detectedIsoMode == "2":
+            isoShouldBe = self.iso639.to_iso639_1(langcodeFromFilename)
+        if isoMode == "2" and detectedIsoMode == "1":
+            isoShouldBe = self.iso639.to_iso639_2(langcodeFromFilename)
+        filepath = entry.path
+        self.incorrect = self.incorrect + 1
+        warning = "Incorrectly named subtitle found at "
+        warning += bold(filepath)
+        self.emit("warning", warning, [filepath],
+                  {"langcode": langcodeFromFilename,
+                   "iso639": detectedIsoMode or None,
+                   "expected": isoShouldBe or None})
+        if detectedIsoMode is not False:
+            info = "\t\tLang code " + bold(langcodeFromFilename)
+            info += " (ISO 639-" + str(detectedIsoMode) + ") "
+            info += "detected. The ISO 639-" + isoMode + " code"
+            info += " for " + detectedLanguage + " is "
+            info += bold(isoShouldBe) + "."
+            self.notify(printNotificationInfo, info)
+        if not self.disablelangdetect:
+            st = None
+            if self.cache is not None:
+                try:
+                    st = statEntry(entry)
+                except OSError:
+                    pass
+            # Detected after the traversal, the message is filled in then
+            self.pending.append((len(self.notifications),
+                                 (filepath, st, langcodeFromFilename)))
+            self.notify(printNotificationInfo, None)
+
+    def partial(self):
+        """Return the subtitle counts of a shard and its pending detections."""
+        return dict(Check.partial(self), total=self.total,
+                    incorrect=self.incorrect, pending=self.pending)
+
+    def merge(self, partial):
+        """Add the subtitles of a shard, detected later."""
+        positions = Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.incorrect = self.incorrect + partial["incorrect"]
+        for (index, subtitle) in partial["pending"]:
+            # Only queued notifications are filled in by analyze()
+            if self.reporter is None:
+                index = positions[index]
+            self.pending.append((index, subtitle))
+
+    def analyze(self):
+        """Detect the language of the incorrectly named subtitles."""
+        subtitles = [subtitle for (index, subtitle) in self.pending]
+        results = self.detectLanguages(subtitles)
+        for ((index, subtitle), result) in zip(self.pending, results):
+            if result is SKIPPED:
+                self.skipped = self.skipped + 1
+                possibleLanguage = "\tLanguage detection left for the next "
+                possibleLanguage += "run"
+                result = None
+            elif result is not None:
+                possibleLanguage = "\tDetected language is likely to "
+                possibleLanguage += "be \"" + result[0] + "\""
+                self.detectedlang = self.detectedlang + 1
+            else:
+                possibleLanguage = "\tLanguage detection failed"
+            if self.reporter is not None:
+                details = None
+                if result is not None:
+                    details = {"language": result[0],
+                               "probabilities": result[1]}
+                self.emit("info", possibleLanguage.strip(), [subtitle[0]],
+                          details)
+            else:
+                self.notifications[index] = (printNotificationInfo,
+                                             possibleLanguage)
+        self.pending = []
+
+    def summary(self):
+        """Return the subtitle counts."""
+        return {"total": self.total, "incorrect": self.incorrect,
+                "detected": self.detectedlang, "skipped": self.skipped}
+
+    def finish(self):
+        """Print the number of incorrectly named subtitles."""
+        info = "Found subtitle files " + bold(str(self.total)) + " of which "
+        info += bold(str(self.incorrect)) + " are incorrectly named!"
+        printNotificationInfo(info)
+
+
+def findSubtitlesNoneIso639(scanfolder, isoMode, disablelangdetect):
+    """Detect subtitles that do not comply with ISO-639."""
+    check = SubtitleIso639Check(isoMode, disablelangdetect)
+    runChecks(scanfolder, [check])
+
+
+EmbeddedTrack = collections.namedtuple(
+    'EmbeddedTrack', ['language', 'codec', 'name', 'forced'])
+# === Stored with the cached tracks, change it when the parsers change
+PROBE_SCHEME = "tracks-1"
+PROBE_THREADS = 8
+PROBE_EXTENSIONS = ['.mkv', '.mk3d', '.webm', '.mp4', '.m4v', '.mov']
+PROBE_BLOCK_SIZE = 4096
+PROBE_MAX_BYTES = 256 * 1024
+MATROSKA_EBML = 0x1A45DFA3
+MATROSKA_SEGMENT = 0x18538067
+MATROSKA_SEEKHEAD = 0x114D9B74
+MATROSKA_SEEK = 0x4DBB
+MATROSKA_SEEKID = 0x53AB
+MATROSKA_SEEKPOSITION = 0x53AC
+MATROSKA_TRACKS = 0x1654AE6B
+MATROSKA_TRACKENTRY = 0xAE
+MATROSKA_TRACKTYPE = 0x83
+MATROSKA_CODECID = 0x86
+MATROSKA_LANGUAGE = 0x22B59C
+MATROSKA_LANGUAGEBCP47 = 0x22B59D
+MATROSKA_NAME = 0x536E
+MATROSKA_FLAGFORCED = 0x55AA
+MATROSKA_CLUSTER = 0x1F43B675
+MATROSKA_SUBTITLE_TRACK = 0x11
+MP4_TOP_BOXES = frozenset([b'ftyp', b'moov', b'mdat', b'free', b'skip',
+                           b'wide', b'pnot', b'styp', b'sidx', b'uuid'])
+MP4_SUBTITLE_HANDLERS = frozenset([b'sbtl', b'subt', b'text', b'clcp'])
+# === Macintosh language codes of QuickTime files, by number
+MP4_MAC_LANGUAGES = ["eng", "fra", "deu", "ita", "nld", "swe", "spa", "dan",
+                     "por", "nor", "heb", "jpn", "ara", "fin", "ell"]
+
+
+class BlockReader(object):
+    """
+    Positioned reads of a file in blocks, at most maxBytes in total.
+
+    Blocks are read once and kept, so headers that are parsed one field at a
+    time cost one read per block. Reading past maxBytes raises ValueError.
+    """
+
+    def __init__(self, fd, size, blockSize=PROBE_BLOCK_SIZE,
+                 maxBytes=PROBE_MAX_BYTES):
+        """Initialize BlockReader class."""
+        self.fd = fd
+        self.size = size
+        self.blockSize = blockSize
+        self.maxBytes = maxBytes
+        self.blocks = {}
+        self.bytesRead = 0
+
+    def read(self, offset, length):
+        """Return up to length bytes at offset, fewer at the end of file."""
+        end = min(offset + length, self.size)
+        if offset < 0 or offset >= end:
+            return b''
+        first = offset // self.blockSize
+        last = (end - 1) // self.blockSize
+        block = first
+        while block <= last:
+            if block in self.blocks:
+                block = block + 1
+                continue
+            # Read missing neighbouring blocks at once
+            count = 1
+            while (block + count <= last
+                   and block + count not in self.blocks):
+                count = count + 1
+            if self.bytesRead + count * self.blockSize > self.maxBytes:
+                raise ValueError("Headers larger than "
+                                 + str(self.maxBytes) + " bytes")
+            data = readAt(self.fd, count * self.blockSize,
+                          block * self.blockSize)
+            self.bytesRead = self.bytesRead + len(data)
+            for number in range(count):
+                self.blocks[block + number] = data[
+                    number * self.blockSize:(number + 1) * self.blockSize]
+            block = block + count
+        data = b''.join(self.blocks[block] for block in range(first, last + 1))
+        start = offset - first * self.blockSize
+        return data[start:start + end - offset]
+
+
+def readMatroskaNumber(reader, offset, marker):
+    """
+    Return an EBML variable size number at offset and its length.
+
+    Element IDs keep their length marker bits, element sizes do not. A size
+    with all bits set is unknown and returned as None.
+    """
+    first = reader.read(offset, 1)
+    if not first or not first[0]:
+        raise ValueError("Invalid EBML number at " + str(offset))
+    length = 9 - first[0].bit_length()
+    data = reader.read(offset, length)
+    if len(data) < length:
+        raise ValueError("Truncated EBML number at " + str(offset))
+    value = int.from_bytes(data, 'big')
+    if not marker:
+        value = value & ((1 << (7 * length)) - 1)
+        if value == (1 << (7 * length)) - 1:
+            value = None
+    return (value, length)
+
+
+def iterMatroskaElements(reader, start, end):
+    """Yield the (id, data offset, data end) of the elements in a range."""
+    offset = start
+    while offset < end:
+        (elementId, idLength) = readMatroskaNumber(reader, offset, True)
+        (size, sizeLength) = readMatroskaNumber(reader, offset + idLength,
+                                                False)
+        dataOffset = offset + idLength + sizeLength
+        # Elements of unknown size, like a live Segment, run to the end
+        dataEnd = end if size is None else min(dataOffset + size, end)
+        yield (elementId, dataOffset, dataEnd)
+        offset = dataEnd
+
+
+def readMatroskaString(reader, start, end):
+    """Return the text of a string element."""
+    data = reader.read(start, min(end - start, 256))
+    return data.rstrip(b'\x00').decode('utf-8', 'replace')
+
+
+def readMatroskaTracks(reader, start, end):
+    """Return the subtitle tracks of a Matroska Tracks element."""
+    tracks = []
+    for (elementId, entryStart, entryEnd) in iterMatroskaElements(
+            reader, start, end):
+        if elementId != MATROSKA_TRACKENTRY:
+            continue
+        fields = {MATROSKA_LANGUAGE: "eng"}
+        for (fieldId, fieldStart, fieldEnd) in iterMatroskaElements(
+                reader, entryStart, entryEnd):
+            if fieldId in (MATROSKA_TRACKTYPE, MATROSKA_FLAGFORCED):
+                fields[fieldId] = int.from_bytes(
+                    reader.read(fieldStart, min(fieldEnd - fieldStart, 8)),
+                    'big')
+            elif fieldId in (MATROSKA_CODECID, MATROSKA_LANGUAGE,
+                             MATROSKA_LANGUAGEBCP47, MATROSKA_NAME):
+                fields[fieldId] = readMatroskaString(reader, fieldStart,
+                                                     fieldEnd)
+        if fields.get(MATROSKA_TRACKTYPE) != MATROSKA_SUBTITLE_TRACK:
+            continue
+        language = fields.get(MATROSKA_LANGUAGEBCP47,
+                              fields[MATROSKA_LANGUAGE])
+        tracks.append(EmbeddedTrack(
+            language, fields.get(MATROSKA_CODECID), fields.get(MATROSKA_NAME),
+            bool(fields.get(MATROSKA_FLAGFORCED))))
+    return tracks
+
+
+def probeMatroska(reader):
+    """
+    Return the subtitle tracks of a Matroska file, or None.
+
+    Only element headers are read to skip from one top level element of the
+    Segment to the next. The Tracks element comes before the first Cluster
+    in nearly all files, otherwise the SeekHead tells where it is.
+    """
+    segment = None
+    for (elementId, start, end) in iterMatroskaElements(reader, 0,
+                                                        reader.size):
+        if elementId == MATROSKA_SEGMENT:
+            segment = (start, end)
+            break
+    if segment is None:
+        return None
+    (segmentStart, segmentEnd) = segment
+    tracksPosition = None
+    for (elementId, start, end) in iterMatroskaElements(reader, segmentStart,
+                                                        segmentEnd):
+        if elementId == MATROSKA_TRACKS:
+            return readMatroskaTracks(reader, start, end)
+        if elementId == MATROSKA_SEEKHEAD:
+            for (seekId, seekStart, seekEnd) in iterMatroskaElements(
+                    reader, start, end):
+                if seekId != MATROSKA_SEEK:
+                    continue
+                seek = {}
+                for (fieldId, fieldStart, fieldEnd) in iterMatroskaElements(
+                        reader, seekStart, seekEnd):
+                    seek[fieldId] = int.from_bytes(
+                        reader.read(fieldStart, min(fieldEnd - fieldStart, 8)),
+                        'big')
+                if seek.get(MATROSKA_SEEKID) == MATROSKA_TRACKS:
+                    tracksPosition = seek.get(MATROSKA_SEEKPOSITION)
+        elif elementId == MATROSKA_CLUSTER:
+            break
+    if tracksPosition is None:
+        return None
+    for (elementId, start, end) in iterMatroskaElements(
+            reader, segmentStart + tracksPosition, segmentEnd):
+        if elementId == MATROSKA_TRACKS:
+            return readMatroskaTracks(reader, start, end)
+        break
+    return None
+
+
+def iterMp4Boxes(reader, start, end):
+    """Yield the (type, data offset, data end) of the boxes in a range."""
+    offset = start
+    while offset + 8 <= end:
+        header = reader.read(offset, 8)
+        size = int.from_bytes(header[:4], 'big')
+        boxType = header[4:8]
+        headerLength = 8
+        if size == 1:
+            size = int.from_bytes(reader.read(offset + 8, 8), 'big')
+            headerLength = 16
+        elif size == 0:
+            size = end - offset
+        if size < headerLength:
+            raise ValueError("Invalid MP4 box at " + str(offset))
+        yield (boxType, offset + headerLength, min(offset + size, end))
+        offset = offset + size
+
+
+def readMp4Track(reader, start, end, track):
+    """Collect the fields of a trak box and its children in track."""
+    for (boxType, boxStart, boxEnd) in iterMp4Boxes(reader, start, end):
+        if boxType in (b'mdia', b'minf', b'stbl', b'tref'):
+            readMp4Track(reader, boxStart, boxEnd, track)
+        elif boxType == b'tkhd':
+            data = reader.read(boxStart, 24)
+            # Version 1 headers have 64 bit times before the track ID
+            position = 20 if data[0] == 1 else 12
+            track['id'] = int.from_bytes(data[position:position + 4], 'big')
+        elif boxType == b'mdhd':
+            data = reader.read(boxStart, 34)
+            # The language follows the times, 64 bit ones in version 1
+            position = 32 if data[0] == 1 else 20
+            code = int.from_bytes(data[position:position + 2], 'big')
+            code = code & 0x7FFF
+            if code < 0x400:
+                languages = MP4_MAC_LANGUAGES
+                track['language'] = (languages[code] if code < len(languages)
+                                     else "und")
+            else:
+                track['language'] = "".join(
+                    chr(((code >> shift) & 0x1F) + 0x60)
+                    for shift in (10, 5, 0))
+        elif boxType == b'elng':
+            track['bcp47'] = readMatroskaString(reader, boxStart + 4, boxEnd)
+        elif boxType == b'hdlr':
+            track['handler'] = reader.read(boxStart + 8, 4)
+        elif boxType == b'stsd':
+            entry = reader.read(boxStart + 8, 8)
+            track['codec'] = entry[4:8].decode('latin-1')
+        elif boxType == b'chap':
+            data = reader.read(boxStart, min(boxEnd - boxStart, 64))
+            track.setdefault('chapters', []).extend(
+                int.from_bytes(data[position:position + 4], 'big')
+                for position in range(0, len(data) - 3, 4))
+
+
+def probeMp4(reader):
+    """
+    Return the subtitle tracks of an MP4 or QuickTime file, or None.
+
+    Only box headers are read to reach the moov box, wherever it is in the
+    file, and the few boxes of every trak that name its handler, language
+    and codec. Text tracks used for chapters are not subtitles.
+    """
+    if reader.read(4, 4) not in MP4_TOP_BOXES:
+        return None
+    for (boxType, start, end) in iterMp4Boxes(reader, 0, reader.size):
+        if boxType != b'moov':
+            continue
+        tracks = []
+        for (trakType, trakStart, trakEnd) in iterMp4Boxes(reader, start,
+                                                           end):
+            if trakType == b'trak':
+                track = {}
+                readMp4Track(reader, trakStart, trakEnd, track)
+                tracks.append(track)
+        chapters = set(number for track in tracks
+                       for number in track.get('chapters', ()))
+        return [EmbeddedTrack(track.get('bcp47', track.get('language')),
+                              track.get('codec'), None, False)
+                for track in tracks
+                if track.get('handler') in MP4_SUBTITLE_HANDLERS
+                and track.get('id') not in chapters]
+    return None
+
+
+def probeEmbeddedSubtitles(filepath):
+    """
+    Return the embedded subtitle tracks of a media file, or None.
+
+    Only the container headers are parsed, from the Matroska Tracks element
+    or the MP4 moov box, with positioned reads of a few KB per file. None is
+    returned for unreadable files and other containers, which are not
+    opened at all.
+    """
+    if os.path.splitext(filepath)[1].lower() not in PROBE_EXTENSIONS:
+        return None
+    ioScheduler.throttle()
+    try:
+        fd = os.open(filepath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except OSError:
+        return None
+    try:
+        reader = BlockReader(fd, os.fstat(fd).st_size)
+        if int.from_bytes(reader.read(0, 4), 'big') == MATROSKA_EBML:
+            tracks = probeMatroska(reader)
+        else:
+            tracks = probeMp4(reader)
+        profiler.count("probe bytes", reader.bytesRead)
+        return tracks
+    except (OSError, ValueError, IndexError):
+        return None
+    finally:
+        os.close(fd)
+
+
+def probeEmbeddedSubtitlesAll(filepaths, threads=PROBE_THREADS,
+                              progress=None):
+    """
+    Return the embedded subtitle tracks of media files, using threads.
+
+    Files left once --maxruntime is spent are SKIPPED.
+    """
+    if threads <= 1 or len(filepaths) <= 1:
+        results = []
+        for filepath in filepaths:
+            if ioScheduler.expired():
+                break
+            results.append(probeEmbeddedSubtitles(filepath))
+            if progress is not None:
+                progress()
+        return results + [SKIPPED] * (len(filepaths) - len(results))
+    from concurrent.futures import ThreadPoolExecutor
+    results = [SKIPPED] * len(filepaths)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(probeEmbeddedSubtitles, filepath)
+                   for filepath in filepaths]
+        for (index, future) in enumerate(futures):
+            if future.cancelled():
+                continue
+            results[index] = future.result()
+            if progress is not None:
+                progress()
+            if ioScheduler.expired():
+                for other in futures:
+                    other.cancel()
+    return results
+
+
+class SubtitleMediaNamingCheck(Check):
+    """
+    Find subtitles that do not use the media name.
+
+    Media files with one of the exclusions in their name, such as trailers,
+    are not matched with subtitles. With embedded, media files without a
+    subtitle are probed for embedded subtitle tracks after the traversal and
+    reported when they have none in one of the languages, or none at all
+    without languages.
+    """
+
+    name = "subtitlenaming"
+
+    def __init__(self, exclusions=("-trailer",), embedded=False,
+                 languages=()):
+        """Initialize SubtitleMediaNamingCheck class."""
+        Check.__init__(self)
+        self.exclusions = [exclusion.lower() for exclusion in exclusions]
+        self.embedded = embedded
+        self.languages = []
+        if embedded:
+            self.languages = [getDetectableLanguage(language)
+                              for language in languages]
+            self.languages = [language for language in self.languages
+                              if language is not None]
+        self.total = 0
+        self.incorrect = 0
+        self.mediaFiles = []
+        self.probed = 0
+        self.withEmbedded = 0
+        self.missing = 0
+        self.skipped = 0
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Compare the subtitle names with the media names in a folder."""
+        subtitleFiles = [entry.name for entry in files
+                         if os.path.splitext(entry.name)[1].lower()
+                         in self.subtitleExts]
+        if not subtitleFiles and not self.embedded:
+            return
+        self.total = self.total + len(subtitleFiles)
+        index = MediaIndex((entry.name for entry in files), self.mediaExts,
+                           self.exclusions)
+        if not index:
+            if subtitleFiles:
+                self.emit("info", "No media files in " + subdir, [subdir])
+            return
+        matched = set()
+        for filename in subtitleFiles:
+            stem = index.match(filename)
+            if stem is not None:
+                matched.add(stem)
+                continue
+            self.incorrect = self.incorrect + 1
+            filepath = os.path.join(subdir, filename)
+            mediaFiles = index.closest(filename)
+            warning = "Incorrectly named subtitle found " + filepath
+            warning += " (media filename: \"" + mediaFiles[0] + "\")"
+            self.emit("warning", warning, [filepath],
+                      {"media": mediaFiles})
+        if self.embedded:
+            names = set(name for (stem, names) in index.stems.items()
+                        if stem not in matched for name in names)
+            for entry in files:
+                if entry.name in names:
+                    st = None
+                    if self.cache is not None:
+                        try:
+                            st = statEntry(entry)
+                        except OSError:
+                            pass
+                    self.mediaFiles.append((entry.path, st))
+
+    def partial(self):
+        """Return the subtitle counts and media files of a shard."""
+        return dict(Check.partial(self), total=self.total,
+                    incorrect=self.incorrect, mediaFiles=self.mediaFiles)
+
+    def merge(self, partial):
+        """Add the subtitle counts and media files of a shard."""
+        Check.merge(self, partial)
+        self.total = self.total + partial["total"]
+        self.incorrect = self.incorrect + partial["incorrect"]
+        self.mediaFiles.extend(partial["mediaFiles"])
+
+    def embeddedTracks(self):
+        """
+        Return the embedded subtitle tracks of the media files.
+
+        Media files left once --maxruntime is spent are SKIPPED.
+        """
+        results = [None] * len(self.mediaFiles)
+        missing = []
+        for (index, (filepath, st)) in enumerate(self.mediaFiles):
+            if self.cache is not None and st is not None:
+                results[index] = self.cache.getTracks(filepath, st,
+                                                      PROBE_SCHEME)
+                if results[index] is not None:
+                    continue
+            missing.append(index)
+        progress = None
+        if useProgress and missing:
+            progress = ProgressIndicator("Probing", "media files",
+                                         len(missing))
+        with profiler.stage(self.name + ": probe"):
+            probed = probeEmbeddedSubtitlesAll(
+                [self.mediaFiles[index][0] for index in missing],
+                progress=progress)
+        if progress is not None:
+            progress.finish()
+        for (index, tracks) in zip(missing, probed):
+            results[index] = tracks
+            if tracks is SKIPPED:
+                continue
+            self.probed = self.probed + 1
+            (filepath, st) = self.mediaFiles[index]
+            if tracks is not None and self.cache is not None and st:
+                self.cache.setTracks(filepath, st, PROBE_SCHEME, tracks)
+        return results
+
+    def analyze(self):
+        """Report the media files without external or embedded subtitles."""
+        if not self.mediaFiles:
+            return
+        self.flushNotifications()
+        for ((filepath, st), tracks) in zip(self.mediaFiles,
+                                            self.embeddedTracks()):
+            if tracks is SKIPPED:
+                self.skipped = self.skipped + 1
+                continue
+            tracks = tracks or []
+            needed = [track for track in tracks
+                      if not self.languages
+                      or getDetectableLanguage(
+                          (track.language or "und").split("-")[0])
+                      in self.languages]
+            if needed:
+                self.withEmbedded = self.withEmbedded + 1
+                continue
+            self.missing = self.missing + 1
+            warning = "No subtitles found for " + filepath
+            if tracks:
+                warning += " (embedded: " + ", ".join(
+                    str(track.language) + " " + str(track.codec)
+                    for track in tracks) + ")"
+            self.emit("warning", warning, [filepath],
+                      {"tracks": [track._asdict() for track in tracks]})
+        self.mediaFiles = []
+
+    def summary(self):
+        """Return the subtitle counts."""
+        summary = {"total": self.total, "incorrect": self.incorrect}
+        if self.embedded:
+            summary.update(probed=self.probed, embedded=self.withEmbedded,
+                           missing=self.missing, skipped=self.skipped)
+        return summary
+
+    def finish(self):
+        """Print the number of incorrectly named subtitles."""
+        info = "Found " + bold(str(self.total)) + " subtitle files of which "
+        info += bold(str(self.incorrect)) + " are incorrectly named"
+        printNotificationInfo(info)
+        if self.embedded:
+            info = "Found " + bold(str(self.missing)) + " media files "
+            info += "without subtitles, " + str(self.withEmbedded)
+            info += " others only have embedded subtitles"
+            if self.skipped:
+                info += ", " + str(self.skipped) + " left for the next run"
+            printNotificationInfo(info)
+
+
+def findSubtitlesMediaNaming(scanfolder):
+    """Find subtitles that do not use the media name."""
+    runChecks(scanfolder, [SubtitleMediaNamingCheck()])
+
+
+GarbageFolder = collections.namedtuple(
+    'GarbageFolder',
+    ['keep', 'media', 'files', 'bytes', 'folders', 'garbage'])
+
+
+class GarbageCheck(Check):
+    """
+    Find garbage such as empty folders and empty.
+
+    or very small files and undesired file extensions.
+
+    Every folder is recorded with the sizes of its own files during the
+    traversal and aggregated bottom-up afterwards. A folder tree without any
+    media or subtitle files, whatever their size, or other files worth
+    keeping is reported once at its top with the bytes deleting it would
+    free, instead of every empty folder and garbage file in it.
+    """
+
+    name = "garbagecollector"
+    smallFileSize = 1024 * 4
+    needsStat = True
+
+    def __init__(self):
+        """Initialize GarbageCheck class."""
+        Check.__init__(self)
+        self.folders = collections.OrderedDict()
+        self.emptyFolders = []
+        self.garbageFolders = []
+        self.unexpectedFiles = []
+        self.smallFiles = []
+        self.reclaimable = 0
+        self.counts = {"emptyfolder": 0, "garbagefolder": 0,
+                       "extension": 0, "smallfile": 0}
+
+    def found(self, kind, category, warning, path, details=None):
+        """Stream a garbage finding, or remember it for its category."""
+        self.counts[kind] = self.counts[kind] + 1
+        if self.reporter is not None:
+            self.emit("warning", warning, [path], dict(details or {},
+                                                       kind=kind))
+        elif self.shown("warning"):
+            category.append((path, details))
+
+    def visitDirectory(self, subdir, dirs, files):
+        """Record the sizes of the files in a folder and the garbage."""
+        # Symlinked folders are not followed, so they count as content
+        keep = 0
+        media = 0
+        folders = 0
+        for entry in dirs:
+            if entry.is_symlink():
+                keep = keep + 1
+            else:
+                folders = folders + 1
+        size = 0
+        garbage = []
+        allowExtensions = self.mediaExts + self.subtitleExts
+        for entry in files:
+            try:
+                if not entry.is_file():
+                    keep = keep + 1
+                    continue
+                fileSize = statEntry(entry).st_size
+            except OSError:
+                keep = keep + 1
+                continue
+            size = size + fileSize
+            kinds = []
+            if os.path.splitext(entry.name)[1].lower() in allowExtensions:
+                # Small media is reported, but keeps its folder all the same
+                media = media + 1
+            else:
+                kinds.append("extension")
+            if fileSize < self.smallFileSize:
+                kinds.append("smallfile")
+            if kinds:
+                garbage.append((entry.path, fileSize, kinds))
+        self.folders[subdir] = GarbageFolder(keep, media, len(files), size,
+                                             folders, garbage)
+
+    def partial(self):
+        """Return the folders recorded in a shard, in visit order."""
+        return dict(Check.partial(self),
+                    folders=[(subdir, tuple(folder)) for (subdir, folder)
+                             in self.folders.items()])
+
+    def merge(self, partial):
+        """Add the folders of a shard after the folders merged before."""
+        # Shards hold whole trees below the scan folder, which is visited
+        # by the first shard, so parents still come before their children
+        Check.merge(self, partial)
+        for (subdir, folder) in partial["folders"]:
+            self.folders[subdir] = GarbageFolder(*folder)
+
+    def aggregate(self):
+        """
+        Return (keep, media, files, bytes) of every folder tree, bottom-up.
+
+        Keep counts what is neither media nor garbage, such as symlinks and
+        folders that could not be listed. Media counts the media and subtitle
+        files, whatever their size.
+        """
+        # Every folder is visited after its parent, so in reversed visit
+        # order the children are done before their parent (post-order)
+        totals = {}
+        visited = {}
+        for (subdir, folder) in reversed(self.folders.items()):
+            (keep, media, files, size) = totals.get(subdir, (0, 0, 0, 0))
+            keep = keep + folder.keep
+            # Folders that could not be listed might hold anything
+            keep = keep + folder.folders - visited.pop(subdir, 0)
+            total = (keep, media + folder.media, files + folder.files,
+                     size + folder.bytes)
+            totals[subdir] = total
+            parent = os.path.dirname(subdir)
+            if parent != subdir and parent in self.folders:
+                visited[parent] = visited.get(parent, 0) + 1
+                totals[parent] = tuple(
+                    count + added for (count, added)
+                    in zip(totals.get(parent, (0, 0, 0, 0)), total))
+        return totals
+
+    def analyze(self):
+        """Report the topmost garbage-only trees and the other garbage."""
+        totals = self.aggregate()
+        reclaimed = set()
+        for (index, (subdir, folder)) in enumerate(self.folders.items()):
+            if os.path.dirname(subdir) in reclaimed:
+                reclaimed.add(subdir)
+                continue
+            (keep, media, files, size) = totals[subdir]
+            # The scan folder itself is never reported
+            if index > 0 and keep == 0 and media == 0:
+                reclaimed.add(subdir)
+                self.reclaimable = self.reclaimable + size
+                details = {"files": files, "bytes": size}
+                if files == 0:
+                    self.found("emptyfolder", self.emptyFolders,
+                               "Found empty folder", subdir, details)
+                else:
+                    warning = "Found folder with only garbage ("
+                    warning += "{:,}".format(size) + " bytes)"
+                    self.found("garbagefolder", self.garbageFolders,
+                               warning, subdir, details)
+                continue
+            for (path, fileSize, kinds) in folder.garbage:
+                self.reclaimable = self.reclaimable + fileSize
+                details = {"bytes": fileSize}
+                if "extension" in kinds:
+                    self.found("extension", self.unexpectedFiles,
+                               "Found unexpected file extension", path,
+                               details)
+                if "smallfile" in kinds:
+                    self.found("smallfile", self.smallFiles,
+                               "Found unlikely small file", path, details)
+        self.folders.clear()
 
+    def summary(self):
+        """Return the number of findings per kind and the bytes to free."""
+        return dict(self.counts, reclaimablebytes=self.reclaimable)
 
-def printNotificationNew(str):
-    """To print text with the new notification styling."""
-    print("\n" + green(bold("[ new     ] ")) + str)
+    def finish(self):
+        """Print the garbage found per category."""
+        printNotificationInfo("Searching for empty folders")
+        for (subdir, details) in self.emptyFolders:
+            printNotificationWarning("-- Found empty folder: " + subdir)
+        printNotificationInfo("Searching for folders with only garbage")
+        for (subdir, details) in self.garbageFolders:
+            warning = "-- Found folder with only garbage: " + subdir + " ("
+            warning += "{:,}".format(details["files"]) + " files, "
+            warning += "{:,}".format(details["bytes"]) + " bytes)"
+            printNotificationWarning(warning)
+        printNotificationInfo("Searching for unexpected file extensions")
+        for (fullFilePath, details) in self.unexpectedFiles:
+            warning = "-- Found unexpected file extension: " + fullFilePath
+            printNotificationWarning(warning)
+        printNotificationInfo("Searching for unlikely small files")
+        for (fullFilePath, details) in self.smallFiles:
+            warning = "-- Found unlikely small file: " + fullFilePath
+            printNotificationWarning(warning)
+        info = "Deleting the garbage would free "
+        info += bold("{:,}".format(self.reclaimable)) + " bytes"
+        printNotificationInfo(info)
 
 
-def printNotificationInfo(str):
-    """To print text with the info notification styling."""
-    print(Fore.CYAN + bold("[ info    ] ") + Fore.WHITE + str)
+def garbagecollector(scanfolder):
+    """Find garbage such as empty folders and small or unexpected files."""
+    runChecks(scanfolder, [GarbageCheck()])
 
 
-def printNotificationWarning(str):
-    """To print text with warning notification styling."""
-    print(Fore.YELLOW + bold("[ warning ] ") + Fore.WHITE + str)
+class LanguageCheck(Check):
+    """
+    Check language of subtitles in a folder.
 
+    Subtitle files are collected during the traversal and checked afterwards,
+    so the progress bar knows its size without walking the folder twice.
 
-def printNotificationDanger(str):
-    """To print text with danger notification styling."""
-    print(Fore.RED + bold("[ danger  ] ") + Fore.WHITE + str)
+    TODO: Handle unicode better to detect languages like German and
+          Dutch better
+    """
 
+    name = "subtitleslangcheck"
 
-def levenshtein(s1, s2):
-    """Calculate levenshtein distance between two strings."""
-    if len(s1) < len(s2):
-        return levenshtein(s2, s1)
+    def __init__(self):
+        """Initialize LanguageCheck class."""
+        Check.__init__(self)
+        self.iso639 = importDependency("iso639")
+        self.subtitleFiles = []
+        self.attempted = 0
+        self.failedDetection = 0
+        self.detectedWrongLang = 0
+        self.skipped = 0
 
-    if len(s2) == 0:
-        return len(s1)
+    def visitFile(self, subdir, entry):
+        """Collect subtitle files."""
+        extension = os.path.splitext(entry.name)[1].lower()
+        if extension in self.subtitleExts:
+            st = None
+            if self.cache is not None:
+                try:
+                    st = statEntry(entry)
+                except OSError:
+                    pass
+            self.subtitleFiles.append((entry.path, st))
 
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            # j+1 instead of j since previous_row and current_row
-            # are one character longer
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1        # than s2
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
+    def partial(self):
+        """Return the subtitle files collected in a shard."""
+        return dict(Check.partial(self), subtitleFiles=self.subtitleFiles)
 
+    def merge(self, partial):
+        """Add the subtitle files of a shard, detected later."""
+        Check.merge(self, partial)
+        self.subtitleFiles.extend(partial["subtitleFiles"])
 
-def getIsoLanguageCodeFromFilename(filename):
-    """
-    Return the iso language from filenames ending with a language code.
+    def analyze(self):
+        """Detect the language of every collected subtitle file."""
+        # Print the heading before the progress bar
+        self.flushNotifications()
+        self.attempted = len(self.subtitleFiles)
+        info = str(self.attempted) + " subtitle files found"
+        self.notify(printNotificationInfo, info)
+        self.flushNotifications()
+        progress = None
+        if useProgress:
+            progress = ProgressIndicator("Processing", "subtitles",
+                                         self.attempted)
+        subtitles = []
+        for (filepath, st) in self.subtitleFiles:
+            filename = os.path.basename(filepath)
+            (fileName, fileExt) = os.path.splitext(filename)
+            # Only works when suffix is correctly set with .en.srt
+            (filenameWithoutLang, langCode) = os.path.splitext(fileName)
+            subtitles.append((filepath, st, langCode[1:]))
+        results = self.detectLanguages(subtitles, progress)
+        if progress is not None:
+            progress.finish()
+        self.subtitleFiles = []
+        for ((filepath, st, langCode), result) in zip(subtitles, results):
+            filename = os.path.basename(filepath)
+            if result is SKIPPED:
+                self.attempted = self.attempted - 1
+                self.skipped = self.skipped + 1
+                continue
+            if result is None:
+                self.failedDetection = self.failedDetection + 1
+                continue
+            (possibleLanguage, probabilities) = result
+            try:
+                if langCode != possibleLanguage:
+                    warning = "Detected lang \"" + possibleLanguage + "\""
+                    toName = self.iso639.to_name
+                    warning += "(" + toName(possibleLanguage) + ")"
+                    warning += " but \"" + langCode + "\""
+                    warning += "(" + toName(langCode) + ") is used"
+                    warning += " in filename " + filename
+                    warning += "\n\t\t" + formatProbabilities(probabilities)
+                    warning += "\n"
+                    self.detectedWrongLang = self.detectedWrongLang + 1
+                    self.emit("warning", warning, [filepath],
+                              {"langcode": langCode,
+                               "language": possibleLanguage,
+                               "probabilities": probabilities})
+            except Exception:
+                self.failedDetection = self.failedDetection + 1
 
-    Currently a tricky way of getting the part before the extension is used
-    Assuming that only a dot is used before and after the language code
-    TODO: Improve language code extraction using regex
-    """
-    (fileName, fileExt) = os.path.splitext(filename)
-    (filenameWithoutLang, langCode) = os.path.splitext(fileName)
-    return langCode[1:]
+    def summary(self):
+        """Return the detection counts."""
+        return {"attempted": self.attempted, "failed": self.failedDetection,
+                "wronglanguage": self.detectedWrongLang,
+                "skipped": self.skipped}
 
+    def finish(self):
+        """Print the detection counts."""
+        if self.failedDetection:
+            printNotificationDanger("Caught an exception")
+        info = "Attempted detections: " + str(self.attempted)
+        printNotificationInfo(info)
+        info = "Failed detections: " + str(self.failedDetection)
+        printNotificationInfo(info)
+        info = "Detected wrong language: " + str(self.detectedWrongLang)
+        printNotificationInfo(info)
+        if self.skipped:
+            info = "Left for the next run: " + str(self.skipped)
+            printNotificationInfo(info)
 
-def matchFoldersOnExactName(scanfolder, ignoreyearfolders):
-    """Find folders with the exact same name, recursively."""
-    knownListFolderNames = {}
-    total = 0
-    duplicate = 0
-    ignored = 0
-    for subdir, dirs, files in os.walk(scanfolder):
-        total = total + 1
-        subdirName = os.path.basename(os.path.normpath(subdir))
-        if subdirName not in knownListFolderNames:
-            matchSubdirName = bool(re.match('^[0-9]{4}$', subdirName))
-            if ignoreyearfolders is True and matchSubdirName is False:
-                knownListFolderNames[subdirName] = subdir
-            elif ignoreyearfolders is False:
-                knownListFolderNames[subdirName] = subdir
-            else:
-                ignored = ignored + 1
-        else:
-            duplicate = duplicate + 1
-            warning = "Found duplicate foldername \"" + bold(subdirName) + "\""
-            warning += "\n\t1: " + knownListFolderNames[subdirName]
-            warning += "\n\t2: " + subdir
-            printNotificationWarning(warning)
-    dataStatsTable = [
-        ['Unique', str(len(knownListFolderNames))],
-        ['Duplicate', str(duplicate)]
-    ]
 
-    if ignoreyearfolders:
-        dataStatsTable.append(['Ignored', str(ignored)])
-    heading = 'Total'.ljust((APP_STR_PADDING-(4+(3*1))-len(str(total))), ' ')
-    dataStatsTable.append([heading, str(total)])
-    statsTable = AsciiTable(dataStatsTable)
-    statsTable.title = Fore.CYAN + '[info] ' + Fore.WHITE + 'Results'
-    statsTable.inner_heading_row_border = False
-    statsTable.justify_columns[1] = 'right'
-    print(statsTable.table)
+def languagechecker(scanfolder):
+    """Check language of subtitles in a folder."""
+    runChecks(scanfolder, [LanguageCheck()])
 
 
-def matchFoldersOnSoundex(scanfolder, ignoreyearfolders):
-    """Find similar foldernames based on soundex, recursively."""
-    knownListFolderNames = {}
-    total = 0
-    duplicate = 0
-    ignored = 0
-    ignoreSoundex = ["10000000", "20000000"]
-    dataStatsTable = []
-    for subdir, dirs, files in os.walk(scanfolder):
-        total = total + 1
-        subdirName = os.path.basename(os.path.normpath(subdir))
-        try:
-            sss = soundex.Soundex()
-            soundexOfName = sss.soundex(str(subdirName), 8)
-            if soundexOfName not in knownListFolderNames:
-                subdirNameMatch = bool(re.match('^[0-9]{4}$', subdirName))
-                if (
-                        ignoreyearfolders is True
-                        and subdirNameMatch is False
-                        and soundexOfName not in ignoreSoundex
-                ):
-                    knownListFolderNames[soundexOfName] = subdir
-                elif ignoreyearfolders is False:
-                    knownListFolderNames[soundexOfName] = subdir
-                else:
-                    ignored = ignored + 1
-            else:
-                duplicate = duplicate + 1
-                oldSubdir = knownListFolderNames[soundexOfName]
-                oldSubdirName = os.path.basename(os.path.normpath(oldSubdir))
-                dataStatsTable.append([soundexOfName, oldSubdirName])
-                dataStatsTable.append([soundexOfName, subdirName])
-        except Exception:
-            ignored = ignored + 1
-            warning = "Could not calculate the soundex of foldername \""
-            warning += bold(subdirName) + "\""
-            printNotificationWarning(warning)
-    dataStatsTable.sort(key=lambda x: x[0])
-    dataStatsTable.insert(0, ["Soundex", "Folder name"])
-    statsTable = AsciiTable(dataStatsTable)
-    statsTable.title = Fore.CYAN + '[info] ' + Fore.WHITE + 'Results '
-    print(statsTable.table)
+SUBTITLE_WORD = re.compile(r'[^\W_]+')
+# === Stored with the cached signatures, change it with the parameters below
+SIGNATURE_SCHEME = "oph-128-w3"
+SIGNATURE_SIZE = 128
+# === Odd 64 bit multipliers for the first and second word of a shingle
+SHINGLE_FIRST = 0x9E3779B97F4A7C15
+SHINGLE_SECOND = 0xC2B2AE3D27D4EB4F
+HASH_MASK = (1 << 64) - 1
+EMPTY_BIN = 1 << 64
 
 
-def findSubtitlesNoneIso639(scanfolder, isoMode, disablelangdetect):
+def getSubtitleSignature(filepath):
     """
-    Detect subtitles that do not comply with ISO-639.
+    Return the MinHash signature of the dialogue of a subtitle, or None.
 
-    TODO: Add more subtitle extensions (and read/parse them correctly for
-          language detection)
-    TODO: Seperate language detection better in different functions
-    TODO: Add percentage of certainty and possible other languages when
-          low certainty
-    TODO: Handle unicode better to detect languages like German and Dutch
-          better
-    TODO: Use table
+    The dialogue is split into shingles of three lowercase words. Every
+    distinct word is hashed once, the hash of a shingle mixes the hashes of
+    its words. With one-permutation hashing the shingle hash picks one of
+    SIGNATURE_SIZE bins, which keep the smallest hash they get. Empty bins
+    take the value of the next filled bin. None is returned for unreadable
+    files and files with too little dialogue.
     """
-    subtitleExts = ['.srt', '.sub', '.ass']
-    total = 0
-    incorrect = 0
-    detectedlang = 0
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            incorrectSubtitle = False
-            extension = os.path.splitext(filename)[1].lower()
-            # subdirName = os.path.basename(os.path.normpath(subdir))
-            if extension in subtitleExts:
-                total = total + 1
-                langcodeFromFilename = getIsoLanguageCodeFromFilename(filename)
-                detectedLanguage = ""
-                detectedIsoMode = False
-                if is_valid639_1(langcodeFromFilename):
-                    detectedIsoMode = "1"
-                    detectedLanguage = iso639_to_name(langcodeFromFilename)
-                if is_valid639_2(langcodeFromFilename):
-                    detectedIsoMode = "2"
-                    detectedLanguage = iso639_to_name(langcodeFromFilename)
-                if detectedIsoMode is not isoMode:
-                    isoShouldBe = ""
-                    if isoMode == "1" and detectedIsoMode == "2":
-                        isoShouldBe = to_iso639_1(langcodeFromFilename)
-                    if isoMode == "2" and detectedIsoMode == "1":
-                        isoShouldBe = to_iso639_2(langcodeFromFilename)
-                    filepath = subdir + os.sep + filename
-                    incorrectSubtitle = True
-                    incorrect = incorrect + 1
-                    warning = "Incorrectly named subtitle found at "
-                    warning += bold(filepath)
-                    printNotificationWarning(warning)
-                    if detectedIsoMode is not False:
-                        info = "\t\tLang code " + bold(langcodeFromFilename)
-                        info += " (ISO 639-" + str(detectedIsoMode) + ") "
-                        info += "detected. The ISO 639-" + isoMode + " code"
-                        info += " for " + detectedLanguage + " is "
-                        info += bold(isoShouldBe) + "."
-                        printNotificationInfo(info)
-                if incorrectSubtitle and not disablelangdetect:
-                    filepath = subdir + os.sep + filename
-                    try:
-                        with io.open(filepath, "r", encoding="utf-8") as mfile:
-                            my_unicode_string = mfile.read()
-                        possibleLanguage = "\tDetected language is likely to "
-                        possibleLanguage += "be \"" + detect(my_unicode_string)
-                        possibleLanguage += "\"\n"
-                        detectedlang = detectedlang + 1
-                    except Exception:
-                        possibleLanguage = "\tLanguage detection failed\n"
-    info = "Found subtitle files " + bold(str(total)) + " of which "
-    info += bold(str(incorrect)) + " are incorrectly named!"
-    printNotificationInfo(info)
+    import hashlib
+    try:
+        text = readSubtitleText(filepath)
+    except (OSError, UnicodeError):
+        return None
+    words = SUBTITLE_WORD.findall(text.lower())
+    if len(words) < 3:
+        return None
+    wordHashes = {
+        word: int.from_bytes(hashlib.blake2b(word.encode('utf-8'),
+                                             digest_size=8).digest(),
+                             'little')
+        for word in set(words)}
+    hashes = [wordHashes[word] for word in words]
+    first = [value * SHINGLE_FIRST for value in hashes]
+    second = [value * SHINGLE_SECOND for value in hashes]
+    shingles = {(a ^ b ^ c) & HASH_MASK
+                for (a, b, c) in zip(first, second[1:], hashes[2:])}
+    bins = [EMPTY_BIN] * SIGNATURE_SIZE
+    for value in shingles:
+        index = value % SIGNATURE_SIZE
+        if value < bins[index]:
+            bins[index] = value
+    nextValue = EMPTY_BIN
+    for index in reversed(range(2 * SIGNATURE_SIZE)):
+        value = bins[index % SIGNATURE_SIZE]
+        if value != EMPTY_BIN:
+            nextValue = value
+        else:
+            bins[index % SIGNATURE_SIZE] = nextValue
+    return bins
 
 
-def findSubtitlesMediaNaming(scanfolder):
+def getSubtitleSignatureWorkerBatch(filepaths):
     """
-    Find subtitles that do not use the media name.
+    Return the signatures of a chunk and what the worker throttled.
 
-    TODO: Use table
-    TODO: If more mp4/mkv files are found, throw error that it's only
-          supported with one mediafile on same level
-    TODO: Make option/argument to exclude more than -trailers only
-    TODO: Support multiple TV Series in one folder
+    Files left once --maxruntime is spent are SKIPPED.
     """
-    subtitleExts = ['.srt', '.sub', '.ass']
-    total = 0
-    incorrect = 0
-    subtitleFiles = []
-    # Firstly search for subtitle files
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            subtitleFiles.append(os.path.join(subdir, filename))
-    print(len(subtitleFiles))
-    print(subtitleFiles)
-
-    for subtitleFile in subtitleFiles:
-        print(subtitleFile)
-        print(os.path.dirname(subtitleFile))
-
-    # incorrectSubtitle = False
-    extension = os.path.splitext(filename)[1].lower()
-    # subdirName = os.path.basename(os.path.normpath(subdir))
-    if extension in subtitleExts:
-        total = total + 1
-        cm = len([name for name in os.listdir(subdir) if os.path.isfile(name)])
-        if cm > 0:
-            for mediafile in os.listdir(subdir):
-                if (
-                    (
-                        mediafile.lower().endswith(".mp4")
-                        or mediafile.lower().endswith(".mkv")
-                        or mediafile.lower().endswith(".avi")
-                        or mediafile.lower().endswith(".m4v")
-                    )
-                    and "-trailer" not in mediafile
-                ):
-                    sp1 = os.path.splitext(mediafile)
-                    sp2 = os.path.splitext(filename)
-                    (mediafileNameWithoutExt, mediafileExt) = sp1
-                    (subfileNameWithoutExt, subfileExt) = sp2
-                    sp3 = os.path.splitext(subfileNameWithoutExt)
-                    (subtitleNameLikeMediaName, subtitleFilenameLangcode) = sp3
-                    if mediafileNameWithoutExt != subtitleNameLikeMediaName:
-                        incorrect = incorrect + 1
-                        warning = "Incorrectly named subtitle found "
-                        warning += os.path.join(subdir, filename)
-                        warning += " (media filename: \"" + mediafile + "\")"
-                        printNotificationWarning(warning)
+    signatures = []
+    for filepath in filepaths:
+        if ioScheduler.expired():
+            signatures.append(SKIPPED)
         else:
-            print("No media files in " + subdir)
-    info = "Found " + bold(str(total)) + " subtitle files of which "
-    info += bold(str(incorrect)) + " are incorrectly named"
-    printNotificationInfo(info)
+            signatures.append(getSubtitleSignature(filepath))
+    return (signatures, ioScheduler.take())
 
 
-def garbagecollector(scanfolder):
+def getSubtitleSignatures(filepaths, jobs=1, progress=None, chunksize=16):
     """
-    Find garbage such as empty folders and empty.
+    Return the signatures of subtitle files, in parallel when jobs > 1.
 
-    or very small files and undesired file extensions.
+    Files left once --maxruntime is spent are SKIPPED.
     """
-    printNotificationInfo("Searching for empty folders")
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        if not os.listdir(subdir):
-            printNotificationWarning("-- Found empty folder: " + subdir)
-    printNotificationInfo("Searching for unexpected file extensions")
-    allowExtensions = ['.mp4', '.mkv', '.avi', '.m4v', '.srt', '.sub', '.ass']
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            ext = os.path.splitext(filename)[1].lower()
-            fullFilePath = os.path.join(subdir, filename)
-            if os.path.isfile(fullFilePath) and ext not in allowExtensions:
-                warning = "-- Found unexpected file extension: " + fullFilePath
-                printNotificationWarning(warning)
-    printNotificationInfo("Searching for unlikely small files")
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            fullFilePath = os.path.join(subdir, filename)
-            if (
-                os.path.isfile(fullFilePath)
-                and os.path.getsize(fullFilePath) < (1024 * 4)
-            ):
-                warning = "-- Found unlikely small file: " + fullFilePath
-                printNotificationWarning(warning)
+    if jobs <= 1 or len(filepaths) <= chunksize:
+        signatures = []
+        for filepath in filepaths:
+            if ioScheduler.expired():
+                break
+            signatures.append(getSubtitleSignature(filepath))
+            if progress is not None:
+                progress()
+        return signatures + [SKIPPED] * (len(filepaths) - len(signatures))
+    from concurrent.futures import ProcessPoolExecutor
+    signatures = [SKIPPED] * len(filepaths)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initScheduler,
+                             initargs=(ioScheduler.share(jobs),)) as executor:
+        futures = {executor.submit(getSubtitleSignatureWorkerBatch,
+                                   filepaths[start:start + chunksize]): start
+                   for start in range(0, len(filepaths), chunksize)}
+        for future in iterCompleted(futures):
+            start = futures[future]
+            (chunkSignatures, throttled) = future.result()
+            ioScheduler.merge(throttled)
+            for (offset, signature) in enumerate(chunkSignatures):
+                signatures[start + offset] = signature
+                if progress is not None and signature is not SKIPPED:
+                    progress()
+    return signatures
 
 
-def languagechecker(scanfolder):
+class SubtitleDuplicatesCheck(Check):
     """
-    Check language of subtitles in a folder.
+    Find subtitles with nearly the same dialogue, whatever their names.
 
-    TODO: Handle unicode better to detect languages like German and
-          Dutch better
+    Every subtitle gets a MinHash signature, see getSubtitleSignature(). The
+    signatures are cut into bands and subtitles sharing a band are candidate
+    pairs (locality-sensitive hashing), so candidates come out in about
+    linear time instead of comparing all pairs. A candidate is similar when
+    at least minSimilarity of the signature values are equal, an estimate of
+    the Jaccard similarity of the shingles. Similar subtitles are grouped
+    with UnionFind. Signatures are kept in the scan cache.
     """
-    subtitleExts = ['.srt', '.sub', '.ass']
-    subtitleFilesCount = 0
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            extension = os.path.splitext(filename)[1].lower()
-            if extension in subtitleExts:
-                subtitleFilesCount = subtitleFilesCount+1
-    printNotificationInfo(str(subtitleFilesCount) + " subtitle files found")
-    bar = Bar('Processing', max=subtitleFilesCount)
-    subtitleExts = ['.srt', '.sub', '.ass']
-    failedDetection = 0
-    detectedWrongLang = 0
-    for subdir, dirnames, filenames in os.walk(scanfolder):
-        for filename in filenames:
-            extension = os.path.splitext(filename)[1].lower()
-            if extension in subtitleExts:
-                (fileName, fileExt) = os.path.splitext(filename)
-                # Only works when suffix is correctly set with .en.srt
-                (filenameWithoutLang, langCode) = os.path.splitext(fileName)
-                langCode = langCode[1:]
-                filepath = subdir + os.sep + filename
+
+    name = "subtitleduplicates"
+    bands = 32
+
+    def __init__(self, minSimilarity=0.5):
+        """Initialize SubtitleDuplicatesCheck class."""
+        Check.__init__(self)
+        self.minSimilarity = minSimilarity
+        self.subtitleFiles = []
+        self.total = 0
+        self.failed = 0
+        self.cached = 0
+        self.verified = 0
+        self.skipped = 0
+        self.clusters = []
+
+    def visitFile(self, subdir, entry):
+        """Collect subtitle files."""
+        extension = os.path.splitext(entry.name)[1].lower()
+        if extension in self.subtitleExts:
+            st = None
+            if self.cache is not None:
                 try:
-                    # 1. Reading SRT file
-                    # 2. Removing HTML (English)
-                    # 3. Timing information for language check
-                    subs = pysrt.open(filepath, encoding='iso-8859-1')
-                    c = 0
-                    ts = ""
-                    for sub in subs:
-                        # skip the first, because it's usually ads (in English)
-                        if c > 0:
-                            ts += "\n" + strip_tags(subs[c].text)
-                            c = c+1
-                    possibleLanguage = detect(ts)
-                    if langCode != possibleLanguage:
-                        detectedWrongLang = detectedWrongLang + 1
-                        warning = "Detected lang \"" + possibleLanguage + "\""
-                        warning += "(" + iso639_to_name(possibleLanguage) + ")"
-                        warning += " but \"" + langCode + "\""
-                        warning += "(" + iso639_to_name(langCode) + ") is used"
-                        warning += " in filename " + filename
-                        printNotificationWarning()
-                        print("\t\t" + str(detect_langs(ts)) + "\n")
-                except Exception:
-                    error = 1
-                bar.next()
-    bar.finish()
-    if error:
-        printNotificationDanger("Caught an exception")
-    printNotificationInfo("Attempted detections: " + str(subtitleFilesCount))
-    printNotificationInfo("Failed detections: " + str(failedDetection))
-    printNotificationInfo("Detected wrong language: " + str(detectedWrongLang))
+                    st = statEntry(entry)
+                except OSError:
+                    pass
+            self.subtitleFiles.append((entry.path, st))
+
+    def partial(self):
+        """Return the subtitle files collected in a shard."""
+        return dict(Check.partial(self), subtitleFiles=self.subtitleFiles)
+
+    def merge(self, partial):
+        """Add the subtitle files of a shard, compared later."""
+        Check.merge(self, partial)
+        self.subtitleFiles.extend(partial["subtitleFiles"])
+
+    def signatures(self):
+        """
+        Return the signatures of the subtitles, cached when possible.
+
+        Subtitles left once --maxruntime is spent are SKIPPED.
+        """
+        signatures = [None] * len(self.subtitleFiles)
+        missing = []
+        for (index, (filepath, st)) in enumerate(self.subtitleFiles):
+            if self.cache is not None and st is not None:
+                signatures[index] = self.cache.getSignature(
+                    filepath, st, SIGNATURE_SCHEME)
+                if signatures[index] is not None:
+                    self.cached = self.cached + 1
+                    continue
+            missing.append(index)
+        progress = None
+        if useProgress and missing:
+            progress = ProgressIndicator("Hashing", "subtitles",
+                                         len(missing))
+        with profiler.stage(self.name + ": signatures"):
+            computed = getSubtitleSignatures(
+                [self.subtitleFiles[index][0] for index in missing],
+                self.jobs, progress)
+        if progress is not None:
+            progress.finish()
+        for (index, signature) in zip(missing, computed):
+            signatures[index] = signature
+            (filepath, st) = self.subtitleFiles[index]
+            if signature is not None and signature is not SKIPPED \
+                    and self.cache is not None and st:
+                self.cache.setSignature(filepath, st, SIGNATURE_SCHEME,
+                                        signature)
+        return signatures
+
+    def similarity(self, signature1, signature2):
+        """Return the fraction of equal values of two signatures."""
+        equal = sum(1 for (value1, value2) in zip(signature1, signature2)
+                    if value1 == value2)
+        return equal / len(signature1)
+
+    def analyze(self):
+        """Group the subtitles whose signatures are similar."""
+        signatures = self.signatures()
+        rows = SIGNATURE_SIZE // self.bands
+        buckets = {}
+        for (index, signature) in enumerate(signatures):
+            if signature is SKIPPED:
+                self.skipped = self.skipped + 1
+                continue
+            if signature is None:
+                self.failed = self.failed + 1
+                continue
+            self.total = self.total + 1
+            for band in range(self.bands):
+                key = (band,) + tuple(signature[band * rows:
+                                                (band + 1) * rows])
+                buckets.setdefault(key, []).append(index)
+        clusters = UnionFind()
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Compared with one member per group found in the bucket, so a
+            # bucket of copies costs one comparison per copy. A member
+            # similar to several groups joins all of them.
+            representatives = []
+            for index in members:
+                joined = False
+                for other in representatives:
+                    if clusters.find(index) == clusters.find(other):
+                        joined = True
+                        continue
+                    self.verified = self.verified + 1
+                    if self.similarity(signatures[index], signatures[other]) \
+                            >= self.minSimilarity:
+                        clusters.union(index, other)
+                        joined = True
+                if not joined:
+                    representatives.append(index)
+        self.clusters = sorted(sorted(self.subtitleFiles[index][0]
+                                      for index in group)
+                               for group in clusters.groups())
+        self.subtitleFiles = []
+        for paths in self.clusters:
+            warning = "Found subtitles with the same dialogue (similarity >= "
+            warning += str(self.minSimilarity) + ")"
+            for (number, path) in enumerate(paths):
+                warning += "\n\t" + str(number + 1) + ": " + path
+            self.emit("warning", warning, paths,
+                      {"similarity": self.minSimilarity})
+
+    def summary(self):
+        """Return the cluster and subtitle counts."""
+        return {"clusters": len(self.clusters), "total": self.total,
+                "failed": self.failed, "cached": self.cached,
+                "verified": self.verified, "skipped": self.skipped}
+
+    def finish(self):
+        """Print the number of groups of subtitles with the same dialogue."""
+        info = "Found " + bold(str(len(self.clusters))) + " groups of "
+        info += "subtitles with the same dialogue in " + bold(str(self.total))
+        info += " subtitles (" + str(self.verified) + " pairs verified, "
+        info += str(self.cached) + " signatures cached)"
+        printNotificationInfo(info)
+        if self.failed:
+            info = "Could not read the dialogue of " + str(self.failed)
+            info += " subtitles"
+            printNotificationInfo(info)
+        if self.skipped:
+            info = "Left " + str(self.skipped) + " subtitles for the next run"
+            printNotificationInfo(info)
+
+
+def findSubtitleDuplicates(scanfolder, minSimilarity=0.5):
+    """Find subtitles with nearly the same dialogue, recursively."""
+    runChecks(scanfolder, [SubtitleDuplicatesCheck(minSimilarity)])
+
+
+def printProfile(summary, asJson):
+    """Print the --profile summary as a table or as JSON."""
+    if machineReporter is not None:
+        record = {"type": "profile"}
+        record.update(summary)
+        machineReporter.write(record)
+        return
+    if asJson:
+        printLine(json.dumps(summary, indent=2))
+        return
+    dataTable = [['Stage', 'Calls', 'Seconds']]
+    for (name, timing) in summary["timings"].items():
+        dataTable.append([name, "{:,}".format(timing["calls"]),
+                          "{:.3f}".format(timing["seconds"])])
+    for (name, amount) in summary["counters"].items():
+        dataTable.append([name, "{:,}".format(amount), ""])
+    for (name, kilobytes) in summary.get("peakrss", {}).items():
+        dataTable.append(["peak memory (" + name + ")",
+                          "{:,} KB".format(kilobytes), ""])
+    printTable(dataTable, 'Profile', [1, 2])
 
 
 def printApplicationHeader():
     """Print application header."""
+    if machineReporter is not None:
+        return
     str1 = "                                     __                "
     str2 = "   |\/| _ _|. _   |  .|_  _ _  _    /  | _ _  _  _ _   "
     str3 = "   |  |(-(_||(_|  |__||_)| (_|| \/  \__|(-(_|| )(-|    "
     str4 = "                                /                      "
-    print(Fore.GREEN + Style.BRIGHT + "".center(APP_STR_PADDING, "+"))
-    print(str1.center(APP_STR_PADDING, "+"))
-    print(str2.center(APP_STR_PADDING, "+"))
-    print(str3.center(APP_STR_PADDING, "+"))
-    print(str4.center(APP_STR_PADDING, "+"))
-    print("".center(APP_STR_PADDING, "+") + Style.NORMAL + Fore.WHITE)
+    printLine(Fore.GREEN + Style.BRIGHT + "".center(APP_STR_PADDING, "+"))
+    printLine(str1.center(APP_STR_PADDING, "+"))
+    printLine(str2.center(APP_STR_PADDING, "+"))
+    printLine(str3.center(APP_STR_PADDING, "+"))
+    printLine(str4.center(APP_STR_PADDING, "+"))
+    printLine("".center(APP_STR_PADDING, "+") + Style.NORMAL + Fore.WHITE)
 
 
 def initArguments():
@@ -490,6 +5000,21 @@ def initArguments():
                         required=False,
                         help='find similar foldernames with soundex',
                         action='store_true')
+    parser.add_argument("-fz", "--foldernamefuzzy",
+                        required=False,
+                        type=int,
+                        metavar='DISTANCE',
+                        help='find foldernames within this levenshtein '
+                             'distance')
+    parser.add_argument("-fs", "--fuzzysoundex",
+                        required=False,
+                        help='only compare foldernames with the same soundex '
+                             'for --foldernamefuzzy',
+                        action='store_true')
+    parser.add_argument("-df", "--duplicatefiles",
+                        required=False,
+                        help='find files with the same content',
+                        action='store_true')
     parser.add_argument("-iy", "--ignoreyearfolders",
                         required=False,
                         help='ignores folders with year-only names',
@@ -509,6 +5034,14 @@ def initArguments():
                         required=False,
                         help='compare actual subtitle language with claimed ISO 639-(1/2) in filename',
                         action='store_true')
+    parser.add_argument("-sd", "--subtitleduplicates",
+                        required=False,
+                        type=float,
+                        nargs='?',
+                        const=0.5,
+                        metavar='SIMILARITY',
+                        help='find subtitles with nearly the same dialogue, '
+                             'at least this similar (default: 0.5)')
     parser.add_argument("-gc", "--garbagecollector",
                         required=False,
                         help='identifies garbage files and folders',
@@ -525,12 +5058,166 @@ def initArguments():
                         required=False,
                         help='list all folders',
                         action='store_true')
+    parser.add_argument("-c", "--cache",
+                        required=False,
+                        help='cache scan results in this SQLite file to '
+                             'skip unchanged folders and files on next runs')
+    parser.add_argument("-j", "--jobs",
+                        required=False,
+                        type=int,
+                        default=1,
+                        help='number of processes for subtitle language '
+                             'detection (default: 1)')
+    parser.add_argument("-sb", "--samplebytes",
+                        required=False,
+                        type=int,
+                        help='detect subtitle languages on a sample of about '
+                             'this many bytes, grown while ambiguous')
+    parser.add_argument("-sw", "--samplewindows",
+                        required=False,
+                        type=int,
+                        default=4,
+                        help='number of spread-out windows the sample is '
+                             'read from (default: 4)')
+    parser.add_argument("-st", "--samplethreshold",
+                        required=False,
+                        type=float,
+                        default=0.95,
+                        help='probability at which a sampled detection is '
+                             'accepted (default: 0.95)')
+    parser.add_argument("-dc", "--detectcandidates",
+                        required=False,
+                        help='detect subtitle languages against the claimed '
+                             'and preferred languages ([Languages] prefer in '
+                             'cleaner.ini) first, falling back to all '
+                             'languages when unsure',
+                        action='store_true')
+    parser.add_argument("-db", "--detectbackend",
+                        required=False,
+                        choices=['langdetect', 'numpy'],
+                        default='langdetect',
+                        help='score subtitle languages with langdetect or in '
+                             'batches with NumPy (default: langdetect)')
+    parser.add_argument("-w", "--walkers",
+                        required=False,
+                        type=int,
+                        default=1,
+                        help='number of threads listing folders concurrently, '
+                             'for high-latency network mounts (default: 1)')
+    parser.add_argument("-o", "--ordered",
+                        required=False,
+                        help='visit folders in a deterministic order when '
+                             'using --walkers',
+                        action='store_true')
+    parser.add_argument("-sh", "--shards",
+                        required=False,
+                        type=int,
+                        help='number of processes scanning the top-level '
+                             'folders, merged into one report')
+    parser.add_argument("-sx", "--shard",
+                        required=False,
+                        type=parseShard,
+                        metavar='INDEX/COUNT',
+                        help='only scan this shard of the top-level folders, '
+                             'numbered from 0, and write the partial results '
+                             'to --shardfile')
+    parser.add_argument("-sf", "--shardfile",
+                        required=False,
+                        help='file the partial results of --shard are '
+                             'written to')
+    parser.add_argument("-sm", "--mergeshards",
+                        required=False,
+                        nargs='+',
+                        metavar='SHARDFILE',
+                        help='report the merged partial results of all '
+                             'shards instead of scanning')
+    parser.add_argument("-ml", "--memorylimit",
+                        required=False,
+                        type=int,
+                        metavar='MB',
+                        help='keep the folder names of --foldernameexact and '
+                             '--foldernamesoundex in sorted runs on disk to '
+                             'stay within this many megabytes')
+    parser.add_argument("-mo", "--maxops",
+                        required=False,
+                        type=float,
+                        metavar='OPS',
+                        help='at most this many folder listings, stat calls, '
+                             'opens and reads per second')
+    parser.add_argument("-mb", "--maxbytes",
+                        required=False,
+                        type=float,
+                        metavar='MB',
+                        help='read at most this many megabytes of file '
+                             'content per second')
+    parser.add_argument("-mt", "--maxruntime", "--max-runtime",
+                        required=False,
+                        type=float,
+                        metavar='SECONDS',
+                        help='stop listing and reading after this many '
+                             'seconds, the next run with the same --cache '
+                             'resumes')
     parser.add_argument("-mr", "--machine",
                         required=False,
-                        help='output machine-readable only (supported JSON)',
+                        help='stream findings as newline-delimited JSON '
+                             'records',
+                        action='store_true')
+    parser.add_argument("-nt", "--notables",
+                        required=False,
+                        help='print results as plain lines instead of tables',
+                        action='store_true')
+    parser.add_argument("-np", "--noprogress",
+                        required=False,
+                        help='do not show progress bars',
+                        action='store_true')
+    parser.add_argument("-nc", "--nocolours",
+                        required=False,
+                        help='print without colours',
+                        action='store_true')
+    parser.add_argument("-wa", "--watch",
+                        required=False,
+                        help='keep running and report findings that are new '
+                             'or resolved whenever folders change',
                         action='store_true')
+    parser.add_argument("-wi", "--watchinterval",
+                        required=False,
+                        type=float,
+                        default=2.0,
+                        help='seconds between checks for changes when '
+                             'inotify is not available (default: 2)')
+    parser.add_argument("-mf", "--maxfindings", "--max-findings",
+                        required=False,
+                        type=int,
+                        help='print at most this many findings per check '
+                             'and count the others')
+    parser.add_argument("-pr", "--profile",
+                        required=False,
+                        nargs='?',
+                        const='table',
+                        choices=['table', 'json'],
+                        help='time the checks and subtitle stages and count '
+                             'files, bytes read and stat calls, printed as '
+                             'a table (default) or as JSON')
+    parser.add_argument("-pd", "--profiledump",
+                        required=False,
+                        help='write cProfile statistics of the scan to this '
+                             'file, for use with pstats or snakeviz')
     args = parser.parse_args()
 
+    # === Actions for argument "--machine"
+    if args.machine is True or args.all is True:
+        global machineReporter
+        machineReporter = MachineReporter(sys.stdout)
+
+    # === Actions for arguments "--notables", "--noprogress", "--nocolours",
+    #     all implied when stdout is not a terminal
+    global useTables, useProgress
+    plain = not sys.stdout.isatty()
+    useTables = not (args.notables or plain)
+    useProgress = not args.noprogress and sys.stderr.isatty()
+    if not (args.nocolours or plain) and machineReporter is None:
+        initColours()
+
     # === Actions for argument "--version"
     if args.version is True:
         printNotificationInfo(APP_TITLE + " v." + APP_VERSION)
@@ -539,6 +5226,26 @@ def initArguments():
         if args.scanfolder is None:
             printNotificationDanger("argument -s/--scanfolder is required")
             exit()
+        if args.shard is not None and args.shardfile is None:
+            printNotificationDanger("argument -sx/--shard requires "
+                                    "-sf/--shardfile")
+            exit()
+        if args.memorylimit is not None and (
+                args.watch or args.shards is not None
+                or args.shard is not None or args.mergeshards is not None):
+            printNotificationDanger("argument -ml/--memorylimit can not be "
+                                    "used with --watch or shards")
+            exit()
+        if args.maxruntime is not None and args.cache is None:
+            printNotificationDanger("argument -mt/--maxruntime requires "
+                                    "-c/--cache")
+            exit()
+        if args.maxruntime is not None and (
+                args.watch or args.shards is not None
+                or args.shard is not None or args.mergeshards is not None):
+            printNotificationDanger("argument -mt/--maxruntime can not be "
+                                    "used with --watch or shards")
+            exit()
 
     if args.all is True:
         args.machine = True
@@ -548,71 +5255,72 @@ def initArguments():
         args.garbagecollector = True
         args.subtitleslangcheck = True
         args.subtitlenaming = True
+        args.subtitleduplicates = 0.5
         args.foldernamesoundex = True
         args.foldernameexact = True
+        args.foldernamefuzzy = 3  # TODO: Get from INI file
+        args.duplicatefiles = True
         args.subtitlesiso639 = "1"  # TODO: Get from INI file
         args.ignoreyearfolders = False  # TODO: Get from INI file
     return args
 
 
-def main():
-    """Initialize app."""
-    printApplicationHeader()
-    args = initArguments()
-    printNotificationNew("Initiating " + APP_TITLE + " v." + APP_VERSION)
-    # === Actions for argument "--scanfolder"
-    if args.scanfolder is not None:
-        normpath = os.path.normpath(str(args.scanfolder))
-        abspath = os.path.abspath(normpath)
-        info = "Set scan folder \"" + bold(abspath)
-        printNotificationInfo(info)
-        if not os.path.isdir(args.scanfolder):
-            danger = "Folder \""
-            danger += bold(abspath)
-            danger += "\" as specified in --scanfolder does not exist or "
-            danger += "is not accessible"
-            printNotificationDanger(danger)
-            exit()
-        APP_SCANFOLDER = abspath
-        APP_COUNT_FILES = 1    # Will be used as count
-        APP_COUNT_FOLDERS = 1  # Will be used as count
-        for _, dirnames, filenames in os.walk(APP_SCANFOLDER):
-            APP_COUNT_FILES += len(filenames)
-            APP_COUNT_FOLDERS += len(dirnames)
-        info1 = "Scan folder contains " + bold("{:,}".format(APP_COUNT_FILES))
-        info1 += " files"
-        printNotificationInfo(info1)
-        boldCount = bold("{:,}".format(APP_COUNT_FOLDERS))
-        info2 = "Scan folder contains " + boldCount + " folders"
-        printNotificationInfo(info2)
-
+def addChecks(walker, args, config):
+    """Add the checks selected by the arguments to a walker."""
     # === Actions for argument "--foldernameexact"
     if args.foldernameexact is True:
+        check = walker.addCheck(FolderExactNameCheck(
+            args.ignoreyearfolders, args.ignoreseasonfolders))
         new = "--foldernameexact! Finding folders with exact same foldername"
-        printNotificationNew(new)
+        check.notify(printNotificationNew, new)
         if args.ignoreyearfolders is True:
             info = "--ignoreyearfolders! Ignoring folders with year-only names"
-            printNotificationInfo(info)
+            check.notify(printNotificationInfo, info)
         if args.ignoreseasonfolders is True:
             info = "--ignoreseasonfolders! Ignoring season named folders"
-        matchFoldersOnExactName(APP_SCANFOLDER, args.ignoreyearfolders)
+            check.notify(printNotificationInfo, info)
 
     # === Actions for argument "--foldernamesoundex"
     if args.foldernamesoundex is True:
+        check = walker.addCheck(FolderSoundexCheck(
+            args.ignoreyearfolders, args.ignoreseasonfolders))
         new = "--foldernamesoundex! Finding similar foldernames with soundex"
-        printNotificationNew(new)
+        check.notify(printNotificationNew, new)
         if args.ignoreyearfolders is True:
             info = "--ignoreyearfolders! Ignoring folders with years only"
-            printNotificationInfo(info)
+            check.notify(printNotificationInfo, info)
+        if args.ignoreseasonfolders is True:
+            info = "--ignoreseasonfolders! Ignoring season named folders"
+            check.notify(printNotificationInfo, info)
+
+    # === Actions for argument "--foldernamefuzzy"
+    if args.foldernamefuzzy is not None:
+        check = walker.addCheck(FolderFuzzyCheck(args.foldernamefuzzy,
+                                                 args.ignoreyearfolders,
+                                                 args.fuzzysoundex,
+                                                 args.ignoreseasonfolders))
+        new = "--foldernamefuzzy! Finding foldernames within levenshtein "
+        new += "distance " + str(args.foldernamefuzzy)
+        check.notify(printNotificationNew, new)
+        if args.ignoreyearfolders is True:
+            info = "--ignoreyearfolders! Ignoring folders with year-only names"
+            check.notify(printNotificationInfo, info)
         if args.ignoreseasonfolders is True:
             info = "--ignoreseasonfolders! Ignoring season named folders"
-        matchFoldersOnSoundex(APP_SCANFOLDER, args.ignoreyearfolders)
+            check.notify(printNotificationInfo, info)
+        if args.fuzzysoundex is True:
+            info = "--fuzzysoundex! Only comparing foldernames with the same "
+            info += "soundex"
+            check.notify(printNotificationInfo, info)
+
+    # === Actions for argument "--duplicatefiles"
+    if args.duplicatefiles is True:
+        check = walker.addCheck(DuplicateFilesCheck())
+        new = "--duplicatefiles! Finding files with the same content"
+        check.notify(printNotificationNew, new)
 
     # === Actions for argument "--subtitlesiso639"
     if args.subtitlesiso639 is not None:
-        new = "--subtitlesiso639! Finding subtitle files that do not contain"
-        new += "ISO 639 language codes in filenames"
-        printNotificationNew(new)
         if args.subtitlesiso639 != "1" and args.subtitlesiso639 != "2":
             danger = "Expected --subtitlesiso639=1 for ISO 639-1 (two letter "
             danger += "language code) or --subtitlesiso639=2 for ISO 639-2 "
@@ -621,77 +5329,376 @@ def main():
             exit()
         else:
             isoType = args.subtitlesiso639
+            check = walker.addCheck(SubtitleIso639Check(isoType, False))
+            new = "--subtitlesiso639! Finding subtitle files that do not "
+            new += "contain ISO 639 language codes in filenames"
+            check.notify(printNotificationNew, new)
             if isoType == "1":
                 info = "Using ISO 639-1 (two letter language code) for "
                 info += "subtitle filename validation"
-                printNotificationInfo(info)
+                check.notify(printNotificationInfo, info)
             else:
                 info = "Using ISO 639-2 (three letter language code) for "
                 info += "subtitle filename validation"
-                printNotificationInfo(info)
-            findSubtitlesNoneIso639(APP_SCANFOLDER, isoType, False)
+                check.notify(printNotificationInfo, info)
 
     # === Actions for argument "--subtitlenaming"
     if args.subtitlenaming is True:
+        exclusions = getConfigurationList(config, "Media", "exclude")
+        embedded = config.getboolean("Subtitles", "embedded", fallback=False)
+        check = walker.addCheck(SubtitleMediaNamingCheck(
+            exclusions or ("-trailer",), embedded,
+            getConfigurationList(config, "Languages", "prefer")))
         new = "--subtitlenaming! Finding subtitle files that do not match the "
         new += "media naming"
-        printNotificationNew(new)
-        findSubtitlesMediaNaming(APP_SCANFOLDER)
+        check.notify(printNotificationNew, new)
+        info = "Ignoring media files named like "
+        info += bold(",".join(check.exclusions))
+        check.notify(printNotificationInfo, info)
+        if embedded:
+            info = "Probing media files without subtitles for embedded "
+            info += "subtitles"
+            if check.languages:
+                info += " in " + bold(",".join(check.languages))
+            check.notify(printNotificationInfo, info)
 
-    # === Actions for argument "--subtitleslangcheck"
-    if args.subtitleslangcheck is True:
-        new = "--subtitleslangcheck! Checking determined language against "
-        new += "used language on subtitle files"
-        printNotificationNew(new)
+    # === Actions for argument "--subtitleduplicates"
+    if args.subtitleduplicates is not None:
+        check = walker.addCheck(SubtitleDuplicatesCheck(
+            args.subtitleduplicates))
+        new = "--subtitleduplicates! Finding subtitle files with nearly the "
+        new += "same dialogue"
+        check.notify(printNotificationNew, new)
 
     # === Actions for argument "--garbagecollector"
     if args.garbagecollector is True:
+        check = walker.addCheck(GarbageCheck())
         new = "--garbagecollector! Identifying garbage files and folders"
-        printNotificationNew(new)
-        garbagecollector(APP_SCANFOLDER)
+        check.notify(printNotificationNew, new)
 
     # === Actions for argument "--subtitleslangcheck"
     if args.subtitleslangcheck is True:
-        new = "--languagechecker! Attempting to check the real subtitle "
+        check = walker.addCheck(LanguageCheck())
+        new = "--subtitleslangcheck! Attempting to check the real subtitle "
         new += "language with the used ISO 639 language code"
-        printNotificationNew(new)
-        languagechecker(APP_SCANFOLDER)
-    exit()
+        check.notify(printNotificationNew, new)
+
+
+def createLibrary(args, config, cache=None):
+    """Return the Library of the scan folder set up by the arguments."""
+    sampling = None
+    if args.samplebytes is not None:
+        sampling = SubtitleSampling(args.samplebytes, args.samplewindows,
+                                    args.samplethreshold)
+    preferredLanguages = None
+    if args.detectcandidates is True:
+        preferredLanguages = []
+        for langcode in getConfigurationList(config, "Languages", "prefer"):
+            language = getDetectableLanguage(langcode)
+            if language is not None:
+                preferredLanguages.append(language)
+    return Library(
+        args.scanfolder, cache, False, args.jobs, sampling, args.walkers,
+        args.ordered, preferredLanguages, args.detectbackend,
+        getPruneRules(config),
+        getConfiguredExtensions(config, "Media", Check.mediaExts),
+        getConfiguredExtensions(config, "Subtitles", Check.subtitleExts),
+        args.maxfindings)
+
+
+def createWalker(args, config, cache=None, reporter=None, shard=None):
+    """Return a walker with the checks selected by the arguments."""
+    walker = createLibrary(args, config, cache).walker((), reporter, shard)
+    addChecks(walker, args, config)
+    if shard is not None:
+        # The walker merging the shards prints the headings of the checks
+        for check in walker.checks:
+            check.notifications = []
+    return walker
+
+
+def getMemoryBudget(limit):
+    """Return the bytes of a memory limit left for the checks to buffer."""
+    used = 0
+    if resource is not None:
+        # Kilobytes on Linux
+        used = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    # The other half is left for the traversal, sorting and merging
+    return (limit - used) // 2
 
-    # PoC
-    printNotificationInfo('Foldername comparing (levenshtein, distance=3)')
-    countt = 0
-    for sd, dirs, files in os.walk(APP_SCANFOLDER):
-        countt = countt + 1
-    bar = Bar('Processing', max=countt)
-    knownListFolderNamesLevenshtein = []
-    for sd, dirs, files in os.walk(APP_SCANFOLDER):
-        subdir = os.path.basename(os.path.normpath(sd))
-        if not bool(re.match('^[0-9]{4}$', subdir)):
-            for oldSubdir in knownListFolderNamesLevenshtein:
-                if (
-                    not bool(re.match('^[0-9]{4}$', oldSubdir))
-                    and not bool(re.match('^[0-9]{4}$', subdir))
-                ):
-                    distance = levenshtein(oldSubdir, subdir)
-                    if distance <= 3:
-                        info = oldSubdir + " - " + subdir + " - levenshtein "
-                        info += "distance = " + str(distance)
-                        printNotificationInfo(info)
-            if subdir not in knownListFolderNamesLevenshtein:
-                knownListFolderNamesLevenshtein.append(subdir)
-        bar.next()
-    bar.finish()
-
-    printNotificationInfo('Filename comparing (exact match)')
-    knownFileListNames = []
-    for subdir, dirs, files in os.walk(APP_SCANFOLDER):
-        for file in files:
-            if file not in knownFileListNames:
-                knownFileListNames.append(file)
-            else:
-                print('Found double filename found: ' + subdir + file)
+
+def initShardWorker(profiling=False, scheduling=None):
+    """Set up the profiler and scheduler of a shard worker process."""
+    global profiler
+    profiler = Profiler() if profiling else NullProfiler()
+    initScheduler(scheduling)
+
+
+def scanShard(args, shard):
+    """Walk one shard of the scan folder and return its partial results."""
+    reporter = ShardReporter() if args.machine else None
+    walker = createWalker(args, readConfiguration(), None, reporter, shard)
+    with profiler.stage("walker: walk"):
+        walker.walk()
+    return walker.partial()
+
+
+def scanShardWorker(args, shard):
+    """Return the partial results of a shard and what the worker profiled."""
+    partial = scanShard(args, shard)
+    return (partial, profiler.take(), ioScheduler.take())
+
+
+def scanShards(walker, args, count):
+    """
+    Walk the scan folder in count processes and merge their results.
+
+    The shards are merged in shard order, so findings across shards, such as
+    folders with the same name, are reported while merging.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    profiling = isinstance(profiler, Profiler)
+    with ProcessPoolExecutor(max_workers=count,
+                             initializer=initShardWorker,
+                             initargs=(profiling,
+                                       ioScheduler.share(count))) as executor:
+        futures = [executor.submit(scanShardWorker, args, (index, count))
+                   for index in range(count)]
+        for future in futures:
+            (partial, profiled, throttled) = future.result()
+            profiler.merge(profiled)
+            ioScheduler.merge(throttled)
+            with profiler.stage("walker: merge"):
+                walker.merge(partial)
+            if walker.progress is not None:
+                walker.progress()
+
+
+def readShards(paths):
+    """
+    Return the partial results written by --shard, in shard order.
+
+    Shard files are JSON, so reading one from another host runs no code.
+    """
+    partials = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as handle:
+            partial = json.load(handle, object_hook=decodeShardObject)
+        if not isinstance(partial, dict) or \
+                partial.get("version") != SHARD_VERSION:
+            raise ValueError(path + " is not a shard of this version")
+        partials.append(partial)
+    partials.sort(key=lambda partial: partial["shard"])
+    count = partials[0]["shard"][1]
+    if [partial["shard"] for partial in partials] != \
+            [(index, count) for index in range(count)]:
+        raise ValueError("expected every shard of " + str(count) + " once")
+    return partials
+
+
+def parseShard(value):
+    """Return (index, count) of an INDEX/COUNT shard argument."""
+    try:
+        (index, count) = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise ap.ArgumentTypeError("expected INDEX/COUNT, such as 0/4")
+    if not 0 <= index < count:
+        raise ap.ArgumentTypeError("expected an INDEX from 0 to COUNT - 1")
+    return (index, count)
+
+
+def main():
+    """Initialize app."""
+    args = initArguments()
+    if args.profile is not None:
+        global profiler
+        profiler = Profiler()
+    profile = None
+    if args.profiledump is not None:
+        import cProfile
+        profile = cProfile.Profile()
+    printApplicationHeader()
+    printNotificationNew("Initiating " + APP_TITLE + " v." + APP_VERSION)
+    # === Actions for argument "--scanfolder"
+    if args.scanfolder is not None:
+        normpath = os.path.normpath(str(args.scanfolder))
+        abspath = os.path.abspath(normpath)
+        info = "Set scan folder \"" + bold(abspath)
+        printNotificationInfo(info)
+        if not os.path.isdir(args.scanfolder):
+            danger = "Folder \""
+            danger += bold(abspath)
+            danger += "\" as specified in --scanfolder does not exist or "
+            danger += "is not accessible"
+            printNotificationDanger(danger)
+            exit()
+        APP_SCANFOLDER = abspath
+    sharded = args.shards is not None or args.shard is not None \
+        or args.mergeshards is not None
+    cache = None
+    if args.cache is not None and sharded:
+        printNotificationWarning("Not using the scan cache for shards")
+    elif args.cache is not None:
+        cache = ScanCache(args.cache)
+        printNotificationInfo("Using scan cache \"" + bold(args.cache) + "\"")
+    if args.detectbackend == "numpy":
+        importDependency("numpy")
+
+    # === Actions for arguments "--maxops", "--maxbytes" and "--maxruntime"
+    if args.maxops or args.maxbytes or args.maxruntime:
+        global ioScheduler
+        bytesPerSecond = None
+        if args.maxbytes:
+            bytesPerSecond = args.maxbytes * 1024 * 1024
+        ioScheduler = IOScheduler(args.maxops, bytesPerSecond,
+                                  args.maxruntime)
+        caps = []
+        if args.maxops:
+            caps.append("{:,g}".format(args.maxops) + " operations")
+        if args.maxbytes:
+            caps.append("{:,g}".format(args.maxbytes) + " MB")
+        if caps:
+            info = "Throttling file access to " + bold(" and ".join(caps))
+            info += " per second"
+            printNotificationInfo(info)
+        if args.maxruntime:
+            info = "Stopping after " + bold("{:,g}".format(args.maxruntime))
+            info += " seconds, later runs resume from the scan cache"
+            printNotificationInfo(info)
+    config = readConfiguration()
+    walker = createWalker(args, config, cache, machineReporter)
+    if walker.prune:
+        info = "Not traversing folders named like "
+        info += bold(",".join(walker.prune.rules))
+        printNotificationInfo(info)
+    if walker.preferredLanguages is not None:
+        info = "Detecting subtitle languages against the claimed language"
+        if walker.preferredLanguages:
+            info += " and " + bold(",".join(walker.preferredLanguages))
+        info += " first"
+        printNotificationInfo(info)
+
+    # === Actions for argument "--memorylimit"
+    if args.memorylimit is not None:
+        # The other checks keep their state in memory, whatever the limit
+        unbounded = [check.name for check in walker.checks
+                     if not check.externalSort]
+        if unbounded:
+            danger = "argument -ml/--memorylimit can not be used with --"
+            danger += ", --".join(unbounded)
+            printNotificationDanger(danger)
+            exit()
+        if not walker.checks:
+            printNotificationDanger("argument -ml/--memorylimit requires "
+                                    "--foldernameexact or --foldernamesoundex")
+            exit()
+        walker.memoryBudget = getMemoryBudget(args.memorylimit * 1024 * 1024)
+        if walker.memoryBudget <= 0:
+            danger = "The --memorylimit of " + str(args.memorylimit) + " MB "
+            danger += "is already used when starting"
+            printNotificationDanger(danger)
+            exit()
+        info = "Keeping folder names on disk within a "
+        info += bold("{:,}".format(walker.memoryBudget // 1024)) + " KB buffer"
+        printNotificationInfo(info)
+
+    # === Actions for argument "--watch"
+    if args.watch is True:
+        watchLibrary(APP_SCANFOLDER,
+                     lambda cache, reporter: createWalker(args, config, cache,
+                                                          reporter),
+                     args.watchinterval)
+        exit()
+
+    # === Actions for arguments "--shard" and "--shardfile"
+    if args.shard is not None:
+        with profiler.stage("walker: walk"):
+            partial = scanShard(args, args.shard)
+        with open(args.shardfile, 'w', encoding='utf-8') as handle:
+            json.dump(encodeShard(partial), handle)
+        info = "Wrote shard " + "/".join(str(part) for part in args.shard)
+        info += " with " + bold("{:,}".format(partial["folders"]))
+        info += " folders to \"" + bold(args.shardfile) + "\""
+        printNotificationInfo(info)
+        if args.profile is not None:
+            printProfile(profiler.summary(), args.profile == 'json')
+        exit()
+
+    # === One traversal of the scan folder shared by all selected checks,
+    #     or one per shard merged into the walker
+    if profile is not None:
+        profile.enable()
+    if args.mergeshards is not None:
+        try:
+            for partial in readShards(args.mergeshards):
+                walker.merge(partial)
+        except (OSError, ValueError, TypeError, KeyError) as error:
+            printNotificationDanger("Could not merge the shards: "
+                                    + str(error))
+            exit()
+    elif args.shards is not None:
+        if useProgress:
+            walker.progress = ProgressIndicator("Scanning", "shards",
+                                                args.shards)
+        scanShards(walker, args, args.shards)
+    else:
+        if useProgress:
+            walker.progress = ProgressIndicator("Scanning", "folders")
+        with profiler.stage("walker: walk"):
+            walker.walk()
+    if walker.progress is not None:
+        walker.progress.finish()
+    profiler.count("folders visited", walker.countFolders)
+    profiler.count("files visited", walker.countFiles)
+    profiler.count("folders pruned", walker.countPruned)
+    if machineReporter is not None:
+        machineReporter.write({"type": "scan", "scanfolder": APP_SCANFOLDER,
+                               "files": walker.countFiles,
+                               "folders": walker.countFolders,
+                               "pruned": walker.countPruned})
+    info1 = "Scan folder contains " + bold("{:,}".format(walker.countFiles))
+    info1 += " files"
+    printNotificationInfo(info1)
+    boldCount = bold("{:,}".format(walker.countFolders))
+    info2 = "Scan folder contains " + boldCount + " folders"
+    if walker.countPruned:
+        info2 += ", skipped " + bold("{:,}".format(walker.countPruned))
+        info2 += " pruned folders"
+    printNotificationInfo(info2)
+    with profiler.stage("walker: report"):
+        walker.report()
+    if isinstance(ioScheduler, IOScheduler):
+        summary = ioScheduler.summary()
+        if machineReporter is not None:
+            machineReporter.write(dict({"type": "io"}, **summary))
+        info = "Throttled for " + bold("{:,.1f}".format(summary["throttled"]))
+        info += " seconds over " + "{:,}".format(summary["operations"])
+        info += " operations reading " + "{:,}".format(summary["bytes"])
+        info += " bytes"
+        printNotificationInfo(info)
+        if ioScheduler.stopped:
+            warning = "Stopped once the --maxruntime was spent, results are "
+            warning += "incomplete. Run again with the same --cache to resume"
+            printNotificationWarning(warning)
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(args.profiledump)
+        printNotificationInfo("Wrote cProfile statistics to \""
+                              + bold(args.profiledump) + "\"")
+    if cache is not None:
+        info = "Scan cache reused " + bold("{:,}".format(cache.hits))
+        info += " of " + bold("{:,}".format(cache.hits + cache.misses))
+        info += " folder listings"
+        printNotificationInfo(info)
+        cache.close()
+    if args.profile is not None:
+        printProfile(profiler.summary(), args.profile == 'json')
+    exit()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except MissingDependency as error:
+        printNotificationDanger(str(error))
+        exit()
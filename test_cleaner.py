@@ -0,0 +1,623 @@
+"""Unit tests of cleaner.py, run with python -m unittest."""
+
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+import cleaner
+
+TEST_ZIP = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "test.zip")
+
+
+def writeFile(path, size=0, data=None):
+    """Write a file of size bytes, or with data, creating its folders."""
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(path, 'wb') as handle:
+        handle.write(data if data is not None else b"x" * size)
+
+
+def levenshtein(s1, s2):
+    """Return the levenshtein distance of the whole matrix, as reference."""
+    previous = list(range(len(s2) + 1))
+    for (i, c1) in enumerate(s1):
+        current = [i + 1]
+        for (j, c2) in enumerate(s2):
+            current.append(min(previous[j + 1] + 1, current[j] + 1,
+                               previous[j] + (c1 != c2)))
+        previous = current
+    return previous[-1]
+
+
+class LibraryTestCase(unittest.TestCase):
+    """Test case with a temporary library folder."""
+
+    def setUp(self):
+        """Create the library folder."""
+        self.root = tempfile.mkdtemp(prefix="cleaner-test-")
+        self.scanfolder = self.root
+
+    def tearDown(self):
+        """Delete the library folder."""
+        shutil.rmtree(self.root)
+
+    def path(self, *names):
+        """Return a path in the library folder."""
+        return os.path.join(self.scanfolder, *names)
+
+    def findings(self, query, *args):
+        """Return the findings and summaries of a Library query."""
+        library = cleaner.Library(self.scanfolder)
+        findings = list(getattr(library, query)(*args))
+        return (findings, library.summaries)
+
+
+class LibraryWalkerTest(LibraryTestCase):
+    """Tests of LibraryWalker on the folders of test.zip."""
+
+    def setUp(self):
+        """Unzip test.zip into the library folder."""
+        LibraryTestCase.setUp(self)
+        with zipfile.ZipFile(TEST_ZIP) as archive:
+            archive.extractall(self.scanfolder)
+        self.scanfolder = self.path("test")
+
+    def testChecksShareOneTraversal(self):
+        """Every folder is listed once, whatever the number of checks."""
+        scandir = mock.Mock(side_effect=os.scandir)
+        with mock.patch.object(cleaner.os, "scandir", scandir):
+            (findings, summaries) = self.findings(
+                "findings", [cleaner.FolderExactNameCheck(False),
+                             cleaner.GarbageCheck()])
+        self.assertEqual(scandir.call_count, 11)
+        exact = [sorted(finding.paths) for finding in findings
+                 if finding.check == "foldernameexact"]
+        self.assertEqual(exact, [[
+            self.path("fullfolder1", "doubledirname1"),
+            self.path("fullfolder2", "doubledirname1")]])
+        empty = sorted(finding.paths[0] for finding in findings
+                       if finding.details.get("kind") == "emptyfolder")
+        self.assertEqual(empty, [self.path("emptydirectory"),
+                                 self.path("fullfolder2", "doubledirname1")])
+        self.assertEqual(summaries["foldernameexact"]["total"], 11)
+
+
+class GarbageCheckTest(LibraryTestCase):
+    """Tests of GarbageCheck."""
+
+    def testAggregate(self):
+        """Folder trees sum the counts and bytes of their folders."""
+        writeFile(self.path("a", "b", "junk.txt"), 10)
+        writeFile(self.path("a", "c", "Film.mkv"), 5000)
+        check = cleaner.GarbageCheck()
+        walker = cleaner.Library(self.scanfolder).walker([check])
+        walker.walk()
+        totals = check.aggregate()
+        self.assertEqual(totals[self.path("a", "b")], (0, 0, 1, 10))
+        self.assertEqual(totals[self.path("a", "c")], (0, 1, 1, 5000))
+        self.assertEqual(totals[self.path("a")], (0, 1, 2, 5010))
+        self.assertEqual(totals[self.scanfolder], (0, 1, 2, 5010))
+
+    def testTopmostGarbageTree(self):
+        """A tree of only garbage is reported once, at its top."""
+        writeFile(self.path("junk", "sub", "a.txt"), 10)
+        writeFile(self.path("junk", "b.nfo"), 20)
+        os.makedirs(self.path("junk", "empty"))
+        writeFile(self.path("keep", "Film.mkv"), 5000)
+        (findings, summaries) = self.findings("garbagecollector")
+        self.assertEqual([finding.paths for finding in findings],
+                         [[self.path("junk")]])
+        self.assertEqual(findings[0].details["kind"], "garbagefolder")
+        self.assertEqual(findings[0].details["bytes"], 30)
+        self.assertEqual(summaries["garbagecollector"]["reclaimablebytes"],
+                         30)
+
+    def testSmallMediaKeepsFolder(self):
+        """Small media and subtitles are reported but keep their folder."""
+        writeFile(self.path("Film", "Film.mkv"), 100)
+        writeFile(self.path("Film", "Film.en.srt"), 50)
+        (findings, summaries) = self.findings("garbagecollector")
+        kinds = sorted((finding.details["kind"], finding.paths[0])
+                       for finding in findings)
+        self.assertEqual(kinds, [("smallfile", self.path("Film",
+                                                         "Film.en.srt")),
+                                 ("smallfile", self.path("Film",
+                                                         "Film.mkv"))])
+        self.assertEqual(summaries["garbagecollector"]["garbagefolder"], 0)
+
+
+class LevenshteinWithinTest(unittest.TestCase):
+    """Tests of levenshteinWithin()."""
+
+    def testBandEdge(self):
+        """Distances of maxDistance are exact, larger ones maxDistance + 1."""
+        within = cleaner.levenshteinWithin
+        self.assertEqual(within("kitten", "sitting", 3), 3)
+        self.assertEqual(within("kitten", "sitting", 2), 3)
+        # The only alignment runs along the edge of the band
+        self.assertEqual(within("abcdef", "bcdefa", 2), 2)
+        self.assertEqual(within("abcdef", "bcdefa", 1), 2)
+        self.assertEqual(within("abc", "abcde", 2), 2)
+        self.assertEqual(within("abc", "abcdef", 2), 3)
+        self.assertEqual(within("", "ab", 2), 2)
+        self.assertEqual(within("same", "same", 0), 0)
+        self.assertEqual(within("same", "sane", 0), 1)
+
+    def testMatchesFullMatrix(self):
+        """Random pairs agree with the distance of the whole matrix."""
+        generator = random.Random(5)
+        for attempt in range(2000):
+            s1 = "".join(generator.choice("abc")
+                         for i in range(generator.randint(0, 8)))
+            s2 = "".join(generator.choice("abc")
+                         for i in range(generator.randint(0, 8)))
+            maxDistance = generator.randint(0, 4)
+            expected = min(levenshtein(s1, s2), maxDistance + 1)
+            self.assertEqual(cleaner.levenshteinWithin(s1, s2, maxDistance),
+                             expected, (s1, s2, maxDistance))
+
+
+class UnionFindTest(unittest.TestCase):
+    """Tests of UnionFind."""
+
+    def testGroups(self):
+        """Unions are transitive and single items are not grouped."""
+        sets = cleaner.UnionFind()
+        sets.union("a", "b")
+        sets.union("c", "d")
+        sets.union("b", "d")
+        sets.union("a", "c")
+        sets.find("e")
+        groups = sorted(sorted(group) for group in sets.groups())
+        self.assertEqual(groups, [["a", "b", "c", "d"]])
+        self.assertEqual(sets.find("a"), sets.find("d"))
+        self.assertNotEqual(sets.find("a"), sets.find("e"))
+
+    def testUnionBySize(self):
+        """The larger set keeps its representative."""
+        sets = cleaner.UnionFind()
+        sets.union("a", "b")
+        sets.union("a", "c")
+        root = sets.find("a")
+        sets.union("d", "a")
+        self.assertEqual(sets.find("d"), root)
+        self.assertEqual(sets.size[root], 4)
+
+
+class FolderFuzzyCheckTest(LibraryTestCase):
+    """Tests of FolderFuzzyCheck."""
+
+    def testClusters(self):
+        """Names within the distance are clustered, others are not."""
+        for name in ("The Wire", "The Wird", "The Wired", "Heat"):
+            os.makedirs(self.path("a", name))
+        (findings, summaries) = self.findings("matchFoldersOnFuzzyName", 1)
+        self.assertEqual([sorted(finding.paths) for finding in findings],
+                         [[self.path("a", "The Wird"),
+                           self.path("a", "The Wire"),
+                           self.path("a", "The Wired")]])
+
+    def testNamesDifferingInCase(self):
+        """Names that only differ in case are found at distance 0."""
+        os.makedirs(self.path("a", "Some Show"))
+        os.makedirs(self.path("b", "some show"))
+        (findings, summaries) = self.findings("matchFoldersOnFuzzyName", 0)
+        self.assertEqual([sorted(finding.paths) for finding in findings],
+                         [[self.path("a", "Some Show"),
+                           self.path("b", "some show")]])
+
+
+class DuplicateFilesCheckTest(LibraryTestCase):
+    """Tests of DuplicateFilesCheck."""
+
+    def testSameContent(self):
+        """Files with the same content are grouped, same sizes are not."""
+        writeFile(self.path("a", "one.mkv"), data=b"same content")
+        writeFile(self.path("b", "two.mkv"), data=b"same content")
+        writeFile(self.path("b", "other.mkv"), data=b"else content")
+        writeFile(self.path("b", "empty.mkv"))
+        writeFile(self.path("c", "empty.mkv"))
+        (findings, summaries) = self.findings("findDuplicateFiles")
+        self.assertEqual([sorted(finding.paths) for finding in findings],
+                         [[self.path("a", "one.mkv"),
+                           self.path("b", "two.mkv")]])
+        self.assertEqual(summaries["duplicatefiles"]["wasted"], 12)
+
+    def testSamplesAreNotEnough(self):
+        """Large files with the same samples are compared in full."""
+        size = 4 * cleaner.DuplicateFilesCheck.sampleSize
+        data = bytearray(b"x" * size)
+        writeFile(self.path("one.mkv"), data=bytes(data))
+        # Between the head and the middle sample
+        data[size // 4] = ord("y")
+        writeFile(self.path("two.mkv"), data=bytes(data))
+        (findings, summaries) = self.findings("findDuplicateFiles")
+        self.assertEqual(findings, [])
+
+    @unittest.skipUnless(hasattr(os, "link"), "needs hardlinks")
+    def testHardlinksReadOnce(self):
+        """Hardlinks are reported with their file but read once."""
+        writeFile(self.path("one.mkv"), data=b"same content")
+        writeFile(self.path("two.mkv"), data=b"same content")
+        os.link(self.path("one.mkv"), self.path("link.mkv"))
+        (findings, summaries) = self.findings("findDuplicateFiles")
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(sorted(findings[0].paths),
+                         [self.path("link.mkv"), self.path("one.mkv"),
+                          self.path("two.mkv")])
+        self.assertEqual(summaries["duplicatefiles"]["hardlinks"], 1)
+        self.assertEqual(summaries["duplicatefiles"]["bytesRead"], 24)
+
+    def testHashesCached(self):
+        """Unchanged files are not read again, changed files are."""
+        writeFile(self.path("a", "one.mkv"), data=b"same content")
+        writeFile(self.path("b", "two.mkv"), data=b"same content")
+        library = cleaner.Library(self.scanfolder)
+        self.assertEqual(len(list(library.findDuplicateFiles())), 1)
+        self.assertEqual(len(list(library.findDuplicateFiles())), 1)
+        self.assertEqual(library.summaries["duplicatefiles"]["bytesRead"], 0)
+        self.assertEqual(library.summaries["duplicatefiles"]["cached"], 2)
+        writeFile(self.path("b", "two.mkv"), data=b"else content")
+        os.utime(self.path("b", "two.mkv"), ns=(0, 0))
+        library.refresh([self.path("b")])
+        self.assertEqual(list(library.findDuplicateFiles()), [])
+        self.assertEqual(library.summaries["duplicatefiles"]["bytesRead"], 12)
+
+
+class ExternalSorterTest(unittest.TestCase):
+    """Tests of ExternalSorter."""
+
+    def records(self, count):
+        """Return count (key, path) records with repeated keys."""
+        generator = random.Random(21)
+        return [("key" + str(generator.randint(0, count // 4)),
+                 os.path.join("/library", "folder" + str(index % 7),
+                              "name" + str(index)))
+                for index in range(count)]
+
+    def sortedRecords(self, budget, records):
+        """Return the records sorted by a sorter and its run count."""
+        sorter = cleaner.ExternalSorter(budget)
+        try:
+            for (key, path) in records:
+                sorter.add(key, path)
+            runs = len(sorter.runs)
+            return (list(sorter.items()), runs)
+        finally:
+            sorter.close()
+
+    def testInMemory(self):
+        """Without spilling, records are sorted by key, stable per key."""
+        records = self.records(300)
+        (items, runs) = self.sortedRecords(10 ** 9, records)
+        self.assertEqual(runs, 0)
+        self.assertEqual(items, sorted(records, key=lambda item: item[0]))
+
+    def testSpilledRuns(self):
+        """Records spilled to runs merge in key order, stable per key."""
+        records = self.records(3000)
+        (items, runs) = self.sortedRecords(20000, records)
+        self.assertGreater(runs, 1)
+        self.assertEqual(items, sorted(records, key=lambda item: item[0]))
+
+    def testRunsMergedAtMaxRuns(self):
+        """At maxRuns, the runs are merged into one, keeping the order."""
+        records = self.records(cleaner.ExternalSorter.maxRuns * 3 + 5)
+        # Every record fills the buffer and is spilled on its own
+        (items, runs) = self.sortedRecords(1, records)
+        self.assertLess(runs, cleaner.ExternalSorter.maxRuns)
+        self.assertEqual(items, sorted(records, key=lambda item: item[0]))
+
+    def testGroups(self):
+        """Groups hold the paths of a key in the order they were added."""
+        sorter = cleaner.ExternalSorter(1)
+        try:
+            for (key, path) in [("b", "/x/1"), ("a", "/x/2"), ("b", "/y/3"),
+                                ("a", "/y/4")]:
+                sorter.add(key, path)
+            groups = [(key, list(paths)) for (key, paths) in sorter.groups()]
+        finally:
+            sorter.close()
+        self.assertEqual(groups, [("a", ["/x/2", "/y/4"]),
+                                  ("b", ["/x/1", "/y/3"])])
+
+
+class ShardEncodingTest(unittest.TestCase):
+    """Tests of the JSON encoding of shard files."""
+
+    def testRoundTrip(self):
+        """Tuples and dicts with keys that are not strings are restored."""
+        partial = {"shard": (1, 3), "sizes": {12: [(2049, 7)]},
+                   "inodes": {(2049, 7): ("/a/b.mkv", None)},
+                   "checks": [("garbage", {"d": ["t"], "t": 1.5})]}
+        data = json.loads(json.dumps(cleaner.encodeShard(partial)),
+                          object_hook=cleaner.decodeShardObject)
+        self.assertEqual(data, partial)
+
+    def testUnknownObject(self):
+        """Objects that encodeShard() does not write are refused."""
+        with self.assertRaises(ValueError):
+            json.loads('{"__class__": "os.system"}',
+                       object_hook=cleaner.decodeShardObject)
+        with self.assertRaises(TypeError):
+            cleaner.encodeShard({"set": {1, 2}})
+
+
+def writeSubtitle(path, words):
+    """Write an SRT file with six words per cue."""
+    cues = []
+    for start in range(0, len(words), 6):
+        number = start // 6 + 1
+        cues.append(str(number) + "\n00:00:" + "{:02d}".format(number % 60)
+                    + ",000 --> 00:00:" + "{:02d}".format(number % 60)
+                    + ",500\n" + " ".join(words[start:start + 6]) + "\n")
+    writeFile(path, data="\n".join(cues).encode("utf-8"))
+
+
+class SubtitleDuplicatesCheckTest(LibraryTestCase):
+    """Tests of the MinHash signatures and SubtitleDuplicatesCheck."""
+
+    def dialogue(self, seed, count=600):
+        """Return count words of made-up dialogue."""
+        generator = random.Random(seed)
+        vocabulary = ["word" + str(index) for index in range(400)]
+        return [generator.choice(vocabulary) for index in range(count)]
+
+    def similarity(self, words1, words2):
+        """Return the similarity of the signatures of two dialogues."""
+        writeSubtitle(self.path("one.srt"), words1)
+        writeSubtitle(self.path("two.srt"), words2)
+        signature1 = cleaner.getSubtitleSignature(self.path("one.srt"))
+        signature2 = cleaner.getSubtitleSignature(self.path("two.srt"))
+        self.assertEqual(len(signature1), cleaner.SIGNATURE_SIZE)
+        return cleaner.SubtitleDuplicatesCheck().similarity(signature1,
+                                                            signature2)
+
+    def testSignatures(self):
+        """Signatures estimate how much dialogue two subtitles share."""
+        words = self.dialogue(1)
+        self.assertEqual(self.similarity(words, list(words)), 1.0)
+        edited = list(words)
+        for index in range(0, len(edited), 60):
+            edited[index] = "changed"
+        self.assertGreater(self.similarity(words, edited), 0.7)
+        self.assertLess(self.similarity(words, self.dialogue(2)), 0.1)
+
+    def testTooLittleDialogue(self):
+        """Files with less than one shingle have no signature."""
+        writeSubtitle(self.path("short.srt"), ["ad", "two", "words"])
+        self.assertIsNone(cleaner.getSubtitleSignature(
+            self.path("short.srt")))
+        self.assertIsNone(cleaner.getSubtitleSignature(
+            self.path("missing.srt")))
+
+    def testGroups(self):
+        """Copies and edited copies are grouped, other dialogue is not."""
+        words = self.dialogue(1)
+        edited = list(words)
+        edited[100:106] = ["changed"] * 6
+        writeSubtitle(self.path("a", "Film.en.srt"), words)
+        writeSubtitle(self.path("b", "Copy.srt"), words)
+        writeSubtitle(self.path("c", "Edited.srt"), edited)
+        writeSubtitle(self.path("d", "Other.srt"), self.dialogue(2))
+        (findings, summaries) = self.findings("findSubtitleDuplicates")
+        self.assertEqual([finding.paths for finding in findings],
+                         [[self.path("a", "Film.en.srt"),
+                           self.path("b", "Copy.srt"),
+                           self.path("c", "Edited.srt")]])
+
+    def testMemberJoinsEveryGroupOfBucket(self):
+        """A member similar to two groups of a bucket joins both."""
+        size = cleaner.SIGNATURE_SIZE
+        rows = size // cleaner.SubtitleDuplicatesCheck.bands
+        common = list(range(size))
+        # All three share the first band only. Per other band, one
+        # changes the first half of the rows and two the second half, so
+        # common is similar to both, but they are not similar to each other
+        one = [value + size if index >= rows and index % rows < rows // 2
+               else value for (index, value) in enumerate(common)]
+        two = [value + 2 * size if index >= rows and index % rows >= rows // 2
+               else value for (index, value) in enumerate(common)]
+        check = cleaner.SubtitleDuplicatesCheck()
+        self.assertGreaterEqual(check.similarity(common, one), 0.5)
+        self.assertGreaterEqual(check.similarity(common, two), 0.5)
+        self.assertLess(check.similarity(one, two), 0.5)
+        check.reporter = cleaner.FindingQueue()
+        check.subtitleFiles = [("one.srt", None), ("two.srt", None),
+                               ("common.srt", None)]
+        check.signatures = lambda: [one, two, common]
+        check.analyze()
+        self.assertEqual(check.clusters,
+                         [["common.srt", "one.srt", "two.srt"]])
+
+
+def ebmlId(elementId):
+    """Return the bytes of an EBML element ID."""
+    return elementId.to_bytes((elementId.bit_length() + 7) // 8, 'big')
+
+
+def ebmlSize(size=None):
+    """Return an 8 byte EBML size, unknown for None."""
+    if size is None:
+        return b'\x01' + b'\xff' * 7
+    return (size | (1 << 56)).to_bytes(8, 'big')
+
+
+def ebml(elementId, data):
+    """Return an EBML element."""
+    return ebmlId(elementId) + ebmlSize(len(data)) + data
+
+
+def ebmlUint(elementId, value):
+    """Return an EBML unsigned integer element."""
+    length = max(1, (value.bit_length() + 7) // 8)
+    return ebml(elementId, value.to_bytes(length, 'big'))
+
+
+def matroskaTrack(trackType, codec, language=None, bcp47=None, name=None,
+                  forced=False):
+    """Return a Matroska TrackEntry element."""
+    data = ebmlUint(cleaner.MATROSKA_TRACKTYPE, trackType)
+    data += ebml(cleaner.MATROSKA_CODECID, codec.encode())
+    if language is not None:
+        data += ebml(cleaner.MATROSKA_LANGUAGE, language.encode())
+    if bcp47 is not None:
+        data += ebml(cleaner.MATROSKA_LANGUAGEBCP47, bcp47.encode())
+    if name is not None:
+        data += ebml(cleaner.MATROSKA_NAME, name.encode())
+    if forced:
+        data += ebmlUint(cleaner.MATROSKA_FLAGFORCED, 1)
+    return ebml(cleaner.MATROSKA_TRACKENTRY, data)
+
+
+def writeMatroska(path, tracks, tracksLast=False, clusterSize=1 << 20):
+    """Write a sparse Matroska file with tracks before or after a Cluster."""
+    tracks = ebml(cleaner.MATROSKA_TRACKS, b''.join(tracks))
+    info = ebml(0x1549A966, ebmlUint(0x2AD7B1, 1000000))
+    cluster = ebmlId(cleaner.MATROSKA_CLUSTER) + ebmlSize(clusterSize)
+    if tracksLast:
+        def seekHead(position):
+            seek = ebml(cleaner.MATROSKA_SEEKID,
+                        ebmlId(cleaner.MATROSKA_TRACKS))
+            seek += ebml(cleaner.MATROSKA_SEEKPOSITION,
+                         position.to_bytes(8, 'big'))
+            return ebml(cleaner.MATROSKA_SEEKHEAD,
+                        ebml(cleaner.MATROSKA_SEEK, seek))
+        position = len(seekHead(0)) + len(info) + len(cluster) + clusterSize
+        (head, tail) = (seekHead(position) + info + cluster, tracks)
+    else:
+        (head, tail) = (info + tracks + cluster, b'\x00')
+    with open(path, 'wb') as handle:
+        handle.write(ebml(cleaner.MATROSKA_EBML, ebml(0x4282, b'matroska')))
+        handle.write(ebmlId(cleaner.MATROSKA_SEGMENT) + ebmlSize() + head)
+        handle.seek(clusterSize, 1)
+        handle.write(tail)
+
+
+def mp4Box(boxType, data, version=None):
+    """Return an MP4 box, a full box with a version."""
+    if version is not None:
+        data = bytes([version, 0, 0, 0]) + data
+    return struct.pack('>I', 8 + len(data)) + boxType + data
+
+
+def mp4Track(trackId, handler, codec, language, version=0, chapters=None):
+    """Return an MP4 trak box."""
+    times = 8 if version == 0 else 16
+    header = mp4Box(b'tkhd', b'\x00' * times + struct.pack('>I', trackId)
+                    + b'\x00' * 60, version)
+    if isinstance(language, int):
+        code = language
+    else:
+        code = sum((ord(character) - 0x60) << shift
+                   for (character, shift) in zip(language, (10, 5, 0)))
+    # Times, time scale and duration, 64 bit times in version 1
+    mediaHeader = mp4Box(b'mdhd', b'\x00' * (16 if version == 0 else 28)
+                         + struct.pack('>H', code) + b'\x00\x00', version)
+    handlerBox = mp4Box(b'hdlr', b'\x00' * 4 + handler + b'\x00' * 13, 0)
+    description = mp4Box(b'stsd', struct.pack('>I', 1)
+                         + mp4Box(codec, b'\x00' * 30), 0)
+    media = mp4Box(b'mdia', mediaHeader + handlerBox + mp4Box(
+        b'minf', mp4Box(b'stbl', description)))
+    reference = b''
+    if chapters is not None:
+        reference = mp4Box(b'tref', mp4Box(b'chap',
+                                           struct.pack('>I', chapters)))
+    return mp4Box(b'trak', header + reference + media)
+
+
+def writeMp4(path, tracks, moovLast=True, mdatSize=1 << 20):
+    """Write a sparse MP4 file with the moov box before or after mdat."""
+    moov = mp4Box(b'moov', mp4Box(b'mvhd', b'\x00' * 96, 0)
+                  + b''.join(tracks))
+    with open(path, 'wb') as handle:
+        handle.write(mp4Box(b'ftyp', b'isom\x00\x00\x00\x00isom'))
+        if not moovLast:
+            handle.write(moov)
+        handle.write(struct.pack('>I', mdatSize + 8) + b'mdat')
+        handle.seek(mdatSize, 1)
+        handle.write(moov if moovLast else b'\x00')
+
+
+class ProbeTest(LibraryTestCase):
+    """Tests of the Matroska and MP4 header parsers."""
+
+    def testMatroska(self):
+        """Subtitle tracks are found with their language, codec and flags."""
+        writeMatroska(self.path("film.mkv"), [
+            matroskaTrack(1, "V_MPEG4/ISO/AVC"),
+            matroskaTrack(2, "A_AAC", "ger"),
+            matroskaTrack(0x11, "S_TEXT/UTF8"),
+            matroskaTrack(0x11, "S_HDMV/PGS", "spa", name="Forced",
+                          forced=True),
+            matroskaTrack(0x11, "S_TEXT/WEBVTT", "dut", bcp47="nl-BE")])
+        self.assertEqual(
+            cleaner.probeEmbeddedSubtitles(self.path("film.mkv")),
+            [cleaner.EmbeddedTrack("eng", "S_TEXT/UTF8", None, False),
+             cleaner.EmbeddedTrack("spa", "S_HDMV/PGS", "Forced", True),
+             cleaner.EmbeddedTrack("nl-BE", "S_TEXT/WEBVTT", None, False)])
+
+    def testMatroskaSeekHead(self):
+        """Tracks after the first Cluster are found through the SeekHead."""
+        writeMatroska(self.path("film.mkv"),
+                      [matroskaTrack(0x11, "S_TEXT/ASS", "fre")],
+                      tracksLast=True)
+        with open(self.path("film.mkv"), 'rb') as handle:
+            reader = cleaner.BlockReader(handle.fileno(),
+                                         os.fstat(handle.fileno()).st_size)
+            tracks = cleaner.probeMatroska(reader)
+        self.assertEqual(tracks, [cleaner.EmbeddedTrack("fre", "S_TEXT/ASS",
+                                                        None, False)])
+        # The Cluster is skipped, not read
+        self.assertLessEqual(reader.bytesRead,
+                             3 * cleaner.PROBE_BLOCK_SIZE)
+
+    def testMatroskaWithoutSubtitles(self):
+        """Files without subtitle tracks have an empty list of tracks."""
+        writeMatroska(self.path("film.mkv"),
+                      [matroskaTrack(1, "V_MPEG4/ISO/AVC")])
+        self.assertEqual(
+            cleaner.probeEmbeddedSubtitles(self.path("film.mkv")), [])
+
+    def testMp4(self):
+        """Subtitle tracks are found, text tracks of chapters are not."""
+        writeMp4(self.path("film.mp4"), [
+            mp4Track(1, b'vide', b'avc1', "und"),
+            mp4Track(2, b'sbtl', b'tx3g', "fra", version=1),
+            mp4Track(3, b'text', b'text', "eng"),
+            mp4Track(4, b'soun', b'mp4a', "eng", chapters=3),
+            mp4Track(5, b'subt', b'wvtt', 2)])
+        self.assertEqual(
+            cleaner.probeEmbeddedSubtitles(self.path("film.mp4")),
+            [cleaner.EmbeddedTrack("fra", "tx3g", None, False),
+             cleaner.EmbeddedTrack("deu", "wvtt", None, False)])
+
+    def testMp4MoovFirst(self):
+        """The moov box is found before mdat too."""
+        writeMp4(self.path("film.m4v"),
+                 [mp4Track(1, b'sbtl', b'tx3g', "eng")], moovLast=False)
+        self.assertEqual(
+            cleaner.probeEmbeddedSubtitles(self.path("film.m4v")),
+            [cleaner.EmbeddedTrack("eng", "tx3g", None, False)])
+
+    def testUnknownContainers(self):
+        """Other containers and broken headers are not probed."""
+        writeFile(self.path("film.avi"), data=b'RIFF' + b'\x00' * 100)
+        writeFile(self.path("broken.mkv"), data=b'\x1a\x45\xdf\xa3\x00')
+        writeFile(self.path("broken.mp4"),
+                  data=mp4Box(b'ftyp', b'isom') + b'\x00\x00\x00\x02moov')
+        for name in ("film.avi", "broken.mkv", "broken.mp4", "missing.mkv"):
+            self.assertIsNone(
+                cleaner.probeEmbeddedSubtitles(self.path(name)), name)
+
+
+if __name__ == '__main__':
+    unittest.main()